@@ -0,0 +1,72 @@
+"""
+Benchmark for the constraint-aware assignment engine.
+
+Draws 5,000 players split into households of four, with last year's pairings
+excluded and a share of random exclusions on top. Run from the repository root:
+
+    python -m benchmarks.bench_assignment [players] [density]
+"""
+import random
+import sys
+import time
+from src.secret_santa import AssignmentError, find_assignment
+
+
+def build_exclusions(count, density, rng):
+    exclusions = [set() for _ in range(count)]
+
+    # Households of four
+    for start in range(0, count, 4):
+        members = range(start, min(start + 4, count))
+        for member in members:
+            exclusions[member].update(other for other in members if other != member)
+
+    # Last year's pairing, as a single cycle
+    previous = list(range(count))
+    rng.shuffle(previous)
+    for index, gifter in enumerate(previous):
+        exclusions[gifter].add(previous[(index + 1) % count])
+
+    # Random exclusions covering the given share of the other players
+    others = int((count - 1) * density)
+    for gifter in range(count):
+        exclusions[gifter].update(rng.sample(range(count), others))
+        exclusions[gifter].discard(gifter)
+    return exclusions
+
+
+def check(receivers, exclusions):
+    assert sorted(receivers) == list(range(len(receivers)))
+    for gifter, receiver in enumerate(receivers):
+        assert receiver != gifter and receiver not in exclusions[gifter]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    densities = [float(sys.argv[2])] if len(sys.argv) > 2 else [0.0, 0.1, 0.5, 0.9]
+    rng = random.Random(2024)
+
+    for density in densities:
+        exclusions = build_exclusions(count, density, rng)
+        excluded = sum(len(excluded) for excluded in exclusions)
+
+        start = time.perf_counter()
+        receivers = find_assignment(count, exclusions, rng)
+        elapsed = time.perf_counter() - start
+
+        check(receivers, exclusions)
+        print(f"{count} players, {excluded:>9} excluded pairs ({density:.0%} random): {elapsed * 1000:8.1f} ms")
+
+    # A player nobody may draw fails before any matching work
+    exclusions = build_exclusions(count, 0.1, rng)
+    for gifter in range(1, count):
+        exclusions[gifter].add(0)
+    start = time.perf_counter()
+    try:
+        find_assignment(count, exclusions, rng)
+    except AssignmentError as e:
+        print(f"impossible draw rejected in {(time.perf_counter() - start) * 1000:.1f} ms: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Benchmark for the bulk draw mode against the per-player SecretSanta draw.
+
+Both sides produce every (gifter, receiver, category) triple and throw it
+away, so only the draw itself is measured. Run from the repository root:
+
+    python -m benchmarks.bench_bulk_draw [players ...]
+"""
+import collections
+import sys
+import time
+from random import shuffle
+from unittest.mock import MagicMock
+from src.bulk_draw import PlayerColumns, iter_draw, shuffled_cycle
+from src.category_catalog import category_catalog
+from src.secret_santa import SecretSanta
+
+
+def draw_per_player(count):
+    players = [{"name": f"player{index}", "email": f"player{index}@example.com"} for index in range(count)]
+    secret_santa = SecretSanta({"players": players}, MagicMock())
+    consume = collections.deque(maxlen=0).append
+
+    start = time.perf_counter()
+    shuffle(players)
+    secret_santa.receivers = [(index + 1) % count for index in range(count)]
+    for index in range(count):
+        gifter, receiver = secret_santa.pick_duo(index)
+        consume((gifter, receiver, secret_santa.pick_category()))
+    return time.perf_counter() - start
+
+
+def draw_bulk(count):
+    columns = PlayerColumns([f"player{index}" for index in range(count)], [f"player{index}@example.com" for index in range(count)])
+
+    start = time.perf_counter()
+    collections.deque(iter_draw(shuffled_cycle(len(columns)), category_catalog.categories), maxlen=0)
+    return time.perf_counter() - start
+
+
+def main():
+    counts = [int(count) for count in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    print(f"{'players':>10} {'per-player':>12} {'bulk':>12} {'speedup':>8}")
+    for count in counts:
+        per_player = draw_per_player(count)
+        bulk = draw_bulk(count)
+        print(f"{count:>10} {per_player * 1000:>10.1f}ms {bulk * 1000:>10.1f}ms {per_player / bulk:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark for how many requests one app process overlaps.
+
+Serves the app from a single-threaded server, like gunicorn --threads 1, and
+from a threaded one, like the gthread workers configured in gunicorn.conf.py,
+then sends /GetParty/ and /CreateUser/ requests from a growing number of
+concurrent clients. Storage is the in-memory backend with an injected round
+trip and no read cache, so every request waits on the "network" like it does
+on Firestore. Run from the repository root:
+
+    python -m benchmarks.bench_concurrency [--clients 1 4 16 64] [--storage-latency 20]
+        [--threads 8] [--gunicorn]
+"""
+import argparse
+import os
+import threading
+from werkzeug.serving import make_server
+from benchmarks.bench_http import HTTPDriver, create_party, install_stand_ins, measure, start_gunicorn, summarize
+
+
+def serve(app, threaded):
+    """Starts a werkzeug server for app in a background thread and returns it with its port."""
+    server = make_server("127.0.0.1", 0, app, threaded=threaded)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.port
+
+
+def run_modes(args):
+    """Yields (mode, driver) pairs, stopping each server once its measures are done."""
+    if args.gunicorn:
+        env = dict(os.environ)
+        for threads in (1, args.threads):
+            process, port = start_gunicorn(threads, env)
+            try:
+                yield f"gunicorn --threads {threads}", HTTPDriver("127.0.0.1", port)
+            finally:
+                process.terminate()
+                process.wait()
+    else:
+        app = install_stand_ins()
+        for mode, threaded in (("single thread", False), ("threaded", True)):
+            server, port = serve(app, threaded)
+            try:
+                yield mode, HTTPDriver("127.0.0.1", port)
+            finally:
+                server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 64], help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="requests per measure")
+    parser.add_argument("--storage-latency", type=float, default=20.0, help="milliseconds added per storage call")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads of the concurrent mode")
+    parser.add_argument("--gunicorn", action="store_true", help="compare gunicorn processes instead of werkzeug servers")
+    args = parser.parse_args()
+
+    os.environ.update(
+        STORAGE_BACKEND="memory",
+        STORAGE_LATENCY_MS=str(args.storage_latency),
+        FIRESTORE_CACHE_SIZE="0",
+    )
+
+    print(f"{'mode':<22} {'route':<28} {'clients':>7} {'p50 ms':>9} {'p95 ms':>9} {'req/s':>9}")
+    for mode, driver in run_modes(args):
+        party_id, _ = create_party(driver, 20, "party")
+        routes = (
+            ("GET /GetParty/<party_id>", lambda index: ("GET", f"/GetParty/{party_id}", None)),
+            (
+                "POST /CreateUser/<party_id>",
+                lambda index: ("POST", f"/CreateUser/{party_id}", {"username": "guest", "email": f"guest{index}@example.com"}),
+            ),
+        )
+        for route, make_call in routes:
+            for clients in args.clients:
+                calls = [make_call(index) for index in range(args.requests)]
+                latencies, duration, errors, _ = measure(driver, calls, clients)
+                row = summarize(route, 20, latencies, duration, errors)
+                print(
+                    f"{mode:<22} {route:<28} {clients:>7} {row['p50_ms']:>9.2f} "
+                    f"{row['p95_ms']:>9.2f} {row['throughput_rps']:>9.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark for the per-request cost of constructing FirebaseCRUD.
+
+Compares building a FirebaseCRUD in every request with reusing the shared one
+from get_firebase_crud. The default Firebase app is initialized with anonymous
+credentials, so the real firebase_admin code paths run without going over the
+network. Run from the repository root:
+
+    python -m benchmarks.bench_firebase_client [requests]
+"""
+import sys
+import time
+import firebase_admin
+from firebase_admin import credentials
+from google.auth.credentials import AnonymousCredentials
+from src.firebase_crud import FirebaseCRUD, get_firebase_crud, reset_firebase_crud
+
+
+class AnonymousCredential(credentials.Base):
+    def get_credential(self):
+        return AnonymousCredentials()
+
+
+def per_request(requests):
+    for _ in range(requests):
+        FirebaseCRUD().db.collection("Party").document("party")
+
+
+def shared(requests):
+    for _ in range(requests):
+        get_firebase_crud().db.collection("Party").document("party")
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(AnonymousCredential(), {"projectId": "bench"})
+    reset_firebase_crud()
+
+    results = {}
+    for label, function in (("FirebaseCRUD() per request", per_request), ("get_firebase_crud()", shared)):
+        start = time.perf_counter()
+        function(requests)
+        results[label] = (time.perf_counter() - start) / requests
+        print(f"{label:<28} {results[label] * 1e6:8.2f} us/request")
+
+    saved = results["FirebaseCRUD() per request"] - results["get_firebase_crud()"]
+    print(f"{'saved':<28} {saved * 1e6:8.2f} us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+End-to-end HTTP benchmark for every route of the app.
+
+Each route is driven through the Flask test client, or through a real gunicorn
+process with --gunicorn, against local stand-ins: the in-memory storage backend
+for Firestore and a fake SMTP server that only sleeps. Both stand-ins take an
+injected latency in milliseconds. Reports p50/p95/p99 latency and throughput
+per route and party size, and saves them as JSON. Run from the repository root:
+
+    python -m benchmarks.bench_http [--sizes 5 50 500] [--requests 200]
+        [--storage-latency 0] [--smtp-latency 0] [--gunicorn] [--threads 4]
+        [--output bench_http.json] [--compare previous.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# FakeSMTP class standing in for smtplib.SMTP, sleeping instead of talking to a server
+class FakeSMTP:
+    def __init__(self, host, port):
+        self.latency = float(os.environ.get("BENCH_SMTP_LATENCY_MS", 0)) / 1000
+        self._wait()
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def starttls(self):
+        self._wait()
+
+    def login(self, user, password):
+        self._wait()
+
+    def noop(self):
+        self._wait()
+        return 250, b"OK"
+
+    def sendmail(self, sender, recipient, message):
+        self._wait()
+        return {}
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def install_stand_ins():
+    """Makes the app send its emails to FakeSMTP without any rate limit."""
+    from src import app as app_module
+    from src.email_dispatcher import EmailDispatcher
+    from src.email_service import EmailService, RateLimiter, SMTPConnectionPool
+
+    pool = SMTPConnectionPool("bench@example.com", "password", smtp_class=FakeSMTP)
+    email_service = EmailService(pool=pool, rate_limiter=RateLimiter(per_second=1e9, per_day=1e12))
+    app_module.email_service = email_service
+    app_module.email_dispatcher = EmailDispatcher(email_service)
+    return app_module.app
+
+
+# TestClientDriver class for sending requests to the app in this process
+class TestClientDriver:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_json()
+
+
+# HTTPDriver class for sending requests to a gunicorn process
+class HTTPDriver:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    def request(self, method, path, body=None):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            headers = {}
+            payload = None
+            if body is not None:
+                payload = json.dumps(body)
+                headers["Content-Type"] = "application/json"
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            return response.status, json.loads(response.read() or b"null")
+        finally:
+            connection.close()
+
+
+def start_gunicorn(threads, env):
+    """Starts one gunicorn worker on a free port and returns the process and the port."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn",
+            "-c", os.path.join(ROOT, "benchmarks", "gunicorn_bench.conf.py"),
+            "--bind", f"127.0.0.1:{port}",
+            # One worker, so that every request sees the data of the in-memory backend
+            "--workers", "1",
+            "--threads", str(threads),
+            "src.app:app",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited before accepting connections")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def create_party(driver, size, name):
+    """Creates a party with size members and returns its ID and the IDs of the members."""
+    _, response = driver.request("POST", "/CreateParty/", {"name": name, "budget": 20, "categories": ["Books"]})
+    party_id = response["id"]
+    user_ids = []
+    for index in range(size):
+        _, response = driver.request(
+            "POST",
+            f"/CreateUser/{party_id}",
+            {"username": f"user{index}", "email": f"{name}-{index}@example.com", "suggested_categories": ["Games"]},
+        )
+        user_ids.append(response["id"])
+    return party_id, user_ids
+
+
+def scenarios(driver, size, requests):
+    """
+    Prepares the data of a party of the given size and returns the requests of every route.
+
+    Returns:
+        list: (route, list of (method, path, body)) pairs, one request per measured call.
+    """
+    party_id, user_ids = create_party(driver, size, f"party{size}")
+    players = [{"name": f"user{index}", "email": f"party{size}-{index}@example.com"} for index in range(size)]
+    _, job = driver.request("POST", "/SecretSanta/", {"players": players, "categories": ["Books"]})
+
+    # Members deleted by /DeleteUser/ are created up front, outside of the measure
+    _, doomed = create_party(driver, requests, f"doomed{size}")
+
+    user = {"username": "user0", "email": f"party{size}-0@example.com", "suggested_categories": ["Music"]}
+    party = {"name": f"party{size}", "budget": 30, "categories": ["Books"]}
+    return [
+        ("POST /SecretSanta/", [("POST", "/SecretSanta/", {"players": players, "categories": ["Books"]})] * requests),
+        ("GET /SecretSanta/jobs/<job_id>", [("GET", f"/SecretSanta/jobs/{job['job_id']}", None)] * requests),
+        ("POST /CreateParty/", [("POST", "/CreateParty/", party)] * requests),
+        ("PUT /UpdateParty/<party_id>", [("PUT", f"/UpdateParty/{party_id}", party)] * requests),
+        ("POST /CreateUser/<party_id>", [
+            ("POST", f"/CreateUser/{party_id}", {"username": "guest", "email": f"guest{index}@example.com"})
+            for index in range(requests)
+        ]),
+        ("PUT /UpdateUser/<user_id>", [("PUT", f"/UpdateUser/{user_ids[0]}", user)] * requests),
+        ("DELETE /DeleteUser/<user_id>", [("DELETE", f"/DeleteUser/{user_id}", None) for user_id in doomed]),
+        ("GET /GetParties/", [("GET", f"/GetParties/?email=party{size}-0@example.com", None)] * requests),
+        ("GET /GetParty/<party_id>", [("GET", f"/GetParty/{party_id}", None)] * requests),
+        ("GET /GetParty/<party_id>/<owner_id>", [("GET", f"/GetParty/{party_id}/{user_ids[0]}", None)] * requests),
+        ("GET /GetParty/<party_id>?limit=50", [("GET", f"/GetParty/{party_id}?limit=50", None)] * requests),
+    ]
+
+
+def measure(driver, calls, concurrency):
+    """
+    Sends the calls from concurrency clients.
+
+    Returns:
+        tuple: The latencies in seconds, the total duration, the number of
+        errors and the response bodies.
+    """
+    def send(call):
+        start = time.perf_counter()
+        status, body = driver.request(*call)
+        elapsed = time.perf_counter() - start
+        failed = status >= 400 or (isinstance(body, dict) and body.get("code", 200) >= 400)
+        return elapsed, failed, body
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        results = [send(call) for call in calls]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(send, calls))
+    duration = time.perf_counter() - start
+    latencies = [elapsed for elapsed, _, _ in results]
+    return latencies, duration, sum(failed for _, failed, _ in results), [body for _, _, body in results]
+
+
+def drain_jobs(driver, bodies):
+    """Waits for the email jobs queued by /SecretSanta/, so they do not slow down the next routes."""
+    for body in bodies:
+        if not isinstance(body, dict) or "job_id" not in body:
+            continue
+        while True:
+            _, job = driver.request("GET", f"/SecretSanta/jobs/{body['job_id']}")
+            if job.get("code") != 200 or job["data"]["status"] != "in_progress":
+                break
+            time.sleep(0.05)
+
+
+def summarize(route, size, latencies, duration, errors):
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "route": route,
+        "party_size": size,
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentiles[49] * 1000, 3),
+        "p95_ms": round(percentiles[94] * 1000, 3),
+        "p99_ms": round(percentiles[98] * 1000, 3),
+        "throughput_rps": round(len(latencies) / duration, 1),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous_path, results):
+    """Prints the change of p50 and throughput against a previous run."""
+    with open(previous_path, "r", encoding="utf-8") as file:
+        previous = {(row["route"], row["party_size"]): row for row in json.load(file)["results"]}
+    print(f"\nChange against {previous_path}")
+    print(f"{'route':<40} {'size':>5} {'p50':>9} {'rps':>9}")
+    for row in results:
+        before = previous.get((row["route"], row["party_size"]))
+        if before is None:
+            continue
+        p50 = (row["p50_ms"] / before["p50_ms"] - 1) * 100 if before["p50_ms"] else 0.0
+        rps = (row["throughput_rps"] / before["throughput_rps"] - 1) * 100 if before["throughput_rps"] else 0.0
+        print(f"{row['route']:<40} {row['party_size']:>5} {p50:>+8.1f}% {rps:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50, 500], help="party sizes to measure")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route and party size")
+    parser.add_argument("--storage-latency", type=float, default=0.0, help="milliseconds added per storage call")
+    parser.add_argument("--smtp-latency", type=float, default=0.0, help="milliseconds added per SMTP command")
+    parser.add_argument("--gunicorn", action="store_true", help="send real HTTP requests to a gunicorn process")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads and concurrent clients")
+    parser.add_argument("--output", default="bench_http.json", help="where to save the results")
+    parser.add_argument("--compare", help="results of a previous run to compare with")
+    args = parser.parse_args()
+
+    # Both stand-ins read their settings from the environment, so gunicorn workers get them too
+    env = dict(
+        os.environ,
+        STORAGE_BACKEND="memory",
+        STORAGE_LATENCY_MS=str(args.storage_latency),
+        BENCH_SMTP_LATENCY_MS=str(args.smtp_latency),
+    )
+    os.environ.update(env)
+
+    process = None
+    if args.gunicorn:
+        process, port = start_gunicorn(args.threads, env)
+        driver = HTTPDriver("127.0.0.1", port)
+        concurrency = args.threads
+    else:
+        driver = TestClientDriver(install_stand_ins())
+        concurrency = 1
+
+    results = []
+    try:
+        print(f"{'route':<40} {'size':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>7}")
+        for size in args.sizes:
+            for route, calls in scenarios(driver, size, args.requests):
+                latencies, duration, errors, bodies = measure(driver, calls, concurrency)
+                row = summarize(route, size, latencies, duration, errors)
+                results.append(row)
+                print(
+                    f"{route:<40} {size:>5} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                    f"{row['p99_ms']:>9.2f} {row['throughput_rps']:>9.1f} {row['errors']:>7}"
+                )
+                if route == "POST /SecretSanta/":
+                    drain_jobs(driver, bodies)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "server": "gunicorn" if args.gunicorn else "test_client",
+            "concurrency": concurrency,
+            "requests": args.requests,
+            "storage_latency_ms": args.storage_latency,
+            "smtp_latency_ms": args.smtp_latency,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nSaved to {args.output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
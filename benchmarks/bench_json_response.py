@@ -0,0 +1,73 @@
+"""
+Micro-benchmark for building the JSON responses of large parties and the model dicts.
+
+Compares Flask's default JSON provider with FastJSONProvider on a /GetParty/
+response with a growing number of members, in CPU time and in peak memory
+allocated while serializing, and dataclasses.asdict with the models' shallow
+to_dict. Run from the repository root:
+
+    python -m benchmarks.bench_json_response [requests]
+"""
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from models.user_model import User
+from utilities.json_provider import FastJSONProvider
+
+
+def party_response(members):
+    users = [
+        {
+            "id": f"{index:020d}",
+            "username": f"user{index}",
+            "email": f"user{index}@example.com",
+            "suggested_categories": ["Books", "Games", "Music"],
+        }
+        for index in range(members)
+    ]
+    return {
+        "code": 200,
+        "message": "Party retrieved successfully",
+        "data": {"name": "Party", "budget": 20, "categories": ["Books"], "ownerId": users[0]["id"], "users": users},
+    }
+
+
+def cost(function, requests):
+    """Returns the seconds per call and the peak bytes allocated by one call."""
+    start = time.perf_counter()
+    for _ in range(requests):
+        function()
+    elapsed = (time.perf_counter() - start) / requests
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    app = Flask(__name__)
+    providers = (("default", DefaultJSONProvider(app)), ("fast", FastJSONProvider(app)))
+
+    print(f"{'response':<24} {'provider':<9} {'time':>12} {'peak alloc':>12}")
+    with app.app_context():
+        for members in (10, 1_000, 10_000):
+            response = party_response(members)
+            count = max(1, requests * 10 // members)
+            for name, provider in providers:
+                elapsed, peak = cost(lambda: provider.response(response), count)
+                print(f"{f'{members} members':<24} {name:<9} {elapsed * 1e6:>9.1f} us {peak / 1024:>9.1f} KiB")
+
+    user = User("user", "user@example.com", "party123", [f"category{index}" for index in range(100)])
+    for name, function in (("asdict", lambda: asdict(user)), ("to_dict", user.to_dict)):
+        elapsed, peak = cost(function, requests * 100)
+        print(f"{'User, 100 categories':<24} {name:<9} {elapsed * 1e6:>9.2f} us {peak / 1024:>9.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
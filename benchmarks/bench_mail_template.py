@@ -0,0 +1,43 @@
+"""
+Micro-benchmark for rendering templates/mail.html.
+
+Compares re-reading and substituting the file for every recipient against the
+compiled MailTemplate. Run from the repository root:
+
+    python -m benchmarks.bench_mail_template [recipients]
+"""
+import sys
+import time
+from src.mail_template import TEMPLATE_PATH, MailTemplate
+
+
+def render_naive(gifter, link):
+    with open(TEMPLATE_PATH, "r", encoding="utf-8") as file:
+        source = file.read()
+    return source.replace("{{gifter}}", gifter).replace("{{link}}", link)
+
+
+def run(label, render, recipients):
+    start = time.perf_counter()
+    for index in range(recipients):
+        render(f"player{index}", f"https://example.com/giftDetail?gifter=player{index}&receiver=x&category=y")
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {elapsed * 1000:9.1f} ms total {elapsed / recipients * 1e6:9.2f} us/message")
+
+
+def main():
+    recipients = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+
+    start = time.perf_counter()
+    template = MailTemplate(TEMPLATE_PATH, auto_reload=False)
+    print(f"compile                {(time.perf_counter() - start) * 1000:9.1f} ms once")
+
+    print(f"{recipients} recipients")
+    run("read + replace", render_naive, recipients)
+    run("compiled", lambda gifter, link: template.render(gifter=gifter, link=link), recipients)
+    template.auto_reload = True
+    run("compiled + mtime check", lambda gifter, link: template.render(gifter=gifter, link=link), recipients)
+
+
+if __name__ == "__main__":
+    main()
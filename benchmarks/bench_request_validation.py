@@ -0,0 +1,66 @@
+"""
+Micro-benchmark for validating request bodies.
+
+Compares the reflective validation formerly done by create_instance_from_request,
+which resolved the field types and checked every list item on each request,
+with the compiled validators of get_validator, for growing categories and
+suggested_categories lists. Run from the repository root:
+
+    python -m benchmarks.bench_request_validation [requests]
+"""
+import sys
+import time
+from dataclasses import fields
+from typing import get_origin, get_args
+from models.party_model import PartyRequest
+from models.user_model import User
+from utilities.request_utils import get_validator
+
+
+def validate_reflective(data, dataclass_type):
+    for field in fields(dataclass_type):
+        if field.name in data:
+            field_value = data[field.name]
+            expected_type = field.type
+            if get_origin(expected_type):
+                if not isinstance(field_value, get_origin(expected_type)):
+                    raise ValueError(f"Invalid type for field {field.name}")
+                expected_arg_type = get_args(expected_type)[0]
+                if any(not isinstance(item, expected_arg_type) for item in field_value):
+                    raise ValueError(f"Invalid type in list for field {field.name}")
+            elif not isinstance(field_value, expected_type):
+                data[field.name] = expected_type(field_value)
+
+
+def validate_compiled(data, dataclass_type):
+    if get_validator(dataclass_type)(data):
+        raise ValueError("Invalid request")
+
+
+def run(label, validate, dataclass_type, data, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        validate(data, dataclass_type)
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+
+    print(f"{'body':<34} {'reflective':>14} {'compiled':>14} {'speedup':>8}")
+    for size in (10, 1_000, 100_000):
+        categories = [f"category{index}" for index in range(size)]
+        bodies = (
+            ("PartyRequest", PartyRequest, {"name": "Party", "budget": 20, "categories": categories}),
+            ("User", User, {"username": "user", "email": "user@example.com", "suggested_categories": categories}),
+        )
+        for name, dataclass_type, data in bodies:
+            count = max(1, requests // max(1, size // 100))
+            reflective = run("reflective", validate_reflective, dataclass_type, data, count)
+            compiled = run("compiled", validate_compiled, dataclass_type, data, count)
+            label = f"{name}, {size} categories"
+            print(f"{label:<34} {reflective * 1e6:>11.2f} us {compiled * 1e6:>11.2f} us {reflective / compiled:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
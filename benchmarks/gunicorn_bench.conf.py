@@ -0,0 +1,11 @@
+# Gunicorn settings for benchmarks/bench_http.py, replacing the default gunicorn.conf.py
+
+
+def post_worker_init(worker):
+    # Send the emails to the fake SMTP server and create the in-memory storage
+    # backend before the worker accepts requests
+    from benchmarks.bench_http import install_stand_ins
+    from src.firebase_crud import get_firebase_crud
+
+    install_stand_ins()
+    get_firebase_crud()
@@ -0,0 +1,56 @@
+# Gunicorn settings, loaded automatically from the working directory
+import os
+
+# Worker processes, and threads per worker. Threads let one process serve other
+# requests while some wait on Firestore, so a slow request no longer stalls the
+# instance; more than one thread selects gunicorn's gthread worker
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# Without an outbox the email jobs live in the memory of the worker that queued
+# them, and a poll served by another worker would not find its job. The outbox
+# must outlive restarts to resume the sends, so its path is not defaulted to a
+# temporary directory that a container may clear
+if workers > 1 and not os.environ.get("EMAIL_OUTBOX_PATH"):
+    raise RuntimeError("EMAIL_OUTBOX_PATH must be set when WEB_CONCURRENCY is above 1")
+
+# Each worker would otherwise encrypt the /GetParty/?limit= cursors with its own
+# random key and reject the cursors issued by the others
+if workers > 1 and not os.environ.get("CURSOR_SECRET"):
+    raise RuntimeError("CURSOR_SECRET must be set when WEB_CONCURRENCY is above 1")
+
+# Cloud Run enforces its own request timeout
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 0))
+
+# Directory the workers share their metrics through, so that /metrics reports
+# every worker whichever one serves the scrape
+metrics_dir = os.environ.get("METRICS_DIR")
+
+
+def on_starting(server):
+    # Drop the metrics files of a previous run
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if name.startswith("metrics-"):
+                os.remove(os.path.join(metrics_dir, name))
+
+
+def post_worker_init(worker):
+    # Create the worker's Firestore client before it accepts requests, after the
+    # fork so that every worker gets its own gRPC channel
+    from src.firebase_crud import get_firebase_crud
+
+    get_firebase_crud()
+
+    if metrics_dir:
+        from src.metrics import REGISTRY
+
+        REGISTRY.enable_multiprocess(metrics_dir)
+
+
+def worker_exit(server, worker):
+    # Keep the final counts of the worker in the shared totals, but not its
+    # gauges, e.g. its cache size, which no longer exist once it is gone
+    from src.metrics import REGISTRY
+
+    REGISTRY.flush(final=True)
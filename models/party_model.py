@@ -1,7 +1,7 @@
 from dataclasses import dataclass, field
 from typing import List
 
-@dataclass
+@dataclass(slots=True)
 class PartyRequest:
     name: str
     budget: int
@@ -13,7 +13,11 @@ class PartyRequest:
         if not self.name:
             raise ValueError("Name cannot be empty")
 
-@dataclass
+    def to_dict(self):
+        """Returns the fields as a dict, sharing the categories list instead of deep-copying it like asdict."""
+        return {"name": self.name, "budget": self.budget, "categories": self.categories}
+
+@dataclass(slots=True)
 class Party:
     name: str
     budget: int
@@ -25,4 +29,14 @@ class Party:
         if self.budget < 0:
             raise ValueError("Budget cannot be negative")
         if not self.name:
-            raise ValueError("Name cannot be empty")
\ No newline at end of file
+            raise ValueError("Name cannot be empty")
+
+    def to_dict(self):
+        """Returns the fields as a shallow dict."""
+        return {
+            "name": self.name,
+            "budget": self.budget,
+            "categories": self.categories,
+            "ownerId": self.ownerId,
+            "closed": self.closed,
+        }
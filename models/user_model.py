@@ -1,7 +1,7 @@
 from dataclasses import dataclass, field
 from typing import List
 
-@dataclass
+@dataclass(slots=True)
 class User:
     username: str
     email: str
@@ -13,3 +13,12 @@ class User:
             raise ValueError("Username cannot be empty")
         if not self.email:
             raise ValueError("Email cannot be empty")
+
+    def to_dict(self):
+        """Returns the fields as a shallow dict, e.g. for a Firestore write."""
+        return {
+            "username": self.username,
+            "email": self.email,
+            "party_id": self.party_id,
+            "suggested_categories": self.suggested_categories,
+        }
@@ -1,32 +1,139 @@
-from flask import Flask, request, make_response
-from src.secret_santa import SecretSanta
+from flask import Flask, request, make_response, g
+from src.secret_santa import SecretSanta, AssignmentError
 from src.email_service import EmailService
-from src.firebase_crud import FirebaseCRUD
+from src.email_dispatcher import EmailDispatcher
+from src.email_outbox import EmailOutbox
+from src.firebase_crud import get_firebase_crud
+from src import metrics
+from src.profiling import RequestProfiler, FILE_HEADER
 from models.party_model import Party, PartyRequest
 from models.user_model import User
 from utilities.request_utils import create_instance_from_request
-from dataclasses import asdict
+from utilities.cursors import encode_cursor, decode_cursor
+from utilities.etags import compute_etag, not_modified, with_etag
+from utilities.json_provider import FastJSONProvider
+from utilities import server_timing
+from utilities.idempotency import IdempotencyStore, idempotent
 import os
+import re
+import time
 from flask_cors import CORS, cross_origin
 
 
 # Create Flask app
 app = Flask(__name__)
 
+# Serialize the responses with orjson when it is installed
+app.json = FastJSONProvider(app)
+
 # Create email service
 email_service = EmailService()
 
+# Create background dispatcher for the draw emails, keeping them in a durable
+# outbox shared by the workers when EMAIL_OUTBOX_PATH is set
+outbox_path = os.environ.get("EMAIL_OUTBOX_PATH")
+email_dispatcher = EmailDispatcher(email_service, outbox=EmailOutbox(outbox_path) if outbox_path else None)
+
+# Create the profiler of single requests, disabled unless PROFILER_TOKEN is set
+profiler = RequestProfiler.from_env()
+
+# Create the store replaying the responses of retried POST requests
+idempotency_store = IdempotencyStore.from_env()
+
+# Fields fetched from Firestore for each view
+MEMBERSHIP_FIELDS = ["party_id"]
+PARTY_SUMMARY_FIELDS = ["name", "budget", "closed", "ownerId"]
+MEMBER_FIELDS = ["username", "email", "suggested_categories"]
+
+# Client-chosen draw IDs, also used in the Message-ID header of the emails
+DRAW_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+# Largest number of members returned per page
+MAX_PAGE_SIZE = 500
+
 cors = CORS(app) # allow CORS for all domains on all routes.
 app.config['CORS_HEADERS'] = 'Content-Type'
 
+
+# Function to report the read cache counters with the other metrics
+def cache_stats():
+    stats = getattr(get_firebase_crud(), "stats", None)
+    if stats is None:
+        return {}
+    return {(name,): value for name, value in stats().items()}
+
+
+metrics.Gauge("storage_cache", "Read cache counters of the worker, by name.", ("stat",), callback=cache_stats)
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    server_timing.start()
+
+    # Sample the stack of requests that ask for it with the profiler token
+    if profiler.enabled and profiler.wants(request.headers):
+        g.profile = profiler.start()
+
+
+@app.after_request
+def record_request(response):
+    # Label by route template rather than path so that IDs do not create new series
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    if "request_start" in g:
+        metrics.REQUEST_DURATION.observe(time.perf_counter() - g.request_start, request.method, route)
+    metrics.RESPONSES.inc(request.method, route, str(response.status_code))
+
+    # Name the profile file in the response so that it can be fetched from the instance
+    sampler = g.pop("profile", None)
+    if sampler is not None:
+        filename = profiler.stop(sampler, f"{request.method} {route}")
+        if filename is not None:
+            response.headers[FILE_HEADER] = filename
+
+    # Break the request down into Firestore, SMTP and serialization time for the client
+    timing = server_timing.current()
+    if timing is not None:
+        response.headers["Server-Timing"] = timing.header()
+    return response
+
+
+@app.teardown_request
+def stop_timer(exception=None):
+    # Server threads are reused, so the accounting must not outlive the request
+    server_timing.stop()
+
+    # A request failing before after_request still frees the profiler
+    sampler = g.pop("profile", None)
+    if sampler is not None:
+        profiler.stop(sampler, request.path)
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Exposes the request, storage and SMTP metrics in the Prometheus text format.
+
+    Returns:
+        Response: The metrics of every worker when METRICS_DIR is set, else of this one.
+    """
+    return app.response_class(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @app.route("/SecretSanta/", methods=["POST"])
 @cross_origin()
+@idempotent(idempotency_store)
 def send_emails():
     """
-    Sends emails to assigned recipients based on the received data.
+    Assigns recipients based on the received data and queues their emails.
+
+    With an outbox, every email of the draw is rendered and written to it
+    before the 202 is returned, so that no email is lost if the worker dies
+    afterwards. The response of a large bulk draw therefore takes as long as
+    writing all of its emails.
 
     Returns:
-        dict: A dictionary indicating the status of the email sending process.
+        dict: A dictionary with the ID of the job sending the emails.
     """
 
     response = make_response()
@@ -37,17 +144,56 @@ def send_emails():
     # Get data from request body
     data = request.get_json()
 
+    # A draw posted again under the same ID is not drawn again, its job is returned
+    draw_id = data.get("draw_id")
+    if draw_id is not None:
+        if not isinstance(draw_id, str) or not DRAW_ID_PATTERN.fullmatch(draw_id):
+            return {"code": 400, "message": "draw_id must be 1 to 64 letters, digits, '-' or '_'"}, 400
+        if email_dispatcher.get_job(draw_id) is not None:
+            return {"Status": "Queued", "job_id": draw_id}, 202
+
     # Create SecretSanta object with received data and email service
     secret_santa = SecretSanta(data, email_service)
 
-    # Assign recipients and send emails
-    secret_santa.assign_and_send_emails()
+    # Assign recipients and queue the emails for background delivery
+    try:
+        job_options = {"job_id": draw_id} if draw_id is not None else {}
+        if data.get("mode") == "bulk":
+            # Large events stream their emails instead of building them all first
+            recipients, emails = secret_santa.assign_bulk()
+            job_id = email_dispatcher.submit(emails, recipients=recipients, **job_options)
+        else:
+            job_id = email_dispatcher.submit(secret_santa.assign(), **job_options)
+    except AssignmentError as e:
+        return {"code": 400, "message": str(e)}, 400
+
+    # Return the job ID so the client can follow the delivery progress
+    return {"Status": "Queued", "job_id": job_id}, 202
 
-    # Return success status
-    return {"Status": "Success"}
+
+@app.route("/SecretSanta/jobs/<job_id>", methods=["GET"])
+def get_email_job(job_id):
+    """
+    Gets the delivery progress of a Secret Santa email job.
+
+    Without EMAIL_OUTBOX_PATH, jobs are kept in the memory of the worker that
+    queued them, and other workers answer "Job not found". gunicorn.conf.py
+    requires it when WEB_CONCURRENCY is above 1.
+
+    Args:
+        job_id (str): The ID of the job returned by /SecretSanta/.
+
+    Returns:
+        dict: A dictionary containing the per-recipient status of the job.
+    """
+    job = email_dispatcher.get_job(job_id)
+    if job is None:
+        return {"code": 404, "message": "Job not found"}
+    return {"code": 200, "message": "Job retrieved successfully", "data": job}
 
 
 @app.route("/CreateParty/", methods=["POST"])
+@idempotent(idempotency_store)
 def create_party():
     """
     Creates a new party.
@@ -58,10 +204,13 @@ def create_party():
 
     # Get data from request body and create Party object
     party_data = create_instance_from_request(request, PartyRequest)
+    if not isinstance(party_data, PartyRequest):
+        # Invalid body, return the 400 response
+        return party_data
 
     # Create party in Firebase
-    firebase_crud = FirebaseCRUD()
-    return firebase_crud.create("Party", asdict(party_data))
+    firebase_crud = get_firebase_crud()
+    return firebase_crud.create("Party", party_data.to_dict())
 
 
 @app.route("/UpdateParty/<party_id>", methods=["PUT"])
@@ -77,10 +226,13 @@ def update_party(party_id):
     """
     # Get data from request body and create Party object
     party_data = create_instance_from_request(request, PartyRequest)
+    if not isinstance(party_data, PartyRequest):
+        # Invalid body, return the 400 response
+        return party_data
 
     # Update party in Firebase
-    firebase_crud = FirebaseCRUD()
-    return firebase_crud.update("Party", asdict(party_data))
+    firebase_crud = get_firebase_crud()
+    return firebase_crud.update("Party", party_id, party_data.to_dict())
 
 
 @app.route("/CreateUser/<party_id>", methods=["POST"])
@@ -97,20 +249,29 @@ def create_user(party_id):
 
     # Get data from request body and create User object
     user_data = create_instance_from_request(request, User)
+    if not isinstance(user_data, User):
+        # Invalid body, return the 400 response
+        return user_data
     user_data.party_id = party_id
 
     # Create user in Firebase
-    user_dict = asdict(user_data)
-    firebase_crud = FirebaseCRUD()
-    message = firebase_crud.create("User", user_dict)
+    user_dict = user_data.to_dict()
+    firebase_crud = get_firebase_crud()
 
-    # If he's the first user to join the party, update the party's ownerId with his ID
-    if message["code"] == 200:
-        party = firebase_crud.read("Party", party_id)
-        if party["code"] == 200 and party["data"]["ownerId"] == "":
-            firebase_crud.update("Party", party_id, {"ownerId": message["id"]})
+    def join_party(transaction):
+        party = transaction.read("Party", party_id)
+        user_id = transaction.create("User", user_dict)
 
-    return message
+        # If he's the first user to join the party, update the party's ownerId with his ID
+        if party is not None and party.get("ownerId") == "":
+            transaction.update("Party", party_id, {"ownerId": user_id})
+        return user_id
+
+    # Create the user and claim the ownership atomically, so concurrent joins cannot both become owner
+    result = firebase_crud.run_transaction(join_party)
+    if result["code"] != 200:
+        return result
+    return {"code": 200, "message": "Document created successfully", "id": result["data"]}
 
 
 @app.route("/UpdateUser/<user_id>", methods=["PUT"])
@@ -127,14 +288,17 @@ def update_user(user_id):
 
     # Create User object from request data
     user_data = create_instance_from_request(request, User)
+    if not isinstance(user_data, User):
+        # Invalid body, return the 400 response
+        return user_data
 
     # Convert to dict
     user_dict = {
-        key: value for key, value in asdict(user_data).items() if key != "party_id"
+        key: value for key, value in user_data.to_dict().items() if key != "party_id"
     }
 
     # Update user in Firebase
-    firebase_crud = FirebaseCRUD()
+    firebase_crud = get_firebase_crud()
     return firebase_crud.update("User", user_id, user_dict)
 
 
@@ -151,7 +315,7 @@ def delete_user(user_id):
     """
 
     # Delete user in Firebase
-    firebase_crud = FirebaseCRUD()
+    firebase_crud = get_firebase_crud()
     return firebase_crud.delete("User", user_id)
 
 
@@ -175,19 +339,26 @@ def get_parties():
 
     # Get all the party_id from users with the specified email
     # and use them to get the parties names
-    firebase_crud = FirebaseCRUD()
-    users = firebase_crud.where("User", "email", "==", user_email)
+    firebase_crud = get_firebase_crud()
+    users = firebase_crud.where("User", "email", "==", user_email, fields=MEMBERSHIP_FIELDS)
     if users["code"] == 200:
-        parties = []
-        for user in users["data"]:
-            party = firebase_crud.read("Party", user["party_id"])
-            if party["code"] == 200:
-                parties.append(party["data"])
-        return {
-            "code": 200,
-            "message": "Parties retrieved successfully",
-            "data": parties,
-        }
+        # Fetch every party in one batched read
+        parties = firebase_crud.read_many(
+            "Party", [user["party_id"] for user in users["data"]], fields=PARTY_SUMMARY_FIELDS
+        )
+        if parties["code"] != 200:
+            return parties
+
+        # Answer polling clients that already have this version without building the body
+        etag = compute_etag("parties", users.get("versions", {}), parties.get("versions", {}))
+        return not_modified(request, etag) or with_etag(
+            {
+                "code": 200,
+                "message": "Parties retrieved successfully",
+                "data": parties["data"],
+            },
+            etag,
+        )
     else:
         return users
 
@@ -205,47 +376,135 @@ def get_party(party_id, owner_id=None):
     Returns:
         dict: A dictionary containing the party information.
     """
+    # Page through the members when the client asks for it
+    limit = request.args.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            return {"code": 400, "message": f"Limit must be an integer between 1 and {MAX_PAGE_SIZE}"}
+        return get_party_page(party_id, owner_id, limit, request.args.get("after"))
+
     # Get party from Firebase
-    print(party_id)
-    firebase_crud = FirebaseCRUD()
-    party = firebase_crud.read("Party", party_id)
+    firebase_crud = get_firebase_crud()
+
+    # Read the party in the background while the members stream in
+    party_future = firebase_crud.submit("read", "Party", party_id)
+
+    # Build the member list page by page, in the shape of the response, without
+    # holding every member snapshot at once: the anonymous view drops the IDs as they come
+    users = []
+    versions = {}
+    is_member = False
+    try:
+        for user in firebase_crud.where_stream(
+            "User", "party_id", "==", party_id, page_size=MAX_PAGE_SIZE, fields=MEMBER_FIELDS, versions=versions
+        ):
+            if owner_id is None:
+                user.pop("id", None)
+            elif user["id"] == owner_id:
+                is_member = True
+            users.append(user)
+    except Exception as e:
+        return {"code": 500, "message": f"Failed to retrieve documents: {str(e)}"}
+
+    # Ensure party exists
+    party = party_future.result()
+    if party["code"] != 200:
+        return party
+
+    # if owner id is not null and the owner id is not in the users list, then return error
+    if owner_id is not None and not is_member:
+        return {
+            "code": 400,
+            "message": "Owner id is not valid",
+        }
+
+    # Answer polling clients that already have this version without building the body
+    etag = compute_etag("party", is_member, party.get("version"), versions)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    # if owner id is not null and the owner id is in the users list, then return all party and user data including the owner id and the user ids,
+    # otherwise return only the party data without the owner_id and the user ids
+    data = party["data"] if is_member else {key: value for key, value in party["data"].items() if key != "ownerId"}
+    data["users"] = users
+    return with_etag(
+        {
+            "code": 200,
+            "message": "Party retrieved successfully",
+            "data": data,
+        },
+        etag,
+    )
+
+
+def get_party_page(party_id, owner_id, limit, cursor):
+    """
+    Gets a party with one page of its users.
+
+    Args:
+        party_id (str): The ID of the party to get.
+        owner_id (str): The ID of the owner of the party.
+        limit (int): The maximum number of users to return.
+        cursor (str): The "next" cursor of the previous page, if any.
+
+    Returns:
+        dict: A dictionary containing the party information and the cursor of the next page.
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return {"code": 400, "message": f"Limit must be between 1 and {MAX_PAGE_SIZE}"}
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return {"code": 400, "message": str(e)}
+
+    # Get the party, the page of users and the owner at the same time
+    firebase_crud = get_firebase_crud()
+    party_future = firebase_crud.submit("read", "Party", party_id)
+    users_future = firebase_crud.submit(
+        "page", "User", "party_id", "==", party_id, limit, after=after, fields=MEMBER_FIELDS
+    )
+    owner_future = firebase_crud.submit("read", "User", owner_id, fields=MEMBERSHIP_FIELDS) if owner_id else None
 
     # Ensure party exists
-    if party["code"] == 200:
-        # Get all users from Firebase associated with the party
-        users = firebase_crud.where("User", "party_id", "==", party_id)
-        if users["code"] == 200:
-            party["data"]["users"] = users["data"]
-            # if owner id is not null and the owner id is in the users list, then return all party and user data including the owner id and the user ids
-            if owner_id is not None and any(user["id"] == owner_id for user in users["data"]):
-                return {
-                    "code": 200,
-                    "message": "Party retrieved successfully",
-                    "data": party["data"],
-                }
-            # if owner id is not null and the owner id is not in the users list, then return error
-            elif owner_id is not None and not any(user["id"] == owner_id for user in users["data"]):
-                return {
-                    "code": 400,
-                    "message": "Owner id is not valid",
-                }
-            # if owner id is null, then return only the party data without the owner_id and the user ids
-            else:
-                return {
-                    "code": 200,
-                    "message": "Party retrieved successfully",
-                    "data": {
-                        key: [
-                            {k: v for k, v in user.items() if k != "id"}
-                            for user in value
-                        ] if key == "users" else value
-                        for key, value in party["data"].items()
-                        if key not in ["ownerId"]
-                    }
-                }
-    return party
+    party = party_future.result()
+    if party["code"] != 200:
+        users_future.cancel()
+        if owner_future is not None:
+            owner_future.cancel()
+        return party
+
+    users = users_future.result()
+    if users["code"] != 200:
+        return users
+
+    # The owner id must belong to a user of the party, which may not be on this page
+    if owner_id is not None:
+        owner = owner_future.result()
+        if owner["code"] != 200 or owner["data"].get("party_id") != party_id:
+            return {
+                "code": 400,
+                "message": "Owner id is not valid",
+            }
+        data = party["data"]
+        data["users"] = users["data"]
+    # if owner id is null, then return only the party data without the owner_id and the user ids
+    else:
+        data = {key: value for key, value in party["data"].items() if key != "ownerId"}
+        data["users"] = [{k: v for k, v in user.items() if k != "id"} for user in users["data"]]
+
+    return {
+        "code": 200,
+        "message": "Party retrieved successfully",
+        "data": data,
+        "next": encode_cursor(users["next"]) if users["next"] else None,
+    }
 
 
 # Run Flask
 if __name__ == "__main__":
+    # Open the Firestore client before serving the first request
+    get_firebase_crud()
     app.run(port=5000, host="0.0.0.0", debug=True)
@@ -0,0 +1,84 @@
+from array import array
+import random
+
+# Number of draws produced per batch
+BATCH_SIZE = 10_000
+
+
+# PlayerColumns class for storing many players as parallel columns instead of dicts
+class PlayerColumns:
+    __slots__ = ("names", "emails")
+
+    def __init__(self, names, emails):
+        if len(names) != len(emails):
+            raise ValueError("Names and emails must have the same length")
+        self.names = names
+        self.emails = emails
+
+    @classmethod
+    def from_data(cls, data):
+        """
+        Builds the columns from a /SecretSanta/ payload.
+
+        Accepts either columnar "names" and "emails" lists, which are used as is,
+        or the usual "players" list of {"name", "email"} objects.
+        """
+        if "names" in data and "emails" in data:
+            return cls(data["names"], data["emails"])
+        players = data.get("players", [])
+        return cls([player["name"] for player in players], [player["email"] for player in players])
+
+    def __len__(self):
+        return len(self.names)
+
+
+def shuffled_cycle(count, rng=random):
+    """Returns the players in random order in a compact array; each one gives to the next."""
+    order = array("L", range(count))
+    rng.shuffle(order)
+    return order
+
+
+def iter_draw(order, categories, rng=random, batch_size=BATCH_SIZE):
+    """
+    Draws every player a receiver and a category, batch by batch.
+
+    Each batch of (gifter, receiver, category) tuples is zipped together from
+    slices of the cycle without building a per-player object, in the order of the
+    cycle. Categories are dealt in shuffled rounds, so each one is used once
+    before any is repeated.
+
+    Args:
+        order (array): The cycle of player indexes from shuffled_cycle.
+        categories (sequence): The categories to draw from.
+        rng: The random number generator to use.
+        batch_size (int): The number of tuples produced per batch.
+
+    Yields:
+        tuple: (gifter index, receiver index, category).
+    """
+    count = len(order)
+    if count == 0:
+        return
+    if not categories:
+        raise ValueError("At least one category is required")
+
+    # The first gifter closes the cycle as the receiver of the last one
+    receivers = order[1:]
+    receivers.append(order[0])
+
+    categories = list(categories)
+    round_rest = []
+    for start in range(0, count, batch_size):
+        end = min(start + batch_size, count)
+
+        # Finish the current round of categories, then deal whole new rounds
+        batch_categories = round_rest[:end - start]
+        del round_rest[:end - start]
+        while len(batch_categories) < end - start:
+            round_ = rng.sample(categories, len(categories))
+            needed = end - start - len(batch_categories)
+            batch_categories += round_[:needed]
+            round_rest = round_[needed:]
+
+        yield from zip(order[start:end], receivers[start:end], batch_categories)
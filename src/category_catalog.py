@@ -0,0 +1,75 @@
+import json
+import os
+import threading
+import time
+
+CATEGORIES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "categories.json")
+
+
+# CategoryCatalog class for sharing the gift categories across requests and threads
+class CategoryCatalog:
+    def __init__(self, path, check_interval=5.0):
+        self.path = path
+
+        # Minimum number of seconds between two mtime checks of the file
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Reads the categories file into an immutable tuple."""
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, "r", encoding="utf-8") as file:
+            self._categories = tuple(json.load(file))
+        self._mtime = mtime
+        self._next_check = time.monotonic() + self.check_interval
+
+    def _reload_if_changed(self):
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                changed = os.stat(self.path).st_mtime_ns != self._mtime
+            except OSError:
+                return
+            if changed:
+                self._load()
+
+    @property
+    def categories(self):
+        """Returns the categories, reloading them at most once per check interval if the file changed."""
+        if time.monotonic() >= self._next_check:
+            self._reload_if_changed()
+        return self._categories
+
+    def merge(self, *extra_categories):
+        """
+        Returns the catalog categories followed by the extra ones, without duplicates.
+
+        Args:
+            *extra_categories: Lists of categories, e.g. a party's categories
+                or a user's suggested_categories. Anything other than a list or
+                tuple, like a single string, is ignored.
+
+        Returns:
+            tuple: The merged categories in first-seen order.
+        """
+        categories = self.categories
+        if not any(extra_categories):
+            return categories
+
+        merged = dict.fromkeys(categories)
+        for extra in extra_categories:
+            if not isinstance(extra, (list, tuple)):
+                # A string would otherwise be merged character by character
+                continue
+            for category in extra:
+                if isinstance(category, str) and category.strip():
+                    merged.setdefault(category.strip())
+        return tuple(merged)
+
+
+# Category catalog loaded once per process
+category_catalog = CategoryCatalog(CATEGORIES_PATH)
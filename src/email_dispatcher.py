@@ -0,0 +1,199 @@
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+QUEUED = "queued"
+SENT = "sent"
+FAILED = "failed"
+
+
+# Compact status codes, indexed by the STATUSES tuple
+STATUSES = (QUEUED, SENT, FAILED)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+# Longest wait in seconds between two checks of the outbox, which other workers may write to
+OUTBOX_POLL_INTERVAL = 5.0
+
+
+# EmailJob class for tracking the delivery progress of a batch of emails
+class EmailJob:
+    def __init__(self, job_id, recipients):
+        self.id = job_id
+
+        # One status byte per recipient and the errors of the failed ones
+        self.recipients = recipients
+        self._statuses = bytearray(len(recipients))
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, index, status, error=None):
+        """Records the delivery outcome of the email at the given index."""
+        with self._lock:
+            self._statuses[index] = STATUS_CODES[status]
+            if error is not None:
+                self._errors[index] = error
+
+    @property
+    def finished(self):
+        return STATUS_CODES[QUEUED] not in self._statuses
+
+    def to_dict(self):
+        """Returns a snapshot of the job progress."""
+        with self._lock:
+            statuses = bytes(self._statuses)
+            errors = dict(self._errors)
+        counts = {status: statuses.count(code) for code, status in enumerate(STATUSES)}
+        return {
+            "id": self.id,
+            "status": "completed" if counts[QUEUED] == 0 else "in_progress",
+            "counts": counts,
+            "recipients": [
+                {"email": email, "status": STATUSES[code], "error": errors.get(index)}
+                for index, (email, code) in enumerate(zip(self.recipients, statuses))
+            ],
+        }
+
+
+# EmailDispatcher class for sending emails in the background
+class EmailDispatcher:
+    """
+    Sends batches of emails in the background and tracks their delivery.
+
+    Without an outbox, the jobs live in memory and are lost with the process.
+    With an EmailOutbox, a job is written to it before anything is sent and a
+    background thread drains it, retrying transient failures, so delivery
+    resumes where it stopped after a restart. The thread starts with the
+    dispatcher unless autostart is False, and then send_due drains the outbox.
+    """
+
+    def __init__(self, email_service, max_workers=None, max_jobs=1000, outbox=None, autostart=True):
+        self.email_service = email_service
+        self.max_jobs = max_jobs
+        self.outbox = outbox
+
+        # Bounded pool of threads draining jobs, each job fanning out over the SMTP pool
+        self._max_workers = max_workers or int(os.environ.get("EMAIL_DISPATCH_WORKERS", 4))
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="email-dispatch")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Wakes the outbox thread on new jobs, and stops it on shutdown
+        self._wake = threading.Event()
+        self._stopped = False
+        self._drain_thread = None
+        if outbox is not None and autostart:
+            self._drain_thread = threading.Thread(target=self._drain, name="email-outbox", daemon=True)
+            self._drain_thread.start()
+
+    def submit(self, emails, recipients=None, job_id=None):
+        """
+        Queues the emails for delivery and returns the ID of the job tracking them.
+
+        Args:
+            emails (iterable): The Email tuples to send, possibly a generator.
+            recipients (list): The recipient addresses in the same order. Required
+                for the job to track a generator without materializing it.
+            job_id (str): The ID of the job, random if not given. A job already
+                known under this ID is kept and the emails are dropped.
+        """
+        job_id = job_id or uuid.uuid4().hex
+        if self.outbox is not None:
+            self.outbox.add_draw(job_id, emails)
+            self._wake.set()
+            return job_id
+
+        if recipients is None:
+            emails = list(emails)
+            recipients = [email.recipient_email for email in emails]
+        with self._lock:
+            if job_id in self._jobs:
+                return job_id
+            job = self._jobs[job_id] = EmailJob(job_id, recipients)
+            self._evict_finished_jobs()
+
+        self._executor.submit(self._send, job, emails)
+        return job.id
+
+    def get_job(self, job_id):
+        """Returns the progress of a job, or None if it is unknown."""
+        if self.outbox is not None:
+            return self.outbox.get_draw(job_id)
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    def send_due(self):
+        """
+        Sends the outbox messages that are due, batch by batch.
+
+        Returns:
+            int: The number of messages attempted.
+        """
+        attempted = 0
+        while not self._stopped:
+            messages = self.outbox.claim(2 * self._max_workers)
+            if not messages:
+                break
+            for future in [self._executor.submit(self._deliver, message) for message in messages]:
+                future.result()
+            attempted += len(messages)
+        return attempted
+
+    def _deliver(self, message):
+        try:
+            self.email_service.send_email(
+                message.recipient_email, message.subject, message.html_content, message_id=message.id
+            )
+        except Exception as e:
+            self.outbox.mark_failed(message, e)
+        else:
+            self.outbox.mark_sent(message.id)
+
+    def _drain(self):
+        while not self._stopped:
+            self._wake.clear()
+            try:
+                self.send_due()
+                delay = self.outbox.next_due()
+            except Exception:
+                # e.g. the database is locked for longer than its timeout, try again later
+                delay = OUTBOX_POLL_INTERVAL
+            # Wait for the next retry or lease expiry, a new job, or another worker's job
+            self._wake.wait(OUTBOX_POLL_INTERVAL if delay is None else min(delay, OUTBOX_POLL_INTERVAL))
+
+    def _send(self, job, emails):
+        try:
+            self.email_service.send_bulk(
+                emails,
+                on_result=lambda index, result: job.record(index, result["status"], result["error"]),
+                collect_results=False,
+            )
+        except Exception as e:
+            # Fail whatever the bulk send did not get to
+            for index, recipient in enumerate(job.to_dict()["recipients"]):
+                if recipient["status"] == QUEUED:
+                    job.record(index, FAILED, str(e))
+
+    def _evict_finished_jobs(self):
+        """Forgets the oldest finished jobs once more than max_jobs are tracked. Must hold the lock."""
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished]:
+            del self._jobs[job_id]
+            if len(self._jobs) <= self.max_jobs:
+                break
+
+    def shutdown(self, wait=True):
+        """
+        Stops accepting jobs and optionally waits for queued emails to be sent.
+
+        With an outbox, only the batch being sent is waited for; the rest stays
+        queued in the outbox for the next dispatcher.
+        """
+        self._stopped = True
+        self._wake.set()
+        if wait and self._drain_thread is not None:
+            self._drain_thread.join()
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,280 @@
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from src.email_dispatcher import QUEUED, SENT, FAILED, STATUSES
+from src.email_service import QuotaExceededError
+
+# Status of a message claimed by a sender, reported as queued
+SENDING = "sending"
+
+# Status of a draw whose messages are still being written, not sent until it is ready
+PENDING = "pending"
+READY = "ready"
+
+# Messages rendered and inserted per write transaction when writing a draw
+INSERT_CHUNK_SIZE = 1000
+
+# A message claimed from the outbox, with the ID it is sent under
+OutboxMessage = namedtuple("OutboxMessage", ["id", "recipient_email", "subject", "html_content", "attempts"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS draws (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    writer TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    draw_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    html TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_by_draw ON messages (draw_id, position);
+CREATE INDEX IF NOT EXISTS messages_due ON messages (status, next_attempt_at);
+"""
+
+# Condition on messages skipping those of draws still being written, with READY as parameter
+READY_DRAW = "EXISTS (SELECT 1 FROM draws WHERE draws.id = messages.draw_id AND draws.status = ?)"
+
+
+def is_transient(error):
+    """
+    Checks whether a send failed for a reason that may go away on its own.
+
+    Args:
+        error (Exception): The exception raised by the send.
+
+    Returns:
+        bool: True for 4xx SMTP replies, dropped connections, network errors
+        and the daily quota, False for permanent failures like a 5xx reply.
+    """
+    if isinstance(error, QuotaExceededError):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, OSError)
+
+
+# EmailOutbox class for keeping the draw emails on disk until they are delivered
+class EmailOutbox:
+    """
+    SQLite outbox of the draw emails, shared by every worker process.
+
+    A draw is fully written before any of it is sent, so a process dying
+    halfway through the sends leaves the remaining messages queued for the
+    next sender instead of lost. Senders claim messages with a lease: a message whose
+    sender died is claimed again once its lease expires. Each message has a
+    stable ID, "<draw ID>.<position>", sent as its Message-ID header so that a
+    message sent twice after a crash shows up once in the mailbox.
+    """
+
+    def __init__(self, path, lease=300.0, max_attempts=8, base_delay=5.0, max_delay=900.0):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        # One connection per process, in autocommit mode so transactions are explicit
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+
+    def _transaction(self, function, *args):
+        """Runs function(connection, *args) in a write transaction."""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = function(self._connection, *args)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            return result
+
+    def add_draw(self, draw_id, emails):
+        """
+        Writes the emails of a draw, unless the draw is already in the outbox.
+
+        The emails are rendered and inserted chunk by chunk, each chunk in its
+        own short transaction, so that other workers keep claiming and marking
+        messages meanwhile. The draw stays pending, and its messages unclaimed,
+        until every chunk is written. A pending draw whose writer stopped
+        updating it for longer than the lease, e.g. because its process died,
+        is written again from scratch.
+
+        Args:
+            draw_id (str): The ID of the draw, also the ID of its job.
+            emails (iterable): The Email tuples to send, possibly a generator.
+
+        Returns:
+            bool: True if the draw was written, False if it already existed.
+        """
+        writer = uuid.uuid4().hex
+
+        def reserve(connection):
+            now = time.time()
+            row = connection.execute("SELECT status, updated_at FROM draws WHERE id = ?", (draw_id,)).fetchone()
+            if row is not None:
+                if row[0] != PENDING or row[1] > now - self.lease:
+                    return False
+                # The writer of this draw died halfway, start it over
+                connection.execute("DELETE FROM messages WHERE draw_id = ?", (draw_id,))
+            connection.execute(
+                "INSERT OR REPLACE INTO draws (id, created_at, status, writer, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (draw_id, now, PENDING, writer, now),
+            )
+            return True
+
+        def write(connection, chunk):
+            updated = connection.execute(
+                "UPDATE draws SET updated_at = ? WHERE id = ? AND writer = ?", (time.time(), draw_id, writer)
+            )
+            if updated.rowcount == 0:
+                # Another writer took the draw over
+                return False
+            connection.executemany(
+                "INSERT INTO messages (id, draw_id, position, recipient, subject, html, status, next_attempt_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                chunk,
+            )
+            return True
+
+        def finalize(connection):
+            connection.execute(
+                "UPDATE draws SET status = ?, writer = NULL WHERE id = ? AND writer = ?", (READY, draw_id, writer)
+            )
+
+        def discard(connection):
+            connection.execute("DELETE FROM messages WHERE draw_id = ?", (draw_id,))
+            connection.execute("DELETE FROM draws WHERE id = ? AND writer = ?", (draw_id, writer))
+
+        if not self._transaction(reserve):
+            return False
+        rows = (
+            (f"{draw_id}.{position}", draw_id, position, *email, QUEUED, time.time())
+            for position, email in enumerate(emails)
+        )
+        try:
+            while True:
+                # Render the chunk before taking the write lock
+                chunk = [row for _, row in zip(range(INSERT_CHUNK_SIZE), rows)]
+                if not chunk:
+                    break
+                if not self._transaction(write, chunk):
+                    return False
+        except BaseException:
+            # Leave no half-written draw behind, so that it can be posted again
+            self._transaction(discard)
+            raise
+        self._transaction(finalize)
+        return True
+
+    def claim(self, limit):
+        """Leases up to limit due messages, including those of senders that died, to the caller."""
+        def claim_due(connection):
+            now = time.time()
+            rows = connection.execute(
+                "SELECT id, recipient, subject, html, attempts FROM messages"
+                " WHERE ((status = ? AND next_attempt_at <= ?) OR (status = ? AND lease_until <= ?))"
+                f" AND {READY_DRAW} ORDER BY next_attempt_at, position LIMIT ?",
+                (QUEUED, now, SENDING, now, READY, limit),
+            ).fetchall()
+            connection.executemany(
+                "UPDATE messages SET status = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                [(SENDING, now + self.lease, row[0]) for row in rows],
+            )
+            return [OutboxMessage(*row[:4], row[4] + 1) for row in rows]
+
+        return self._transaction(claim_due)
+
+    def mark_sent(self, message_id):
+        self._transaction(lambda connection: connection.execute(
+            "UPDATE messages SET status = ?, lease_until = NULL, error = NULL WHERE id = ?", (SENT, message_id)
+        ))
+
+    def mark_failed(self, message, error):
+        """
+        Records a failed send, retrying transient failures with exponential backoff.
+
+        A send refused by the daily quota is requeued for when the quota
+        refills, and does not count toward max_attempts.
+
+        Args:
+            message (OutboxMessage): The claimed message.
+            error (Exception): The exception raised by the send.
+        """
+        attempts = message.attempts
+        if isinstance(error, QuotaExceededError):
+            # Nothing was sent, so wait for the quota to refill without using up an attempt
+            attempts -= 1
+            delay = self.max_delay if error.retry_after is None else error.retry_after
+            status, next_attempt_at = QUEUED, time.time() + delay + random.uniform(0, self.base_delay)
+        elif is_transient(error) and attempts < self.max_attempts:
+            # Jitter keeps the retries of a large draw from all hitting the server at once
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+            status, next_attempt_at = QUEUED, time.time() + random.uniform(delay / 2, delay)
+        else:
+            status, next_attempt_at = FAILED, time.time()
+        self._transaction(lambda connection: connection.execute(
+            "UPDATE messages SET status = ?, attempts = ?, next_attempt_at = ?, lease_until = NULL, error = ?"
+            " WHERE id = ?",
+            (status, attempts, next_attempt_at, str(error), message.id),
+        ))
+
+    def next_due(self):
+        """Returns the seconds until the next message is due, 0 if one is, or None if none is pending."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT MIN(CASE WHEN status = ? THEN next_attempt_at ELSE lease_until END) FROM messages"
+                f" WHERE status IN (?, ?) AND {READY_DRAW}",
+                (QUEUED, QUEUED, SENDING, READY),
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def get_draw(self, draw_id):
+        """Returns the delivery progress of a draw, in the shape of EmailJob.to_dict, or None if it is unknown."""
+        with self._lock:
+            draw = self._connection.execute("SELECT status FROM draws WHERE id = ?", (draw_id,)).fetchone()
+            if draw is None:
+                return None
+            rows = self._connection.execute(
+                "SELECT recipient, status, error FROM messages WHERE draw_id = ? ORDER BY position", (draw_id,)
+            ).fetchall()
+
+        recipients = [
+            {"email": email, "status": QUEUED if status == SENDING else status, "error": error if status == FAILED else None}
+            for email, status, error in rows
+        ]
+        counts = {status: 0 for status in STATUSES}
+        for recipient in recipients:
+            counts[recipient["status"]] += 1
+        return {
+            "id": draw_id,
+            "status": "completed" if counts[QUEUED] == 0 and draw[0] == READY else "in_progress",
+            "counts": counts,
+            "recipients": recipients,
+        }
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,24 +1,415 @@
 import smtplib
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 import os
+from src.metrics import SMTP_SEND_DURATION
+from utilities import server_timing
+
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 587
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# Errors about one message after which smtplib resets the session, leaving it usable for the next one
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+# A single outgoing message
+Email = namedtuple("Email", ["recipient_email", "subject", "html_content"])
+
+
+class QuotaExceededError(Exception):
+    """Raised when the daily sending quota of the provider is used up."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+
+        # Seconds until the quota allows another send, if known
+        self.retry_after = retry_after
+
+
+# TokenBucket class for limiting the rate of an operation
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        # Tokens added per second and maximum number of tokens stored
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        """Adds the tokens earned since the last update. Must hold the lock."""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Takes a token if one is available without waiting."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def time_until_available(self):
+        """Returns the seconds until a token is available, 0 if one is."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+    def acquire(self):
+        """Takes a token, sleeping until one is available."""
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+RATE_LIMITS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+# SharedTokenBucket class for a token bucket shared by every process using the same SQLite file
+class SharedTokenBucket:
+    """
+    Token bucket kept in a SQLite table, e.g. the one of the email outbox.
+
+    Every worker process takes its tokens from the same row, so the limit holds
+    for all of them together, and the tokens left survive restarts. Time is the
+    wall clock, since it is compared across processes.
+    """
+
+    def __init__(self, path, name, rate, capacity):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+
+        # One connection per bucket, in autocommit mode so transactions are explicit
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(RATE_LIMITS_SCHEMA)
+
+    def _take(self, take):
+        """Refills the bucket and takes a token if take and one is available, returning (taken, tokens before)."""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._connection.execute(
+                    "SELECT tokens, updated_at FROM rate_limits WHERE name = ?", (self.name,)
+                ).fetchone()
+                if row is None:
+                    tokens = self.capacity
+                else:
+                    tokens = min(self.capacity, row[0] + max(0.0, now - row[1]) * self.rate)
+                taken = take and tokens >= 1
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO rate_limits (name, tokens, updated_at) VALUES (?, ?, ?)",
+                    (self.name, tokens - 1 if taken else tokens, now),
+                )
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+        return taken, tokens
+
+    def try_acquire(self):
+        """Takes a token if one is available without waiting."""
+        return self._take(True)[0]
+
+    def time_until_available(self):
+        """Returns the seconds until a token is available, 0 if one is."""
+        return max(0.0, (1 - self._take(False)[1]) / self.rate)
+
+    def acquire(self):
+        """Takes a token, sleeping until one is available."""
+        while True:
+            taken, tokens = self._take(True)
+            if taken:
+                return
+            time.sleep((1 - tokens) / self.rate)
+
+
+# RateLimiter class for staying under the per-second and per-day sending caps of the provider
+class RateLimiter:
+    def __init__(self, per_second, per_day, path=None, name=""):
+        # Without a shared SQLite file the caps only hold for this process
+        if path is None:
+            self.per_second = TokenBucket(per_second, max(1, per_second))
+            self.per_day = TokenBucket(per_day / SECONDS_PER_DAY, per_day)
+        else:
+            self.per_second = SharedTokenBucket(path, f"{name}/second", per_second, max(1, per_second))
+            self.per_day = SharedTokenBucket(path, f"{name}/day", per_day / SECONDS_PER_DAY, per_day)
+
+    def acquire(self):
+        """Waits for a per-second slot, failing fast once the daily quota is used up."""
+        if not self.per_day.try_acquire():
+            raise QuotaExceededError("Daily sending quota exceeded", retry_after=self.per_day.time_until_available())
+        self.per_second.acquire()
+
+
+# SMTPConnectionPool class for keeping authenticated SMTP sessions alive between sends
+class SMTPConnectionPool:
+    def __init__(
+        self,
+        sender_email,
+        sender_password,
+        host=SMTP_HOST,
+        port=SMTP_PORT,
+        max_size=4,
+        idle_timeout=60.0,
+        health_check_interval=15.0,
+        smtp_class=None,
+    ):
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.host = host
+        self.port = port
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+
+        # Class opening the sessions, smtplib.SMTP unless a stand-in is given
+        self.smtp_class = smtp_class
+
+        # Idle sessions as (session, last_used) pairs, most recently used last
+        self._idle = []
+        self._open_count = 0
+        self._condition = threading.Condition()
+
+        # Timer closing the idle sessions once they expire, scheduled while any session is idle
+        self._reaper = None
+
+    def _connect(self):
+        """Opens a new session and performs STARTTLS and login."""
+        session = (self.smtp_class or smtplib.SMTP)(self.host, self.port)
+        try:
+            session.starttls()
+            session.login(self.sender_email, self.sender_password)
+        except Exception:
+            self._close_session(session)
+            raise
+        return session
+
+    @staticmethod
+    def _close_session(session):
+        """Closes a session, ignoring errors from an already dead connection."""
+        try:
+            session.quit()
+        except Exception:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_healthy(session):
+        """Checks that the server still answers on the session."""
+        try:
+            return session.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _reap_idle(self, now):
+        """Removes idle sessions past the idle timeout. Must hold the condition lock."""
+        expired = [entry for entry in self._idle if now - entry[1] >= self.idle_timeout]
+        if expired:
+            self._idle = [entry for entry in self._idle if now - entry[1] < self.idle_timeout]
+            self._open_count -= len(expired)
+            self._condition.notify_all()
+        return [session for session, _ in expired]
+
+    def _schedule_reaper(self):
+        """Starts the reaper timer for when the oldest idle session expires. Must hold the condition lock."""
+        if self._reaper is not None or not self._idle:
+            return
+        delay = max(0.0, self._idle[0][1] + self.idle_timeout - time.monotonic())
+        self._reaper = threading.Timer(delay, self._reap)
+        self._reaper.daemon = True
+        self._reaper.start()
+
+    def _reap(self):
+        """Closes the expired idle sessions, so that they do not wait for the next acquire."""
+        with self._condition:
+            self._reaper = None
+            expired = self._reap_idle(time.monotonic())
+            self._schedule_reaper()
+        for session in expired:
+            self._close_session(session)
+
+    def acquire(self):
+        """Returns a healthy authenticated session, blocking while the pool is exhausted."""
+        while True:
+            with self._condition:
+                expired = self._reap_idle(time.monotonic())
+                while not self._idle and self._open_count >= self.max_size:
+                    self._condition.wait()
+                if self._idle:
+                    session, last_used = self._idle.pop()
+                else:
+                    session, last_used = None, None
+                    self._open_count += 1
+
+            for expired_session in expired:
+                self._close_session(expired_session)
+
+            if session is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._discard_slot()
+                    raise
+
+            # Only probe sessions that have been idle for a while to avoid a round trip per send
+            if time.monotonic() - last_used < self.health_check_interval or self._is_healthy(session):
+                return session
+            self.discard(session)
+
+    def release(self, session):
+        """Returns a session to the pool for reuse."""
+        with self._condition:
+            self._idle.append((session, time.monotonic()))
+            self._condition.notify()
+            self._schedule_reaper()
+
+    def discard(self, session):
+        """Closes a broken session and frees its slot in the pool."""
+        self._close_session(session)
+        self._discard_slot()
+
+    def _discard_slot(self):
+        with self._condition:
+            self._open_count -= 1
+            self._condition.notify()
+
+    def sendmail(self, recipient_email, message):
+        """Sends a message on a pooled session, reconnecting once if the server dropped it."""
+        for attempt in range(2):
+            session = self.acquire()
+            try:
+                session.sendmail(self.sender_email, recipient_email, message)
+            except smtplib.SMTPServerDisconnected:
+                self.discard(session)
+                if attempt:
+                    raise
+            except MESSAGE_ERRORS:
+                # The session is still authenticated, only this message was refused. If the server
+                # closed it instead, the next send gets SMTPServerDisconnected and reconnects.
+                self.release(session)
+                raise
+            except Exception:
+                self.discard(session)
+                raise
+            else:
+                self.release(session)
+                return
+
+    def close(self):
+        """Closes every idle session."""
+        with self._condition:
+            if self._reaper is not None:
+                self._reaper.cancel()
+                self._reaper = None
+            idle, self._idle = self._idle, []
+            self._open_count -= len(idle)
+            self._condition.notify_all()
+        for session, _ in idle:
+            self._close_session(session)
+
+
+# Process-wide pools, one per sender account
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_smtp_pool(sender_email, sender_password):
+    """Returns the process-wide SMTP pool for the given sender account."""
+    key = (sender_email, sender_password)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = SMTPConnectionPool(
+                    sender_email,
+                    sender_password,
+                    max_size=int(os.environ.get("SMTP_MAX_CONNECTIONS", 4)),
+                    idle_timeout=float(os.environ.get("SMTP_IDLE_TIMEOUT", 60)),
+                )
+                _pools[key] = pool
+    return pool
+
+
+# Process-wide rate limiters, one per sender account
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(sender_email):
+    """
+    Returns the process-wide rate limiter for the given sender account.
+
+    With EMAIL_OUTBOX_PATH set, the sending caps are kept in the outbox file and
+    shared by every worker; otherwise each process has caps of its own.
+    """
+    rate_limiter = _rate_limiters.get(sender_email)
+    if rate_limiter is None:
+        with _rate_limiters_lock:
+            rate_limiter = _rate_limiters.get(sender_email)
+            if rate_limiter is None:
+                rate_limiter = RateLimiter(
+                    per_second=float(os.environ.get("SMTP_RATE_PER_SECOND", 5)),
+                    per_day=float(os.environ.get("SMTP_RATE_PER_DAY", 500)),
+                    path=os.environ.get("EMAIL_OUTBOX_PATH"),
+                    name=sender_email or "",
+                )
+                _rate_limiters[sender_email] = rate_limiter
+    return rate_limiter
+
 
 # EmailService class for handling email operations
 class EmailService:
-    def __init__(self):
+    def __init__(self, pool=None, rate_limiter=None):
         # Get sender email and password from environment variables
         self.sender_email = os.environ.get("SENDER_EMAIL")
         self.sender_password = os.environ.get("SENDER_PASSWORD")
 
+        # Reuse authenticated sessions across messages and requests
+        self.pool = pool or get_smtp_pool(self.sender_email, self.sender_password)
+
+        # Share the provider sending caps across every sender thread
+        self.rate_limiter = rate_limiter or get_rate_limiter(self.sender_email)
+
     # Function to send an email
-    def send_email(self, recipient_email, subject, html_content):
+    def send_email(self, recipient_email, subject, html_content, message_id=None):
         # Create a multipart message
         message = MIMEMultipart()
         message['From'] = self.sender_email
         message['To'] = recipient_email
         message['Subject'] = subject
 
+        # A stable Message-ID lets mailboxes drop the copy of a message sent again after a crash
+        if message_id is not None:
+            domain = (self.sender_email or "").rpartition("@")[2] or "localhost"
+            message['Message-ID'] = f"<{message_id}@{domain}>"
+
         # Create an alternative part for the message
         msgAlternative = MIMEMultipart('alternative')
         message.attach(msgAlternative)
@@ -27,8 +418,57 @@ class EmailService:
         msgText = MIMEText(html_content, 'html')
         msgAlternative.attach(msgText)
 
-        # Connect to the SMTP server and send the email
-        with smtplib.SMTP("smtp.gmail.com", 587) as session:
-            session.starttls()
-            session.login(self.sender_email, self.sender_password)
-            session.sendmail(self.sender_email, recipient_email, message.as_string())
\ No newline at end of file
+        # Wait for the rate limiter and send the email on a pooled SMTP session,
+        # timing only the send itself
+        self.rate_limiter.acquire()
+        start = time.perf_counter()
+        result = "failed"
+        try:
+            self.pool.sendmail(recipient_email, message.as_string())
+            result = "sent"
+        finally:
+            duration = time.perf_counter() - start
+            SMTP_SEND_DURATION.observe(duration, result)
+            server_timing.record("smtp", duration)
+
+    # Function to send many emails over concurrent SMTP sessions
+    def send_bulk(self, emails, on_result=None, collect_results=True):
+        """
+        Sends the emails over up to one SMTP session per pool slot.
+
+        The emails are consumed lazily, so a generator streams through with only
+        a few messages in flight at a time.
+
+        Args:
+            emails (iterable): The Email tuples to send.
+            on_result (callable): Called with (index, result) as each email finishes.
+            collect_results (bool): Whether to build and return the result list.
+
+        Returns:
+            list: One {"email", "status", "error"} result per email, in input order,
+            with status "sent" or "failed" so failed recipients can be retried.
+            None if collect_results is False.
+        """
+        results = [] if collect_results else None
+
+        def send(index, email):
+            try:
+                self.send_email(*email)
+            except Exception as e:
+                result = {"email": email.recipient_email, "status": "failed", "error": str(e)}
+            else:
+                result = {"email": email.recipient_email, "status": "sent", "error": None}
+            if results is not None:
+                results[index] = result
+            if on_result is not None:
+                on_result(index, result)
+
+        workers = self.pool.max_size
+        in_flight = threading.BoundedSemaphore(2 * workers)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="email-bulk") as executor:
+            for index, email in enumerate(emails):
+                if results is not None:
+                    results.append(None)
+                in_flight.acquire()
+                executor.submit(send, index, email).add_done_callback(lambda _: in_flight.release())
+        return results
@@ -0,0 +1,28 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Thread pool shared by every request for independent backend calls, created on first use
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns the process-wide fan-out thread pool."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.environ.get("FIRESTORE_FANOUT_WORKERS", 32)),
+                    thread_name_prefix="firestore-fanout",
+                )
+    return _executor
+
+
+def submit(function, *args, **kwargs):
+    """Runs the function on the fan-out pool, in a copy of the caller's context, and returns its Future."""
+    # The copy carries the request's Server-Timing accounting over to the pool thread
+    context = contextvars.copy_context()
+    return get_executor().submit(context.run, function, *args, **kwargs)
@@ -0,0 +1,265 @@
+import threading
+import time
+from collections import OrderedDict
+from src import fanout
+
+# Seconds a cached document or query result stays fresh, per collection
+DEFAULT_TTLS = {"Party": 10.0, "User": 5.0}
+DEFAULT_TTL = 5.0
+
+# Seconds a "Document not found" answer stays cached
+NEGATIVE_TTL = 2.0
+
+
+def _copy_response(response):
+    """Copies a response deep enough that callers can modify its documents."""
+    data = response.get("data")
+    if isinstance(data, dict):
+        return {**response, "data": dict(data)}
+    if isinstance(data, list):
+        return {**response, "data": [dict(document) for document in data]}
+    return dict(response)
+
+
+def _fields_key(fields):
+    """Returns a hashable key for a field projection."""
+    return None if fields is None else tuple(fields)
+
+
+# CachedFirebaseCRUD class for serving repeated reads from memory
+class CachedFirebaseCRUD:
+    def __init__(self, crud, max_entries=1024, ttls=None, default_ttl=DEFAULT_TTL, negative_ttl=NEGATIVE_TTL):
+        self.crud = crud
+        self.max_entries = max_entries
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+
+        # Entries as key -> (expires_at, response), least recently used first
+        self._entries = OrderedDict()
+
+        # Bumped on every write to a collection so in-flight reads do not cache stale results
+        self._generations = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getattr__(self, name):
+        # Anything not cached goes straight to the wrapped FirebaseCRUD
+        return getattr(self.crud, name)
+
+    def _get(self, key):
+        """Returns a fresh cached response, or None. Must hold the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _put(self, key, response, ttl, generation):
+        """Caches a response unless the collection was written since generation. Must hold the lock."""
+        if self._generations.get(key[1], 0) != generation:
+            return
+        self._entries[key] = (time.monotonic() + ttl, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _ttl(self, collection, response):
+        if response["code"] == 404:
+            return self.negative_ttl
+        return self.ttls.get(collection, self.default_ttl)
+
+    def _cached(self, key, load):
+        """Returns the cached response for key, loading and caching it on a miss."""
+        collection = key[1]
+        with self._lock:
+            response = self._get(key)
+            if response is not None:
+                self.hits += 1
+                return _copy_response(response)
+            self.misses += 1
+            generation = self._generations.get(collection, 0)
+
+        response = load()
+        if response["code"] in (200, 404):
+            with self._lock:
+                self._put(key, _copy_response(response), self._ttl(collection, response), generation)
+        return response
+
+    def read(self, collection, document_id, fields=None):
+        """Reads a document, from the cache when possible."""
+        return self._cached(
+            ("read", collection, document_id, _fields_key(fields)),
+            lambda: self.crud.read(collection, document_id, fields=fields),
+        )
+
+    def read_many(self, collection, document_ids, fields=None):
+        """Reads several documents, fetching only the ones that are not cached in one batch."""
+        document_ids = list(dict.fromkeys(document_ids))
+        fields_key = _fields_key(fields)
+        found = {}
+        versions = {}
+        missing = []
+        with self._lock:
+            generation = self._generations.get(collection, 0)
+            for document_id in document_ids:
+                response = self._get(("read", collection, document_id, fields_key))
+                if response is None:
+                    missing.append(document_id)
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    if response["code"] == 200:
+                        found[document_id] = dict(response["data"])
+                        versions[document_id] = response.get("version")
+
+        if missing:
+            response = self.crud.read_many(collection, missing, fields=fields)
+            if response["code"] != 200:
+                return response
+            fetched = {document["id"]: document for document in response["data"]}
+            fetched_versions = response.get("versions", {})
+            with self._lock:
+                for document_id in missing:
+                    if document_id in fetched:
+                        cached = {
+                            "code": 200,
+                            "message": "Document read successfully",
+                            "data": dict(fetched[document_id]),
+                            "version": fetched_versions.get(document_id),
+                        }
+                    else:
+                        cached = {"code": 404, "message": "Document not found"}
+                    self._put(("read", collection, document_id, fields_key), cached, self._ttl(collection, cached), generation)
+            found.update(fetched)
+            versions.update(fetched_versions)
+
+        return {
+            "code": 200,
+            "message": "Documents read successfully",
+            "data": [found[document_id] for document_id in document_ids if document_id in found],
+            "versions": versions,
+        }
+
+    def where(self, collection, field, operator, value, fields=None):
+        """Runs a query, from the cache when possible."""
+        return self._cached(
+            ("where", collection, field, operator, repr(value), _fields_key(fields)),
+            lambda: self.crud.where(collection, field, operator, value, fields=fields),
+        )
+
+    def page(self, collection, field, operator, value, limit, after=None, fields=None):
+        """Retrieves one page of a query, from the cache when possible."""
+        return self._cached(
+            ("page", collection, field, operator, repr(value), limit, after, _fields_key(fields)),
+            lambda: self.crud.page(collection, field, operator, value, limit, after=after, fields=fields),
+        )
+
+    def where_stream(self, collection, field, operator, value, page_size=500, fields=None, versions=None):
+        """
+        Streams a query, from the cached result of the same where query when possible.
+
+        On a miss the documents are streamed from the store page by page, and
+        the complete result is cached for where and where_stream once the
+        stream is exhausted.
+        """
+        key = ("where", collection, field, operator, repr(value), _fields_key(fields))
+        versions = {} if versions is None else versions
+        with self._lock:
+            response = self._get(key)
+            if response is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                generation = self._generations.get(collection, 0)
+        if response is not None:
+            versions.update(response.get("versions", {}))
+            for document in response["data"]:
+                yield dict(document)
+            return
+
+        data = []
+        for document in self.crud.where_stream(
+            collection, field, operator, value, page_size=page_size, fields=fields, versions=versions
+        ):
+            data.append(dict(document))
+            yield document
+        response = {"code": 200, "message": "Documents retrieved successfully", "data": data, "versions": dict(versions)}
+        with self._lock:
+            self._put(key, response, self._ttl(collection, response), generation)
+
+    def create(self, collection, data):
+        """Creates a document and invalidates the queries on its collection."""
+        response = self.crud.create(collection, data)
+        self.invalidate(collection, response.get("id"))
+        return response
+
+    def update(self, collection, document_id, data):
+        """Updates a document and invalidates it and the queries on its collection."""
+        response = self.crud.update(collection, document_id, data)
+        self.invalidate(collection, document_id)
+        return response
+
+    def delete(self, collection, document_id):
+        """Deletes a document and invalidates it and the queries on its collection."""
+        response = self.crud.delete(collection, document_id)
+        self.invalidate(collection, document_id)
+        return response
+
+    def run_transaction(self, callback):
+        """Runs a transaction and invalidates every document it wrote."""
+        response = self.crud.run_transaction(callback)
+        for collection, document_id in response.get("writes", []):
+            self.invalidate(collection, document_id)
+        return response
+
+    def batch_write(self, operations):
+        """Commits a batch of writes and invalidates every document it wrote."""
+        response = self.crud.batch_write(operations)
+        for operation, document_id in zip(operations, response.get("ids", [])):
+            self.invalidate(operation[1], document_id)
+        return response
+
+    def submit(self, method, *args, **kwargs):
+        """Starts the named method in the background and returns its Future."""
+        return fanout.submit(getattr(self, method), *args, **kwargs)
+
+    def invalidate(self, collection, document_id=None):
+        """
+        Drops cached results of a collection.
+
+        Drops the given document and every query on the collection, or every
+        entry of the collection when no document is given.
+        """
+        with self._lock:
+            self._generations[collection] = self._generations.get(collection, 0) + 1
+            if document_id is None:
+                stale = [key for key in self._entries if key[1] == collection]
+            else:
+                stale = [key for key in self._entries if key[1] == collection and (key[0] != "read" or key[2] == document_id)]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        """Drops every cached result."""
+        with self._lock:
+            self._entries.clear()
+            for collection in self._generations:
+                self._generations[collection] += 1
+
+    def stats(self):
+        """Returns the hit, miss and eviction counters and the number of cached entries."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
@@ -1,12 +1,64 @@
 import os
 import json
+import threading
 import firebase_admin
 from firebase_admin import credentials
 from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
 from google.api_core.exceptions import NotFound
+from src.firebase_cache import CachedFirebaseCRUD
+from src.instrumented_storage import InstrumentedBackend
+from src.memory_storage import MemoryStorage
+from src.storage_backend import StorageBackend
 
 
-class FirebaseCRUD:
+def _version(doc):
+    """Returns the update time of a document snapshot as an RFC 3339 string, or None."""
+    update_time = doc.update_time
+    if update_time is None:
+        return None
+    rfc3339 = getattr(update_time, "rfc3339", None)
+    return rfc3339() if rfc3339 else update_time.isoformat()
+
+
+# FirestoreTransaction class for reading and writing documents inside a transaction
+class FirestoreTransaction:
+    def __init__(self, db, transaction):
+        self.db = db
+        self.transaction = transaction
+
+        # (collection, document ID) pairs written by the transaction
+        self.writes = []
+
+    def read(self, collection, document_id):
+        """Reads a document, returning its data with its ID or None if it does not exist."""
+        doc = self.db.collection(collection).document(document_id).get(transaction=self.transaction)
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        data["id"] = doc.id
+        return data
+
+    def create(self, collection, data):
+        """Creates a document and returns its ID."""
+        doc_ref = self.db.collection(collection).document()
+        self.transaction.create(doc_ref, data)
+        self.writes.append((collection, doc_ref.id))
+        return doc_ref.id
+
+    def update(self, collection, document_id, data):
+        """Updates a document."""
+        self.transaction.update(self.db.collection(collection).document(document_id), data)
+        self.writes.append((collection, document_id))
+
+    def delete(self, collection, document_id):
+        """Deletes a document."""
+        self.transaction.delete(self.db.collection(collection).document(document_id))
+        self.writes.append((collection, document_id))
+
+
+# FirebaseCRUD class for storing the app's documents in Firestore
+class FirebaseCRUD(StorageBackend):
     def __init__(self):
         # Initialize Firebase app
         if not firebase_admin._apps:
@@ -35,10 +87,10 @@ class FirebaseCRUD:
         except Exception as e:
             return {"code": 500, "message": f"Failed to create document: {str(e)}"}
 
-    def read(self, collection, document_id):
-        """Reads a document from the specified collection."""
+    def read(self, collection, document_id, fields=None):
+        """Reads a document from the specified collection, only fetching the given fields if any."""
         try:
-            doc = self.db.collection(collection).document(document_id).get()
+            doc = self.db.collection(collection).document(document_id).get(field_paths=fields)
             # add document ID to data
             if doc.exists:
                 data = doc.to_dict()
@@ -47,12 +99,42 @@ class FirebaseCRUD:
                     "code": 200,
                     "message": "Document read successfully",
                     "data": data,
+                    "version": _version(doc),
                 }
             else:
                 return {"code": 404, "message": "Document not found"}
         except Exception as e:
             return {"code": 500, "message": f"Failed to read document: {str(e)}"}
 
+    def read_many(self, collection, document_ids, fields=None):
+        """Reads several documents from the specified collection in a single batched request."""
+        try:
+            # Deduplicate while keeping the first-seen order
+            document_ids = list(dict.fromkeys(document_ids))
+            if not document_ids:
+                return {"code": 200, "message": "Documents read successfully", "data": [], "versions": {}}
+
+            collection_ref = self.db.collection(collection)
+            refs = [collection_ref.document(document_id) for document_id in document_ids]
+
+            # get_all returns the documents in any order
+            found = {}
+            versions = {}
+            for doc in self.db.get_all(refs, field_paths=fields):
+                if doc.exists:
+                    data = doc.to_dict()
+                    data["id"] = doc.id
+                    found[doc.id] = data
+                    versions[doc.id] = _version(doc)
+            return {
+                "code": 200,
+                "message": "Documents read successfully",
+                "data": [found[document_id] for document_id in document_ids if document_id in found],
+                "versions": versions,
+            }
+        except Exception as e:
+            return {"code": 500, "message": f"Failed to read documents: {str(e)}"}
+
     def update(self, collection, document_id, data):
         """Updates a document in the specified collection with the provided data."""
         try:
@@ -73,20 +155,169 @@ class FirebaseCRUD:
         except Exception as e:
             return {"code": 500, "message": f"Failed to delete document: {str(e)}"}
 
-    def where(self, collection, field, operator, value):
+    def where(self, collection, field, operator, value, fields=None):
         """Retrieves all documents from the specified collection that match the provided query."""
         try:
-            docs = self.db.collection(collection).where(field, operator, value).get()
+            query = self.db.collection(collection).where(field, operator, value)
+            # Only fetch and deserialize the requested fields
+            if fields is not None:
+                query = query.select(fields)
+            docs = query.get()
             # add document ID to data
             data = []
+            versions = {}
             for doc in docs:
                 doc_data = doc.to_dict()
                 doc_data["id"] = doc.id
                 data.append(doc_data)
+                versions[doc.id] = _version(doc)
             return {
                 "code": 200,
                 "message": "Documents retrieved successfully",
                 "data": data,
+                "versions": versions,
             }
         except Exception as e:
             return {"code": 500, "message": f"Failed to retrieve documents: {str(e)}"}
+
+    def _page_query(self, collection, field, operator, value, limit, after=None, fields=None):
+        """Builds a query for up to limit matching documents ordered by ID, starting after the given ID."""
+        query = (
+            self.db.collection(collection)
+            .where(field, operator, value)
+            .order_by(FieldPath.document_id())
+            .limit(limit)
+        )
+        if fields is not None:
+            query = query.select(fields)
+        if after is not None:
+            query = query.start_after({FieldPath.document_id(): after})
+        return query
+
+    def page(self, collection, field, operator, value, limit, after=None, fields=None):
+        """
+        Retrieves one page of the documents matching the query, ordered by document ID.
+
+        Returns:
+            dict: The status, the documents of the page and "next", the ID to pass
+            as after to get the following page, or None on the last page.
+        """
+        try:
+            # Ask for one extra document to know whether another page follows
+            data = []
+            versions = {}
+            for doc in self._page_query(collection, field, operator, value, limit + 1, after, fields).stream():
+                doc_data = doc.to_dict()
+                doc_data["id"] = doc.id
+                data.append(doc_data)
+                versions[doc.id] = _version(doc)
+            page = data[:limit]
+            return {
+                "code": 200,
+                "message": "Documents retrieved successfully",
+                "data": page,
+                "versions": {document["id"]: versions[document["id"]] for document in page},
+                "next": data[limit - 1]["id"] if len(data) > limit else None,
+            }
+        except Exception as e:
+            return {"code": 500, "message": f"Failed to retrieve documents: {str(e)}"}
+
+    def run_transaction(self, callback):
+        """
+        Runs callback(transaction) atomically and returns its result as "data".
+
+        The callback receives a FirestoreTransaction, must do all its reads before
+        its writes, and is run again if Firestore detects a conflicting write.
+        """
+        try:
+            transactions = []
+
+            @firestore.transactional
+            def run(transaction):
+                transactions.append(FirestoreTransaction(self.db, transaction))
+                return callback(transactions[-1])
+
+            result = run(self.db.transaction())
+            return {
+                "code": 200,
+                "message": "Transaction committed successfully",
+                "data": result,
+                "writes": transactions[-1].writes,
+            }
+        except Exception as e:
+            return {"code": 500, "message": f"Failed to run transaction: {str(e)}"}
+
+    def batch_write(self, operations):
+        """
+        Commits several writes atomically in a single request.
+
+        Args:
+            operations (list): ("create", collection, data), ("update", collection,
+                document_id, data) or ("delete", collection, document_id) tuples.
+
+        Returns:
+            dict: The status and the IDs of the written documents, in order.
+        """
+        try:
+            batch = self.db.batch()
+            ids = []
+            for operation, collection, *args in operations:
+                collection_ref = self.db.collection(collection)
+                if operation == "create":
+                    doc_ref = collection_ref.document()
+                    batch.create(doc_ref, args[0])
+                elif operation == "update":
+                    doc_ref = collection_ref.document(args[0])
+                    batch.update(doc_ref, args[1])
+                elif operation == "delete":
+                    doc_ref = collection_ref.document(args[0])
+                    batch.delete(doc_ref)
+                else:
+                    raise ValueError(f"Unknown batch operation {operation}")
+                ids.append(doc_ref.id)
+            batch.commit()
+            return {"code": 200, "message": "Batch committed successfully", "ids": ids}
+        except NotFound:
+            return {"code": 404, "message": "Document to update not found"}
+        except Exception as e:
+            return {"code": 500, "message": f"Failed to commit batch: {str(e)}"}
+
+
+# FirebaseCRUD shared by every request of the worker process
+_shared_crud = None
+_shared_crud_lock = threading.Lock()
+
+
+def get_firebase_crud():
+    """
+    Returns the FirebaseCRUD shared by the current process, creating it on first use.
+
+    Reusing one Firestore client keeps its gRPC channel warm instead of going
+    through the app initialization check and client lookup on every request.
+    Reads go through an in-process cache unless FIRESTORE_CACHE_SIZE is 0, and
+    the calls that reach the store are timed for the /metrics endpoint.
+    With STORAGE_BACKEND=memory, documents are kept in process memory instead
+    of Firestore, so the app runs without network or credentials.
+    """
+    global _shared_crud
+    if _shared_crud is None:
+        with _shared_crud_lock:
+            if _shared_crud is None:
+                backend = os.environ.get("STORAGE_BACKEND", "firestore")
+                if backend == "memory":
+                    crud = MemoryStorage()
+                elif backend == "firestore":
+                    crud = FirebaseCRUD()
+                else:
+                    raise ValueError(f"Unknown storage backend {backend}")
+                crud = InstrumentedBackend(crud)
+                cache_size = int(os.environ.get("FIRESTORE_CACHE_SIZE", 1024))
+                _shared_crud = CachedFirebaseCRUD(crud, max_entries=cache_size) if cache_size > 0 else crud
+    return _shared_crud
+
+
+def reset_firebase_crud():
+    """Forgets the shared FirebaseCRUD, e.g. in a freshly forked worker."""
+    global _shared_crud
+    with _shared_crud_lock:
+        _shared_crud = None
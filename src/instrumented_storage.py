@@ -0,0 +1,83 @@
+import time
+from src.metrics import STORAGE_DURATION, STORAGE_ERRORS
+from src.storage_backend import StorageBackend
+from utilities import server_timing
+
+# Server-Timing entry each operation is counted under
+OPERATION_TIMINGS = {
+    "create": "firestore-write",
+    "read": "firestore-read",
+    "read_many": "firestore-read",
+    "update": "firestore-write",
+    "delete": "firestore-write",
+    "where": "firestore-query",
+    "page": "firestore-query",
+    "run_transaction": "firestore-write",
+    "batch_write": "firestore-write",
+}
+
+
+# InstrumentedBackend class for timing every call to the storage backend
+class InstrumentedBackend(StorageBackend):
+    """
+    Wraps a StorageBackend and records the duration of each of its calls.
+
+    Durations go to the storage_operation_duration_seconds histogram and
+    responses with a code other than 200, or exceptions, to the
+    storage_operation_errors_total counter, both by operation and collection.
+    It sits below the read cache, so only the calls that reach the store count.
+    Each call is also added to the Server-Timing accounting of the current request.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        # Anything not timed goes straight to the wrapped backend
+        return getattr(self.backend, name)
+
+    def _timed(self, operation, collection, function, *args, **kwargs):
+        """Calls function and records its duration and outcome."""
+        start = time.perf_counter()
+        try:
+            response = function(*args, **kwargs)
+        except Exception:
+            STORAGE_ERRORS.inc(operation, collection, "exception")
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            STORAGE_DURATION.observe(duration, operation, collection)
+            server_timing.record(OPERATION_TIMINGS[operation], duration)
+        if response["code"] != 200:
+            STORAGE_ERRORS.inc(operation, collection, str(response["code"]))
+        return response
+
+    def create(self, collection, data):
+        return self._timed("create", collection, self.backend.create, collection, data)
+
+    def read(self, collection, document_id, fields=None):
+        return self._timed("read", collection, self.backend.read, collection, document_id, fields=fields)
+
+    def read_many(self, collection, document_ids, fields=None):
+        return self._timed("read_many", collection, self.backend.read_many, collection, document_ids, fields=fields)
+
+    def update(self, collection, document_id, data):
+        return self._timed("update", collection, self.backend.update, collection, document_id, data)
+
+    def delete(self, collection, document_id):
+        return self._timed("delete", collection, self.backend.delete, collection, document_id)
+
+    def where(self, collection, field, operator, value, fields=None):
+        return self._timed("where", collection, self.backend.where, collection, field, operator, value, fields=fields)
+
+    def page(self, collection, field, operator, value, limit, after=None, fields=None):
+        return self._timed(
+            "page", collection, self.backend.page, collection, field, operator, value, limit, after=after, fields=fields
+        )
+
+    def run_transaction(self, callback):
+        # A transaction can span collections, so it is recorded under none
+        return self._timed("run_transaction", "", self.backend.run_transaction, callback)
+
+    def batch_write(self, operations):
+        return self._timed("batch_write", "", self.backend.batch_write, operations)
@@ -0,0 +1,77 @@
+import html
+import os
+import re
+import threading
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "mail.html")
+
+# Matches {{name}} placeholders, allowing whitespace around the name
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+# MailTemplate class for rendering an HTML template with {{name}} placeholders
+class MailTemplate:
+    def __init__(self, path, auto_reload=None):
+        self.path = path
+
+        # Reload when the file changes, by default only while developing
+        if auto_reload is None:
+            auto_reload = os.environ.get("TEMPLATES_AUTO_RELOAD", os.environ.get("FLASK_DEBUG", "")) in ("1", "true")
+        self.auto_reload = auto_reload
+
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Reads and compiles the template file."""
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, "r", encoding="utf-8") as file:
+            source = file.read()
+        # Swapped in as one tuple so concurrent renders never mix two versions
+        self._compiled = self.compile(source)
+        self.placeholders = frozenset(name for _, name in self._compiled[1])
+        self._mtime = mtime
+
+    @staticmethod
+    def compile(source):
+        """
+        Splits a template into literal chunks and placeholder slots.
+
+        Returns:
+            tuple: The list of parts, with None where a value goes, and the
+            list of (index, name) pairs locating each placeholder in it.
+        """
+        parts = []
+        slots = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(source):
+            parts.append(source[position:match.start()])
+            slots.append((len(parts), match.group(1)))
+            parts.append(None)
+            position = match.end()
+        parts.append(source[position:])
+        return parts, slots
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._load()
+
+    def render(self, **context):
+        """Renders the template, HTML-escaping every value."""
+        if self.auto_reload:
+            self._reload_if_changed()
+        parts, slots = self._compiled
+        rendered = parts.copy()
+        for index, name in slots:
+            rendered[index] = html.escape(str(context[name]))
+        return "".join(rendered)
+
+
+# Mail template compiled once per process
+mail_template = MailTemplate(TEMPLATE_PATH)
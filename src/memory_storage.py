@@ -0,0 +1,363 @@
+import bisect
+import copy
+import itertools
+import operator
+import os
+import threading
+import time
+import uuid
+from src.storage_backend import StorageBackend
+
+# Fields looked up by equality on each collection, kept in hash indexes
+DEFAULT_INDEXES = {"User": ("email", "party_id")}
+
+
+def _array_contains_any(field_value, values):
+    return isinstance(field_value, list) and any(value in field_value for value in values)
+
+
+# Firestore query operators, as predicates on (field value, query value)
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda field_value, values: field_value in values,
+    "not-in": lambda field_value, values: field_value not in values,
+    "array-contains": lambda field_value, value: isinstance(field_value, list) and value in field_value,
+    "array-contains-any": _array_contains_any,
+}
+
+
+def _hashable(value):
+    try:
+        hash(value)
+        return True
+    except TypeError:
+        return False
+
+
+# MemoryTransaction class for reading and writing documents inside a MemoryStorage transaction
+class MemoryTransaction:
+    def __init__(self, storage):
+        self.storage = storage
+
+        # Writes are applied together when the callback returns, like a Firestore commit
+        self.operations = []
+
+        # (collection, document ID) pairs written by the transaction
+        self.writes = []
+
+    def read(self, collection, document_id):
+        """Reads a document, returning its data with its ID or None if it does not exist."""
+        return self.storage._get(collection, document_id)
+
+    def create(self, collection, data):
+        """Creates a document and returns its ID."""
+        document_id = self.storage.new_id()
+        self.operations.append(("create", collection, document_id, data))
+        self.writes.append((collection, document_id))
+        return document_id
+
+    def update(self, collection, document_id, data):
+        """Updates a document."""
+        self.operations.append(("update", collection, document_id, data))
+        self.writes.append((collection, document_id))
+
+    def delete(self, collection, document_id):
+        """Deletes a document."""
+        self.operations.append(("delete", collection, document_id))
+        self.writes.append((collection, document_id))
+
+
+# MemoryStorage class for running the app without Firestore, e.g. locally or under load tests
+class MemoryStorage(StorageBackend):
+    """
+    Thread-safe in-memory storage backend.
+
+    Equality queries on indexed fields are answered from hash indexes in time
+    proportional to the number of matches, other queries scan the collection.
+    Documents are copied in and out so callers never share state with the store.
+    """
+
+    def __init__(self, indexes=None, latency=None):
+        # Fields indexed per collection
+        self.indexed_fields = DEFAULT_INDEXES if indexes is None else indexes
+
+        # Seconds slept per call to mimic the round trip to a remote database
+        if latency is None:
+            latency = float(os.environ.get("STORAGE_LATENCY_MS", 0)) / 1000
+        self.latency = latency
+
+        # Documents as collection -> document ID -> data
+        self._collections = {}
+
+        # Versions as (collection, document ID) -> number of the write that stored it
+        self._versions = {}
+        self._write_numbers = itertools.count(1)
+
+        # Indexes as (collection, field) -> value -> set of document IDs
+        self._indexes = {
+            (collection, field): {} for collection, fields in self.indexed_fields.items() for field in fields
+        }
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def new_id():
+        """Returns a new random document ID."""
+        return uuid.uuid4().hex[:20]
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _get(self, collection, document_id, fields=None):
+        """Returns a copy of a document with its ID, or None. Takes the lock."""
+        with self._lock:
+            data = self._collections.get(collection, {}).get(document_id)
+            if data is None:
+                return None
+            if fields is not None:
+                data = {field: data[field] for field in fields if field in data}
+            data = copy.deepcopy(data)
+        data["id"] = document_id
+        return data
+
+    def _versions_of(self, collection, documents):
+        """Returns the versions of the given documents by ID. Must hold the lock."""
+        return {document["id"]: self._versions[(collection, document["id"])] for document in documents}
+
+    def _index(self, collection, document_id, data, add):
+        """Adds a document to the indexes of its collection, or removes it. Must hold the lock."""
+        for field in self.indexed_fields.get(collection, ()):
+            value = data.get(field)
+            if value is None or not _hashable(value):
+                continue
+            index = self._indexes[(collection, field)]
+            if add:
+                index.setdefault(value, set()).add(document_id)
+            else:
+                ids = index.get(value)
+                if ids is not None:
+                    ids.discard(document_id)
+                    if not ids:
+                        del index[value]
+
+    def _put(self, collection, document_id, data):
+        """Stores a document, replacing any previous version. Must hold the lock."""
+        documents = self._collections.setdefault(collection, {})
+        previous = documents.get(document_id)
+        if previous is not None:
+            self._index(collection, document_id, previous, add=False)
+        documents[document_id] = data
+        self._versions[(collection, document_id)] = next(self._write_numbers)
+        self._index(collection, document_id, data, add=True)
+
+    def _remove(self, collection, document_id):
+        """Deletes a document if it exists. Must hold the lock."""
+        previous = self._collections.get(collection, {}).pop(document_id, None)
+        if previous is not None:
+            del self._versions[(collection, document_id)]
+            self._index(collection, document_id, previous, add=False)
+
+    def _apply(self, operations):
+        """
+        Applies (operation, collection, document_id[, data]) writes all or nothing. Must hold the lock.
+
+        Raises:
+            KeyError: If a document to update does not exist.
+        """
+        created = set()
+        for operation, collection, document_id, *data in operations:
+            if operation == "create":
+                created.add((collection, document_id))
+            elif operation == "update":
+                if document_id not in self._collections.get(collection, {}) and (collection, document_id) not in created:
+                    raise KeyError(document_id)
+            elif operation != "delete":
+                raise ValueError(f"Unknown batch operation {operation}")
+
+        for operation, collection, document_id, *data in operations:
+            if operation == "create":
+                self._put(collection, document_id, copy.deepcopy(data[0]))
+            elif operation == "update":
+                previous = self._collections[collection][document_id]
+                self._put(collection, document_id, {**previous, **copy.deepcopy(data[0])})
+            else:
+                self._remove(collection, document_id)
+
+    def _matching_ids(self, collection, field, operator_, value):
+        """Returns the sorted IDs of the documents matching a query. Must hold the lock."""
+        index = self._indexes.get((collection, field))
+        if index is not None and operator_ == "==" and _hashable(value):
+            ids = index.get(value, ())
+        elif index is not None and operator_ == "in" and all(_hashable(item) for item in value):
+            ids = set().union(*(index.get(item, ()) for item in value))
+        else:
+            predicate = OPERATORS.get(operator_)
+            if predicate is None:
+                raise ValueError(f"Unsupported operator {operator_}")
+            # Like Firestore, documents without the field never match
+            ids = [
+                document_id
+                for document_id, data in self._collections.get(collection, {}).items()
+                if field in data and predicate(data[field], value)
+            ]
+        return sorted(ids)
+
+    def seed(self, collection, documents):
+        """
+        Stores documents directly, without latency, e.g. to load a dataset before a test.
+
+        Args:
+            collection (str): The collection to store the documents in.
+            documents (iterable): Dicts, stored under their "id" key or a new ID.
+
+        Returns:
+            list: The IDs of the stored documents.
+        """
+        ids = []
+        with self._lock:
+            for document in documents:
+                data = copy.deepcopy(document)
+                document_id = data.pop("id", None) or self.new_id()
+                self._put(collection, document_id, data)
+                ids.append(document_id)
+        return ids
+
+    def create(self, collection, data):
+        """Creates a document in the specified collection with the provided data."""
+        self._round_trip()
+        document_id = self.new_id()
+        with self._lock:
+            self._put(collection, document_id, copy.deepcopy(data))
+        return {
+            "code": 200,
+            "message": "Document created successfully",
+            "id": document_id,
+        }
+
+    def read(self, collection, document_id, fields=None):
+        """Reads a document from the specified collection, only returning the given fields if any."""
+        self._round_trip()
+        with self._lock:
+            data = self._get(collection, document_id, fields)
+            version = self._versions.get((collection, document_id))
+        if data is None:
+            return {"code": 404, "message": "Document not found"}
+        return {
+            "code": 200,
+            "message": "Document read successfully",
+            "data": data,
+            "version": version,
+        }
+
+    def read_many(self, collection, document_ids, fields=None):
+        """Reads several documents from the specified collection."""
+        self._round_trip()
+        data = []
+        with self._lock:
+            for document_id in dict.fromkeys(document_ids):
+                document = self._get(collection, document_id, fields)
+                if document is not None:
+                    data.append(document)
+            versions = self._versions_of(collection, data)
+        return {"code": 200, "message": "Documents read successfully", "data": data, "versions": versions}
+
+    def update(self, collection, document_id, data):
+        """Updates a document in the specified collection with the provided data."""
+        self._round_trip()
+        with self._lock:
+            try:
+                self._apply([("update", collection, document_id, data)])
+            except KeyError:
+                return {"code": 404, "message": "Document to update not found"}
+        return {"code": 200, "message": "Document updated successfully"}
+
+    def delete(self, collection, document_id):
+        """Deletes a document from the specified collection."""
+        self._round_trip()
+        # Like Firestore, deleting a missing document succeeds
+        with self._lock:
+            self._remove(collection, document_id)
+        return {"code": 200, "message": "Document deleted successfully"}
+
+    def where(self, collection, field, operator, value, fields=None):
+        """Retrieves all documents from the specified collection that match the provided query."""
+        self._round_trip()
+        try:
+            with self._lock:
+                data = [
+                    self._get(collection, document_id, fields)
+                    for document_id in self._matching_ids(collection, field, operator, value)
+                ]
+                versions = self._versions_of(collection, data)
+        except Exception as e:
+            return {"code": 500, "message": f"Failed to retrieve documents: {str(e)}"}
+        return {
+            "code": 200,
+            "message": "Documents retrieved successfully",
+            "data": data,
+            "versions": versions,
+        }
+
+    def page(self, collection, field, operator, value, limit, after=None, fields=None):
+        """Retrieves one page of the documents matching the query, ordered by document ID."""
+        self._round_trip()
+        try:
+            with self._lock:
+                ids = self._matching_ids(collection, field, operator, value)
+                start = 0 if after is None else bisect.bisect_right(ids, after)
+                page_ids = ids[start:start + limit]
+                data = [self._get(collection, document_id, fields) for document_id in page_ids]
+                versions = self._versions_of(collection, data)
+        except Exception as e:
+            return {"code": 500, "message": f"Failed to retrieve documents: {str(e)}"}
+        return {
+            "code": 200,
+            "message": "Documents retrieved successfully",
+            "data": data,
+            "versions": versions,
+            "next": page_ids[-1] if start + limit < len(ids) else None,
+        }
+
+    def run_transaction(self, callback):
+        """
+        Runs callback(transaction) atomically and returns its result as "data".
+
+        The store is locked for the whole callback, so transactions never conflict.
+        """
+        self._round_trip()
+        try:
+            with self._lock:
+                transaction = MemoryTransaction(self)
+                result = callback(transaction)
+                self._apply(transaction.operations)
+            return {
+                "code": 200,
+                "message": "Transaction committed successfully",
+                "data": result,
+                "writes": transaction.writes,
+            }
+        except Exception as e:
+            return {"code": 500, "message": f"Failed to run transaction: {str(e)}"}
+
+    def batch_write(self, operations):
+        """Commits several writes atomically, see FirebaseCRUD.batch_write."""
+        self._round_trip()
+        resolved = []
+        for operation, collection, *args in operations:
+            if operation == "create":
+                resolved.append((operation, collection, self.new_id(), args[0]))
+            else:
+                resolved.append((operation, collection, *args))
+        try:
+            with self._lock:
+                self._apply(resolved)
+        except KeyError:
+            return {"code": 404, "message": "Document to update not found"}
+        except Exception as e:
+            return {"code": 500, "message": f"Failed to commit batch: {str(e)}"}
+        return {"code": 200, "message": "Batch committed successfully", "ids": [operation[2] for operation in resolved]}
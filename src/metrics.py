@@ -0,0 +1,299 @@
+import bisect
+import glob
+import json
+import math
+import os
+import threading
+import time
+
+# Upper bounds in seconds of the latency histogram buckets, like the Prometheus client defaults
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# MetricsRegistry class for collecting the samples recorded by every thread of the process
+class MetricsRegistry:
+    """
+    Holds the metrics and the per-thread shards their samples are recorded in.
+
+    Each thread records into its own dict, so recording takes no lock: the lock
+    is only taken when a thread records for the first time and when the shards
+    are merged for a scrape. Shards of finished threads are folded into one.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._shards = []
+        self._retired = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        # Directory shared with the other worker processes, see enable_multiprocess
+        self.directory = None
+        self._path = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def shard(self):
+        """Returns the dict the current thread records its samples in."""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _merge_into(self, merged, key, values):
+        current = merged.get(key)
+        if current is None:
+            merged[key] = list(values)
+        else:
+            for index, value in enumerate(values):
+                current[index] += value
+
+    def snapshot(self, gauges=True):
+        """Returns the samples of this process as {(metric name, label values): values}, with or without the gauges."""
+        merged = {}
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    for key, values in list(shard.items()):
+                        self._merge_into(self._retired, key, values)
+            self._shards = alive
+            for key, values in self._retired.items():
+                merged[key] = list(values)
+            for _, shard in alive:
+                for key, values in list(shard.items()):
+                    self._merge_into(merged, key, values)
+
+        for metric in self.metrics.values() if gauges else ():
+            if isinstance(metric, Gauge):
+                for labels, value in metric.collect().items():
+                    merged[(metric.name, tuple(labels))] = [value]
+        return merged
+
+    def enable_multiprocess(self, directory, flush_interval=5.0):
+        """
+        Shares the samples of this worker with the other workers through files in directory.
+
+        The worker writes its snapshot there every flush_interval seconds and on
+        every scrape, and a scrape adds up the files of every worker, including
+        the ones that exited so that counters never go down. A worker exiting
+        calls flush(final=True), which drops its gauges from its file since
+        their values only held while it was running.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._path = os.path.join(directory, f"metrics-{os.getpid()}-{time.time_ns()}.json")
+
+        def flush_periodically():
+            while True:
+                time.sleep(flush_interval)
+                self.flush()
+
+        threading.Thread(target=flush_periodically, name="metrics-flush", daemon=True).start()
+
+    def flush(self, final=False):
+        """Writes the snapshot of this worker to its file, without the gauges if final, if multiprocess mode is enabled."""
+        if self._path is None:
+            return
+        series = [[name, list(labels), values] for (name, labels), values in self.snapshot(gauges=not final).items()]
+        temporary = f"{self._path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(series, file)
+        os.replace(temporary, self._path)
+
+    def collect(self):
+        """Returns the samples of every worker, or of this process only without multiprocess mode."""
+        if self.directory is None:
+            return self.snapshot()
+        self.flush()
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    series = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, labels, values in series:
+                self._merge_into(merged, (name, tuple(labels)), values)
+        return merged
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        samples = self.collect()
+        by_metric = {}
+        for (name, labels), values in samples.items():
+            by_metric.setdefault(name, []).append((labels, values))
+
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for labels, values in sorted(by_metric.get(name, [])):
+                lines.extend(metric.format(labels, values))
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        """Drops every recorded sample of this process, e.g. between tests."""
+        with self._lock:
+            for _, shard in self._shards:
+                shard.clear()
+            self._retired.clear()
+
+
+# Registry of the process
+REGISTRY = MetricsRegistry()
+
+
+# Counter class for counting events, e.g. errors
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        registry.register(self)
+
+    def inc(self, *labelvalues, amount=1):
+        """Adds amount to the counter of the given label values."""
+        shard = self.registry.shard()
+        key = (self.name, labelvalues)
+        values = shard.get(key)
+        if values is None:
+            shard[key] = [amount]
+        else:
+            values[0] += amount
+
+    def format(self, labels, values):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(values[0])}"]
+
+
+# Histogram class for recording the distribution of durations
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) if buckets[-1] == math.inf else tuple(buckets) + (math.inf,)
+        self.registry = registry
+        registry.register(self)
+
+    def observe(self, value, *labelvalues):
+        """Records a value, in seconds for durations, for the given label values."""
+        shard = self.registry.shard()
+        key = (self.name, labelvalues)
+        values = shard.get(key)
+        if values is None:
+            # The count of each bucket, not cumulative, then the sum of the values
+            values = shard[key] = [0] * (len(self.buckets) + 1)
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def time(self, *labelvalues):
+        """Returns a context manager observing the duration of its block."""
+        return _Timer(self, labelvalues)
+
+    def format(self, labels, values):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, values):
+            cumulative += count
+            le = _format_labels(self.labelnames, labels, (("le", _format_number(bound)),))
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        label_text = _format_labels(self.labelnames, labels)
+        lines.append(f"{self.name}_sum{label_text} {_format_number(float(values[-1]))}")
+        lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labelvalues", "start")
+
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+
+
+# Gauge class for values read when the metrics are collected, e.g. the size of a cache
+class Gauge:
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+        # Function returning {label values tuple: value}
+        self.callback = callback
+        self.registry = registry
+        registry.register(self)
+
+    def collect(self):
+        if self.callback is None:
+            return {}
+        try:
+            return self.callback()
+        except Exception:
+            # A broken callback must not break the whole scrape
+            return {}
+
+    def format(self, labels, values):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(values[0])}"]
+
+
+# Metrics of the app
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Duration of the HTTP requests by route.", ("method", "route")
+)
+RESPONSES = Counter(
+    "http_responses_total", "HTTP responses by route and status code.", ("method", "route", "status")
+)
+STORAGE_DURATION = Histogram(
+    "storage_operation_duration_seconds",
+    "Duration of the storage backend calls by operation and collection.",
+    ("operation", "collection"),
+)
+STORAGE_ERRORS = Counter(
+    "storage_operation_errors_total",
+    "Storage backend calls that did not succeed, by operation, collection and code.",
+    ("operation", "collection", "code"),
+)
+SMTP_SEND_DURATION = Histogram(
+    "smtp_send_duration_seconds", "Duration of the SMTP sends by result.", ("result",)
+)
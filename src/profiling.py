@@ -0,0 +1,163 @@
+import hmac
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+# Header carrying the profiler token of a request to profile
+TOKEN_HEADER = "X-Profile-Token"
+
+# Header of the response naming the file its profile was written to
+FILE_HEADER = "X-Profile-File"
+
+
+def _frame_label(code):
+    """Returns the collapsed-stack label of a function, without the separators of the format."""
+    filename = os.path.relpath(code.co_filename) if code.co_filename.startswith(os.getcwd()) else code.co_filename
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+# StackSampler class for sampling the call stack of one thread
+class StackSampler:
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+
+        # Collapsed stack, root first -> number of samples
+        self.counts = {}
+
+        # Labels by code object, so that a sample does not format the same function twice
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops sampling and returns the sample counts."""
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            labels = []
+            while frame is not None:
+                label = self._labels.get(frame.f_code)
+                if label is None:
+                    label = self._labels[frame.f_code] = _frame_label(frame.f_code)
+                labels.append(label)
+                frame = frame.f_back
+            stack = ";".join(reversed(labels))
+            self.counts[stack] = self.counts.get(stack, 0) + 1
+
+
+# RequestProfiler class for profiling single live requests on demand
+class RequestProfiler:
+    """
+    Samples the stack of requests that ask for it and writes collapsed stacks.
+
+    A request is profiled when it sends the configured token in the
+    X-Profile-Token header, or every request when profile_all is set. Without
+    a token nor profile_all, the profiler is disabled and costs one attribute
+    check per request. Only one request is profiled at a time per process.
+
+    The files hold one "frame;frame;frame count" line per stack, the format of
+    flamegraph.pl and speedscope. Each is capped at max_bytes by dropping the
+    rarest stacks, and only the max_files most recent files are kept.
+    """
+
+    def __init__(self, token=None, profile_all=False, directory=None, interval=0.005, max_files=20, max_bytes=1024 * 1024):
+        self.token = token
+        self.profile_all = profile_all
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "secret-santa-profiles")
+        self.interval = interval
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.enabled = bool(token) or profile_all
+        self._busy = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Creates the profiler configured by the PROFILER_* environment variables."""
+        return cls(
+            token=os.environ.get("PROFILER_TOKEN"),
+            profile_all=os.environ.get("PROFILER_ALL_REQUESTS") == "1",
+            directory=os.environ.get("PROFILER_DIR"),
+            interval=float(os.environ.get("PROFILER_INTERVAL_MS", 5)) / 1000,
+            max_files=int(os.environ.get("PROFILER_MAX_FILES", 20)),
+            max_bytes=int(os.environ.get("PROFILER_MAX_BYTES", 1024 * 1024)),
+        )
+
+    def wants(self, headers):
+        """Checks whether a request with the given headers should be profiled."""
+        if self.profile_all:
+            return True
+        token = headers.get(TOKEN_HEADER)
+        return token is not None and hmac.compare_digest(token.encode(), self.token.encode())
+
+    def start(self):
+        """Starts sampling the current thread, or returns None if another request is being profiled."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        try:
+            return StackSampler(threading.get_ident(), self.interval).start()
+        except Exception:
+            self._busy.release()
+            raise
+
+    def stop(self, sampler, name):
+        """
+        Stops a sampler and writes its stacks to a file.
+
+        Args:
+            sampler (StackSampler): The sampler returned by start.
+            name (str): What was profiled, e.g. the route, used in the file name.
+
+        Returns:
+            str: The name of the written file, or None if no sample was taken.
+        """
+        try:
+            counts = sampler.stop()
+        finally:
+            self._busy.release()
+        if not counts:
+            return None
+
+        # Keep the most frequent stacks that fit in the size cap
+        lines = []
+        size = 0
+        for stack, count in sorted(counts.items(), key=lambda item: -item[1]):
+            line = f"{stack} {count}\n"
+            size += len(line.encode())
+            if size > self.max_bytes:
+                break
+            lines.append(line)
+
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", name).strip("-") or "request"
+        filename = f"{time.strftime('%Y%m%dT%H%M%S')}-{time.time_ns() % 10**9:09d}-{slug}-{os.getpid()}.folded"
+        with open(os.path.join(self.directory, filename), "w", encoding="utf-8") as file:
+            file.writelines(lines)
+        self._prune()
+        return filename
+
+    def _prune(self):
+        """Deletes the oldest profiles beyond max_files."""
+        paths = [
+            os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".folded")
+        ]
+        paths.sort(key=lambda path: (os.path.getmtime(path), path))
+        for path in paths[:-self.max_files] if self.max_files > 0 else paths:
+            try:
+                os.remove(path)
+            except OSError:
+                # Already pruned by another worker
+                pass
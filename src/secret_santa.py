@@ -1,6 +1,116 @@
+from collections import deque
 from random import shuffle
-import json
 import random
+from src.bulk_draw import PlayerColumns, iter_draw, shuffled_cycle
+from src.category_catalog import category_catalog
+from src.email_service import Email
+from src.mail_template import mail_template
+
+# Number of random receivers tried for a gifter before searching for an augmenting path
+RANDOM_PICK_ATTEMPTS = 32
+
+
+class AssignmentError(ValueError):
+    """Raised when no assignment satisfies the exclusions."""
+
+
+def find_assignment(count, exclusions, rng=random, labels=None):
+    """
+    Finds a random derangement of range(count) that avoids the excluded pairs.
+
+    Gifters draw random free receivers first, and when that fails a breadth-first
+    search for an augmenting path (Kuhn's algorithm) over the allowed pairs moves
+    earlier choices around. Each search visits a gifter at most once and takes
+    O(count) per visited gifter for the set difference with its exclusions, so
+    a search costs O(count^2) in the worst case. Searches only run for gifters
+    whose random picks all failed, which is rare unless exclusions are dense.
+
+    Args:
+        count (int): The number of players.
+        exclusions (list): For each gifter, the set of receivers it must not draw.
+        rng: The random number generator to use.
+        labels (list): Names of the players used in error messages.
+
+    Returns:
+        list: The receiver of each gifter.
+
+    Raises:
+        AssignmentError: If no valid assignment exists.
+    """
+    if count == 0:
+        return []
+    if count == 1:
+        raise AssignmentError("At least two players are required")
+
+    label = labels.__getitem__ if labels else str
+
+    # Fail fast on players that cannot draw anybody
+    for gifter in range(count):
+        excluded = exclusions[gifter]
+        if len(excluded) >= count - 1 and len(excluded - {gifter}) >= count - 1:
+            raise AssignmentError(f"Player {label(gifter)} is excluded from drawing every other player")
+
+    receiver_of = [None] * count
+    gifter_of = [None] * count
+
+    # Free receivers in random order, with their positions for O(1) removal
+    free = list(range(count))
+    rng.shuffle(free)
+    position = {receiver: index for index, receiver in enumerate(free)}
+
+    def take(receiver):
+        index = position.pop(receiver)
+        last = free.pop()
+        if last != receiver:
+            free[index] = last
+            position[last] = index
+
+    def augment(start):
+        # Receivers not reached yet by the search, and the gifter that reached each one
+        unvisited = set(range(count))
+        reached_by = {}
+        queue = deque([start])
+        while queue:
+            gifter = queue.popleft()
+            reachable = unvisited - exclusions[gifter]
+            reachable.discard(gifter)
+            unvisited -= reachable
+            for receiver in reachable:
+                reached_by[receiver] = gifter
+                if gifter_of[receiver] is None:
+                    # Flip the path back to the start
+                    take(receiver)
+                    while receiver is not None:
+                        gifter = reached_by[receiver]
+                        previous = receiver_of[gifter]
+                        receiver_of[gifter] = receiver
+                        gifter_of[receiver] = gifter
+                        receiver = previous
+                    return True
+                queue.append(gifter_of[receiver])
+        return False
+
+    gifters = list(range(count))
+    rng.shuffle(gifters)
+    for gifter in gifters:
+        excluded = exclusions[gifter]
+        for _ in range(min(RANDOM_PICK_ATTEMPTS, len(free))):
+            receiver = free[rng.randrange(len(free))]
+            if receiver != gifter and receiver not in excluded:
+                take(receiver)
+                receiver_of[gifter] = receiver
+                gifter_of[receiver] = gifter
+                break
+        else:
+            if not augment(gifter):
+                # Without an augmenting path no complete assignment exists, name the usual culprit
+                for receiver in range(count):
+                    if all(receiver in exclusions[other] for other in range(count) if other != receiver):
+                        raise AssignmentError(f"Player {label(receiver)} is excluded from being drawn by every other player")
+                raise AssignmentError("No assignment satisfies the exclusions")
+
+    return receiver_of
+
 
 # SecretSanta class for handling Secret Santa operations
 class SecretSanta:
@@ -10,19 +120,38 @@ class SecretSanta:
         self.data = data
         self.email_service = email_service
 
-        # Open and read the categories.json file
-        with open("categories.json", "r") as file:
-            # Load categories from the json file
-            self.categories = json.load(file)
+        # Merge the shared catalog with the party's categories and the players' suggestions,
+        # as posted by the client: the draw does not read the party back from Firestore
+        self.categories = list(
+            category_catalog.merge(
+                data.get("categories", []),
+                *(player.get("suggested_categories", []) for player in data.get("players", [])),
+            )
+        )
 
         # Make a copy of the categories to available_categories
         self.available_categories = self.categories.copy()
 
     # Function to assign Secret Santa and send emails
     def assign_and_send_emails(self):
+        # Build every email first and send them in one bulk call
+        return self.email_service.send_bulk(self.assign())
+
+    # Function to assign Secret Santa and build the emails for every gifter
+    def assign(self):
         # Shuffle the players to ensure random assignment
         shuffle(self.data["players"])
 
+        # Draw the receivers, respecting the exclusions if there are any
+        exclusions = self.build_exclusions()
+        if any(exclusions):
+            labels = [player["email"] for player in self.data["players"]]
+            self.receivers = find_assignment(len(exclusions), exclusions, labels=labels)
+        else:
+            self.receivers = [(index + 1) % len(exclusions) for index in range(len(exclusions))]
+
+        emails = []
+
         # Loop through each player
         for index, player in enumerate(self.data["players"]):
             # Pick a duo for gifting
@@ -34,8 +163,67 @@ class SecretSanta:
             # Create a link for the gift
             link = self.create_link(gifter["name"], receiver["name"], category)
 
-            # Send email to the gifter
-            self.email_service.send_email(gifter["email"], "Secret Santa!", link)
+            # Render the email for the gifter
+            html_content = mail_template.render(gifter=gifter["name"], link=link)
+            emails.append(Email(gifter["email"], "Secret Santa!", html_content))
+
+        return emails
+
+    # Function to assign Secret Santa for very large events, streaming the emails
+    def assign_bulk(self):
+        """
+        Draws a single shuffled cycle over columnar player data.
+
+        Returns:
+            tuple: The recipient addresses, in sending order, and a generator
+            of the Email tuples to send to them.
+        """
+        if any(self.data.get(key) for key in ("exclusions", "households", "previous_assignments")):
+            raise AssignmentError("Exclusions are not supported by the bulk draw")
+
+        columns = PlayerColumns.from_data(self.data)
+        names, addresses = columns.names, columns.emails
+        order = shuffled_cycle(len(columns))
+
+        def build_emails():
+            for gifter, receiver, category in iter_draw(order, self.categories):
+                link = self.create_link(names[gifter], names[receiver], category)
+                html_content = mail_template.render(gifter=names[gifter], link=link)
+                yield Email(addresses[gifter], "Secret Santa!", html_content)
+
+        return [addresses[gifter] for gifter in order], build_emails()
+
+    # Function to build the set of receivers each player must not draw
+    def build_exclusions(self):
+        players = self.data["players"]
+        index_of = {player["email"]: index for index, player in enumerate(players)}
+        exclusions = [set() for _ in players]
+
+        # Directed pairs that must not happen, including last year's assignments
+        for key in ("exclusions", "previous_assignments"):
+            for pair in self._entries(key):
+                if not (isinstance(pair, (list, tuple)) and len(pair) == 2 and all(isinstance(email, str) for email in pair)):
+                    raise AssignmentError(f"Invalid {key} entry {pair!r}, expected a pair of emails")
+                gifter_email, receiver_email = pair
+                if gifter_email in index_of and receiver_email in index_of:
+                    exclusions[index_of[gifter_email]].add(index_of[receiver_email])
+
+        # Members of the same household must not draw each other
+        for household in self._entries("households"):
+            if not (isinstance(household, (list, tuple)) and all(isinstance(email, str) for email in household)):
+                raise AssignmentError(f"Invalid households entry {household!r}, expected a list of emails")
+            members = [index_of[email] for email in household if email in index_of]
+            for member in members:
+                exclusions[member].update(other for other in members if other != member)
+
+        return exclusions
+
+    # Function to get an optional list of the request body, failing on anything else
+    def _entries(self, key):
+        entries = self.data.get(key) or []
+        if not isinstance(entries, list):
+            raise AssignmentError(f"{key} must be a list")
+        return entries
 
     # Function to pick a duo for gifting
     def pick_duo(self, index):
@@ -43,7 +231,7 @@ class SecretSanta:
         players = self.data["players"]
 
         # Return a pair of players for gifting
-        return players[index], players[(index + 1) % len(players)]
+        return players[index], players[self.receivers[index]]
 
     # Function to pick a category for the gift
     def pick_category(self):
@@ -63,4 +251,4 @@ class SecretSanta:
     # Function to create a link for the gift
     def create_link(self, gifter_name, receiver_name, category):
         # Return the created link
-        return f'https://example.com/giftDetail?gifter={gifter_name}&receiver={receiver_name}&category={category}'
\ No newline at end of file
+        return f'https://example.com/giftDetail?gifter={gifter_name}&receiver={receiver_name}&category={category}'
@@ -0,0 +1,79 @@
+from src import fanout
+
+
+# StorageBackend class defining the document store the app is written against
+class StorageBackend:
+    """
+    Interface of a document store with Firestore-like collections.
+
+    Every method returns a dict with a "code" and a "message" and never raises,
+    except where_stream. Documents are returned as dicts with their "id" added.
+    Reads also return the version of each document, a value that changes on
+    every write to it: "version" for read, and "versions" by document ID for
+    read_many, where and page.
+    """
+
+    def create(self, collection, data):
+        """Creates a document and returns its ID as "id"."""
+        raise NotImplementedError
+
+    def read(self, collection, document_id, fields=None):
+        """Reads a document, only returning the given fields if any."""
+        raise NotImplementedError
+
+    def read_many(self, collection, document_ids, fields=None):
+        """Reads several documents, in the order of document_ids and skipping missing ones."""
+        raise NotImplementedError
+
+    def update(self, collection, document_id, data):
+        """Updates the given fields of an existing document."""
+        raise NotImplementedError
+
+    def delete(self, collection, document_id):
+        """Deletes a document."""
+        raise NotImplementedError
+
+    def where(self, collection, field, operator, value, fields=None):
+        """Retrieves every document whose field matches the value."""
+        raise NotImplementedError
+
+    def page(self, collection, field, operator, value, limit, after=None, fields=None):
+        """Retrieves up to limit matching documents ordered by ID, with the ID of the last one as "next"."""
+        raise NotImplementedError
+
+    def run_transaction(self, callback):
+        """
+        Runs callback(transaction) atomically and returns its result as "data".
+
+        The transaction has read, create, update and delete methods, and the
+        response lists the written (collection, document ID) pairs as "writes".
+        """
+        raise NotImplementedError
+
+    def batch_write(self, operations):
+        """Commits several ("create" | "update" | "delete", collection, ...) writes atomically."""
+        raise NotImplementedError
+
+    def where_stream(self, collection, field, operator, value, page_size=500, fields=None, versions=None):
+        """
+        Yields the documents matching the query ordered by ID, fetching them page_size at a time.
+
+        Only one page of results is held at once. Unlike the other methods,
+        errors are raised to the caller. The version of each yielded document
+        is added to the versions dict, if one is given.
+        """
+        after = None
+        while True:
+            response = self.page(collection, field, operator, value, page_size, after=after, fields=fields)
+            if response["code"] != 200:
+                raise RuntimeError(response["message"])
+            if versions is not None:
+                versions.update(response.get("versions", {}))
+            yield from response["data"]
+            after = response["next"]
+            if after is None:
+                return
+
+    def submit(self, method, *args, **kwargs):
+        """Starts the named method in the background and returns its Future."""
+        return fanout.submit(getattr(self, method), *args, **kwargs)
@@ -1,20 +1,35 @@
 # In tests/test_app.py
 import unittest
+from concurrent.futures import Future
 from unittest.mock import patch, MagicMock
 from src.app import app
+from src.memory_storage import MemoryStorage
 from models.party_model import Party, PartyRequest
 from models.user_model import User
 
 
+def run_submitted_calls(mock_firebase_crud_instance):
+    """Makes FirebaseCRUD.submit run the named mock method and return a completed Future."""
+    def submit(method, *args, **kwargs):
+        future = Future()
+        future.set_result(getattr(mock_firebase_crud_instance, method)(*args, **kwargs))
+        return future
+
+    mock_firebase_crud_instance.submit.side_effect = submit
+
+
 class TestApp(unittest.TestCase):
     def setUp(self):
         self.app = app.test_client()
 
     @patch("src.app.SecretSanta", autospec=True)
+    @patch("src.app.email_dispatcher", new_callable=MagicMock)
     @patch("src.app.email_service", new_callable=MagicMock)
-    def test_send_emails(self, mock_email_service, mock_secret_santa):
+    def test_send_emails(self, mock_email_service, mock_email_dispatcher, mock_secret_santa):
         # Setup the mock for SecretSanta
         mock_secret_santa_instance = mock_secret_santa.return_value
+        mock_secret_santa_instance.assign.return_value = ["email"]
+        mock_email_dispatcher.submit.return_value = "job123"
 
         # Call the send_emails endpoint
         response = self.app.post("/SecretSanta/", json={"players": []})
@@ -22,14 +37,97 @@ class TestApp(unittest.TestCase):
         # Verify that SecretSanta was called with the correct parameters
         mock_secret_santa.assert_called_once_with({"players": []}, mock_email_service)
 
-        # Verify that assign_and_send_emails was called
-        assert mock_secret_santa_instance.assign_and_send_emails.called
+        # Verify that the assigned emails were queued
+        mock_email_dispatcher.submit.assert_called_once_with(["email"])
 
         # Verify that the response is correct
-        self.assertEqual(response.get_json(), {"Status": "Success"})
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"Status": "Queued", "job_id": "job123"})
+        self.assertEqual(response.status_code, 202)
+
+    @patch("src.app.SecretSanta", autospec=True)
+    @patch("src.app.email_dispatcher", new_callable=MagicMock)
+    def test_send_emails_bulk_mode(self, mock_email_dispatcher, mock_secret_santa):
+        mock_secret_santa.return_value.assign_bulk.return_value = (["a@test.com"], "emails")
+        mock_email_dispatcher.submit.return_value = "job123"
+
+        response = self.app.post("/SecretSanta/", json={"mode": "bulk", "names": ["a"], "emails": ["a@test.com"]})
+
+        # The streamed emails are queued along with their recipients
+        mock_email_dispatcher.submit.assert_called_once_with("emails", recipients=["a@test.com"])
+        self.assertEqual(response.get_json(), {"Status": "Queued", "job_id": "job123"})
+
+    @patch("src.app.email_dispatcher", new_callable=MagicMock)
+    def test_send_emails_impossible_assignment(self, mock_email_dispatcher):
+        # Two players who may not draw each other
+        data = {
+            "players": [{"name": "a", "email": "a@test.com"}, {"name": "b", "email": "b@test.com"}],
+            "households": [["a@test.com", "b@test.com"]],
+        }
+
+        response = self.app.post("/SecretSanta/", json=data)
+
+        # Nothing is queued and the client gets the reason
+        mock_email_dispatcher.submit.assert_not_called()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["code"], 400)
+        self.assertIn("excluded from drawing every other player", response.get_json()["message"])
+
+    @patch("src.app.email_dispatcher", new_callable=MagicMock)
+    def test_send_emails_invalid_exclusions(self, mock_email_dispatcher):
+        players = [{"name": name, "email": f"{name}@test.com"} for name in "abc"]
+
+        for key, entry in (
+            ("exclusions", ["a@test.com"]),
+            ("exclusions", "ab"),
+            ("previous_assignments", [1, 2, 3]),
+            ("households", "a@test.com"),
+        ):
+            response = self.app.post("/SecretSanta/", json={"players": players, key: [entry]})
 
-    @patch("src.app.FirebaseCRUD")
+            # The client is told which entry is wrong instead of getting a 500
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(f"Invalid {key} entry {entry!r}", response.get_json()["message"])
+        mock_email_dispatcher.submit.assert_not_called()
+
+    @patch("src.app.SecretSanta", autospec=True)
+    @patch("src.app.email_dispatcher", new_callable=MagicMock)
+    def test_send_emails_with_draw_id(self, mock_email_dispatcher, mock_secret_santa):
+        mock_secret_santa.return_value.assign.return_value = ["email"]
+        mock_email_dispatcher.get_job.return_value = None
+        mock_email_dispatcher.submit.return_value = "draw1"
+
+        response = self.app.post("/SecretSanta/", json={"players": [], "draw_id": "draw1"})
+        mock_email_dispatcher.submit.assert_called_once_with(["email"], job_id="draw1")
+        self.assertEqual(response.get_json(), {"Status": "Queued", "job_id": "draw1"})
+
+        # Posting the draw again returns its job without drawing again
+        mock_email_dispatcher.get_job.return_value = {"id": "draw1"}
+        response = self.app.post("/SecretSanta/", json={"players": [], "draw_id": "draw1"})
+        self.assertEqual(response.get_json(), {"Status": "Queued", "job_id": "draw1"})
+        mock_secret_santa.assert_called_once()
+
+        response = self.app.post("/SecretSanta/", json={"players": [], "draw_id": "bad id"})
+        self.assertEqual(response.status_code, 400)
+
+    @patch("src.app.email_dispatcher", new_callable=MagicMock)
+    def test_get_email_job(self, mock_email_dispatcher):
+        job = {"id": "job123", "status": "completed", "recipients": []}
+        mock_email_dispatcher.get_job.return_value = job
+
+        response = self.app.get("/SecretSanta/jobs/job123")
+
+        mock_email_dispatcher.get_job.assert_called_once_with("job123")
+        self.assertEqual(
+            response.get_json(),
+            {"code": 200, "message": "Job retrieved successfully", "data": job},
+        )
+
+        # Unknown jobs are reported as not found
+        mock_email_dispatcher.get_job.return_value = None
+        response = self.app.get("/SecretSanta/jobs/unknown")
+        self.assertEqual(response.get_json(), {"code": 404, "message": "Job not found"})
+
+    @patch("src.app.get_firebase_crud")
     def test_create_party(self, mock_firebase_crud):
         # Setup the mock for FirebaseCRUD
         mock_firebase_crud_instance = mock_firebase_crud.return_value
@@ -62,7 +160,22 @@ class TestApp(unittest.TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
-    @patch("src.app.FirebaseCRUD")
+    @patch("src.app.get_firebase_crud")
+    def test_create_party_invalid_body(self, mock_firebase_crud):
+        response = self.app.post("/CreateParty/", json={"name": "Test Party", "budget": "a lot", "categories": [1]})
+
+        # Every invalid field is reported and nothing is written
+        mock_firebase_crud.return_value.create.assert_not_called()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.get_json()["errors"],
+            [
+                {"field": "budget", "error": "Invalid type for field budget"},
+                {"field": "categories", "error": "Invalid type in list for field categories"},
+            ],
+        )
+
+    @patch("src.app.get_firebase_crud")
     def test_update_party(self, mock_firebase_crud):
         # Setup the mock for FirebaseCRUD
         mock_firebase_crud_instance = mock_firebase_crud.return_value
@@ -85,7 +198,8 @@ class TestApp(unittest.TestCase):
         mock_firebase_crud_instance.update.assert_called_once()
         called_args, _ = mock_firebase_crud_instance.update.call_args
         self.assertEqual(called_args[0], "Party")
-        self.assertEqual(called_args[1], test_data)
+        self.assertEqual(called_args[1], "123")
+        self.assertEqual(called_args[2], test_data)
 
         # Verify that the response is correct
         self.assertEqual(
@@ -94,14 +208,17 @@ class TestApp(unittest.TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
-    @patch("src.app.FirebaseCRUD")
+    @patch("src.app.get_firebase_crud")
     def test_create_user(self, mock_firebase_crud):
-        # Setup the mock for FirebaseCRUD
+        # Setup the mock for FirebaseCRUD, running the transaction on a mock
         mock_firebase_crud_instance = mock_firebase_crud.return_value
-        mock_firebase_crud_instance.create.return_value = {
+        mock_transaction = MagicMock()
+        mock_transaction.read.return_value = {"name": "Test Party", "ownerId": "", "id": "party123"}
+        mock_transaction.create.return_value = "123"
+        mock_firebase_crud_instance.run_transaction.side_effect = lambda callback: {
             "code": 200,
-            "message": "Document created successfully",
-            "id": "123",
+            "message": "Transaction committed successfully",
+            "data": callback(mock_transaction),
         }
 
         # Prepare the test data
@@ -115,12 +232,18 @@ class TestApp(unittest.TestCase):
         # Call the create_user endpoint
         response = self.app.post("/CreateUser/party123", json=test_data)
 
-        # Verify that FirebaseCRUD.create was called with the correct parameters
-        mock_firebase_crud_instance.create.assert_called_once()
-        called_args, _ = mock_firebase_crud_instance.create.call_args
+        # Verify that the user was created in a single transaction
+        mock_firebase_crud_instance.run_transaction.assert_called_once()
+        mock_firebase_crud_instance.create.assert_not_called()
+        mock_transaction.create.assert_called_once()
+        called_args, _ = mock_transaction.create.call_args
         self.assertEqual(called_args[0], "User")
         self.assertDictEqual(called_args[1], test_data)
 
+        # Verify that the first user claimed the ownership of the party in the same transaction
+        mock_transaction.read.assert_called_once_with("Party", "party123")
+        mock_transaction.update.assert_called_once_with("Party", "party123", {"ownerId": "123"})
+
         # Verify that the response is correct
         self.assertEqual(
             response.get_json(),
@@ -128,7 +251,14 @@ class TestApp(unittest.TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
-    @patch("src.app.FirebaseCRUD")
+        # A later user does not take over the ownership
+        mock_transaction.reset_mock()
+        mock_transaction.read.return_value = {"name": "Test Party", "ownerId": "123", "id": "party123"}
+        self.app.post("/CreateUser/party123", json=test_data)
+        mock_transaction.create.assert_called_once()
+        mock_transaction.update.assert_not_called()
+
+    @patch("src.app.get_firebase_crud")
     def test_update_user(self, mock_firebase_crud):
         # Setup the mock for FirebaseCRUD
         mock_firebase_crud_instance = mock_firebase_crud.return_value
@@ -169,7 +299,7 @@ class TestApp(unittest.TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
-    @patch("src.app.FirebaseCRUD")
+    @patch("src.app.get_firebase_crud")
     def test_delete_user(self, mock_firebase_crud):
         # Setup the mock for FirebaseCRUD
         mock_firebase_crud_instance = mock_firebase_crud.return_value
@@ -194,7 +324,7 @@ class TestApp(unittest.TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
-    @patch("src.app.FirebaseCRUD")
+    @patch("src.app.get_firebase_crud")
     def test_get_parties(self, mock_firebase_crud):
         # Setup the mock for FirebaseCRUD
         mock_firebase_crud_instance = mock_firebase_crud.return_value
@@ -202,22 +332,24 @@ class TestApp(unittest.TestCase):
             "code": 200,
             "data": [{"party_id": "party123"}, {"party_id": "party456"}],
         }
-        mock_firebase_crud_instance.read.side_effect = [
-            {"code": 200, "data": {"name": "Party 1"}},
-            {"code": 200, "data": {"name": "Party 2"}},
-        ]
+        mock_firebase_crud_instance.read_many.return_value = {
+            "code": 200,
+            "data": [{"name": "Party 1"}, {"name": "Party 2"}],
+        }
 
         # Call the get_parties endpoint
         response = self.app.get("/GetParties/?email=test@test.com")
 
         # Verify that FirebaseCRUD.where was called with the correct parameters
         mock_firebase_crud_instance.where.assert_called_once_with(
-            "User", "email", "==", "test@test.com"
+            "User", "email", "==", "test@test.com", fields=["party_id"]
         )
 
-        # Verify that FirebaseCRUD.read was called with the correct parameters
-        mock_firebase_crud_instance.read.assert_any_call("Party", "party123")
-        mock_firebase_crud_instance.read.assert_any_call("Party", "party456")
+        # Verify that the parties were fetched in a single FirebaseCRUD.read_many call
+        mock_firebase_crud_instance.read_many.assert_called_once_with(
+            "Party", ["party123", "party456"], fields=["name", "budget", "closed", "ownerId"]
+        )
+        mock_firebase_crud_instance.read.assert_not_called()
 
         # Verify that the response is correct
         self.assertEqual(
@@ -230,10 +362,11 @@ class TestApp(unittest.TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
-    @patch("src.app.FirebaseCRUD")
+    @patch("src.app.get_firebase_crud")
     def test_get_party(self, mock_firebase_crud):
         # Setup the mock for FirebaseCRUD
         mock_firebase_crud_instance = mock_firebase_crud.return_value
+        run_submitted_calls(mock_firebase_crud_instance)
         mock_firebase_crud_instance.read.return_value = {
             "code": 200,
             "data": {
@@ -243,13 +376,11 @@ class TestApp(unittest.TestCase):
                 "ownerId": "user123",
             },
         }
-        mock_firebase_crud_instance.where.return_value = {
-            "code": 200,
-            "data": [
-                {"id": "user123", "name": "User 1"},
-                {"id": "user456", "name": "User 2"},
-            ],
-        }
+        members = [
+            {"id": "user123", "name": "User 1"},
+            {"id": "user456", "name": "User 2"},
+        ]
+        mock_firebase_crud_instance.where_stream.side_effect = lambda *args, **kwargs: (dict(user) for user in members)
 
         # Call the get_party endpoint without owner_id
         response = self.app.get("/GetParty/123")
@@ -257,9 +388,9 @@ class TestApp(unittest.TestCase):
         # Verify that FirebaseCRUD.read was called with the correct parameters
         mock_firebase_crud_instance.read.assert_called_once_with("Party", "123")
 
-        # Verify that FirebaseCRUD.where was called with the correct parameters
-        mock_firebase_crud_instance.where.assert_called_once_with(
-            "User", "party_id", "==", "123"
+        # Verify that the members were streamed page by page with the correct parameters
+        mock_firebase_crud_instance.where_stream.assert_called_once_with(
+            "User", "party_id", "==", "123", page_size=500, fields=["username", "email", "suggested_categories"], versions={}
         )
 
         # Verify that the response is correct
@@ -287,10 +418,8 @@ class TestApp(unittest.TestCase):
         # Verify that FirebaseCRUD.read was called with the correct parameters
         mock_firebase_crud_instance.read.assert_called_with("Party", "123")
 
-        # Verify that FirebaseCRUD.where was called with the correct parameters
-        mock_firebase_crud_instance.where.assert_called_with(
-            "User", "party_id", "==", "123"
-        )
+        # Verify that the members were streamed
+        self.assertEqual(mock_firebase_crud_instance.where_stream.call_args.args, ("User", "party_id", "==", "123"))
 
         # Verify that the response is correct
         self.assertEqual(
@@ -318,10 +447,8 @@ class TestApp(unittest.TestCase):
         # Verify that FirebaseCRUD.read was called with the correct parameters
         mock_firebase_crud_instance.read.assert_called_with("Party", "123")
 
-        # Verify that FirebaseCRUD.where was called with the correct parameters
-        mock_firebase_crud_instance.where.assert_called_with(
-            "User", "party_id", "==", "123"
-        )
+        # Verify that the members were streamed
+        self.assertEqual(mock_firebase_crud_instance.where_stream.call_args.args, ("User", "party_id", "==", "123"))
 
         # Verify that the response is correct
         self.assertEqual(
@@ -333,5 +460,110 @@ class TestApp(unittest.TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
+    @patch("src.app.get_firebase_crud")
+    def test_get_party_paginated(self, mock_firebase_crud):
+        mock_firebase_crud_instance = mock_firebase_crud.return_value
+        run_submitted_calls(mock_firebase_crud_instance)
+        mock_firebase_crud_instance.read.side_effect = lambda collection, document_id, fields=None: (
+            {"code": 200, "data": {"name": "Test Party", "ownerId": "user123"}}
+            if collection == "Party"
+            else {"code": 200, "data": {"party_id": "123"}}
+        )
+        mock_firebase_crud_instance.page.return_value = {
+            "code": 200,
+            "data": [{"id": "user123", "username": "User 1"}],
+            "next": "user123",
+        }
+
+        # First page without owner_id hides the ids and returns an opaque cursor
+        response = self.app.get("/GetParty/123?limit=1")
+        mock_firebase_crud_instance.page.assert_called_with(
+            "User", "party_id", "==", "123", 1, after=None, fields=["username", "email", "suggested_categories"]
+        )
+        body = response.get_json()
+        self.assertEqual(body["data"], {"name": "Test Party", "users": [{"username": "User 1"}]})
+        self.assertNotIn("user123", body["next"])
+
+        # The cursor resumes after the last member of the previous page
+        mock_firebase_crud_instance.page.return_value = {"code": 200, "data": [], "next": None}
+        response = self.app.get(f"/GetParty/123/user123?limit=1&after={body['next']}")
+        mock_firebase_crud_instance.page.assert_called_with(
+            "User", "party_id", "==", "123", 1, after="user123", fields=["username", "email", "suggested_categories"]
+        )
+        mock_firebase_crud_instance.read.assert_called_with("User", "user123", fields=["party_id"])
+        self.assertEqual(
+            response.get_json(),
+            {
+                "code": 200,
+                "message": "Party retrieved successfully",
+                "data": {"name": "Test Party", "ownerId": "user123", "users": []},
+                "next": None,
+            },
+        )
+
+        # Tampered cursors and out of range limits are rejected
+        response = self.app.get("/GetParty/123?limit=1&after=user123")
+        self.assertEqual(response.get_json(), {"code": 400, "message": "Invalid cursor"})
+        response = self.app.get("/GetParty/123?limit=0")
+        self.assertEqual(response.get_json()["code"], 400)
+
+        # A limit that is not a number is rejected instead of returning the full party
+        mock_firebase_crud_instance.submit.reset_mock()
+        response = self.app.get("/GetParty/123?limit=ten")
+        self.assertEqual(response.get_json()["code"], 400)
+        mock_firebase_crud_instance.submit.assert_not_called()
+
+    @patch("src.app.get_firebase_crud")
+    def test_get_party_not_found(self, mock_firebase_crud):
+        mock_firebase_crud_instance = mock_firebase_crud.return_value
+        run_submitted_calls(mock_firebase_crud_instance)
+        mock_firebase_crud_instance.read.return_value = {"code": 404, "message": "Document not found"}
+        mock_firebase_crud_instance.where_stream.return_value = iter([])
+
+        response = self.app.get("/GetParty/missing")
+
+        mock_firebase_crud_instance.submit.assert_called_once_with("read", "Party", "missing")
+        self.assertEqual(response.get_json(), {"code": 404, "message": "Document not found"})
+
+    @patch("src.app.get_firebase_crud")
+    def test_get_party_member_stream_failure(self, mock_firebase_crud):
+        mock_firebase_crud_instance = mock_firebase_crud.return_value
+        run_submitted_calls(mock_firebase_crud_instance)
+        mock_firebase_crud_instance.read.return_value = {"code": 200, "data": {"name": "Test Party"}}
+        mock_firebase_crud_instance.where_stream.side_effect = RuntimeError("unavailable")
+
+        response = self.app.get("/GetParty/123")
+
+        self.assertEqual(response.get_json(), {"code": 500, "message": "Failed to retrieve documents: unavailable"})
+
+    @patch("src.app.get_firebase_crud")
+    def test_conditional_get(self, mock_firebase_crud):
+        # Real documents, so that writes change their versions
+        storage = mock_firebase_crud.return_value = MemoryStorage()
+        party_id = storage.seed("Party", [{"name": "Party", "budget": 20, "categories": [], "ownerId": ""}])[0]
+        self.app.post(f"/CreateUser/{party_id}", json={"username": "Owner", "email": "owner@test.com"})
+
+        for path in (f"/GetParty/{party_id}", f"/GetParties/?email=owner@test.com"):
+            response = self.app.get(path)
+            etag = response.headers["ETag"]
+
+            # Unchanged documents give an empty 304
+            response = self.app.get(path, headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.data, b"")
+
+            # Any write to the party or its members changes the ETag
+            storage.update("Party", party_id, {"budget": 30})
+            response = self.app.get(path, headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response.headers["ETag"], etag)
+
+        # Owner and guest views of the same documents have different ETags
+        owner_id = storage.where("User", "party_id", "==", party_id)["data"][0]["id"]
+        guest = self.app.get(f"/GetParty/{party_id}")
+        owner = self.app.get(f"/GetParty/{party_id}/{owner_id}", headers={"If-None-Match": guest.headers["ETag"]})
+        self.assertEqual(owner.status_code, 200)
+        self.assertNotEqual(owner.headers["ETag"], guest.headers["ETag"])
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
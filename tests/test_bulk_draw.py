@@ -0,0 +1,65 @@
+import collections
+import random
+import unittest
+from unittest.mock import MagicMock
+from src.bulk_draw import PlayerColumns, iter_draw, shuffled_cycle
+from src.secret_santa import SecretSanta, AssignmentError
+
+
+class TestBulkDraw(unittest.TestCase):
+    def test_player_columns_from_data(self):
+        columns = PlayerColumns.from_data({"names": ["a", "b"], "emails": ["a@test.com", "b@test.com"]})
+        self.assertEqual(columns.names, ["a", "b"])
+        self.assertEqual(len(columns), 2)
+
+        columns = PlayerColumns.from_data({"players": [{"name": "a", "email": "a@test.com"}]})
+        self.assertEqual(columns.emails, ["a@test.com"])
+
+        with self.assertRaises(ValueError):
+            PlayerColumns(["a"], [])
+
+    def test_iter_draw_is_a_single_cycle(self):
+        count = 1000
+        draws = list(iter_draw(shuffled_cycle(count, random.Random(1)), ["x", "y", "z"], batch_size=64))
+
+        # Everybody gives once and receives once, never to themselves
+        self.assertEqual(sorted(gifter for gifter, _, _ in draws), list(range(count)))
+        self.assertEqual(sorted(receiver for _, receiver, _ in draws), list(range(count)))
+        self.assertTrue(all(gifter != receiver for gifter, receiver, _ in draws))
+
+        # Following the receivers visits every player before coming back
+        receiver_of = {gifter: receiver for gifter, receiver, _ in draws}
+        player, visited = 0, set()
+        while player not in visited:
+            visited.add(player)
+            player = receiver_of[player]
+        self.assertEqual(len(visited), count)
+
+    def test_iter_draw_deals_categories_in_rounds(self):
+        draws = list(iter_draw(shuffled_cycle(10), ["x", "y", "z"], batch_size=4))
+        categories = [category for _, _, category in draws]
+
+        # Each round of three uses every category once, across batch boundaries
+        for start in range(0, 9, 3):
+            self.assertEqual(sorted(categories[start:start + 3]), ["x", "y", "z"])
+        self.assertEqual(collections.Counter(categories)[categories[-1]], 4)
+
+    def test_assign_bulk(self):
+        data = {"names": ["a", "b", "c"], "emails": ["a@test.com", "b@test.com", "c@test.com"]}
+        secret_santa = SecretSanta(data, MagicMock())
+
+        recipients, emails = secret_santa.assign_bulk()
+        emails = list(emails)
+
+        # The recipients list matches the order of the streamed emails
+        self.assertEqual(recipients, [email.recipient_email for email in emails])
+        self.assertEqual(sorted(recipients), data["emails"])
+
+    def test_assign_bulk_rejects_exclusions(self):
+        data = {"names": ["a", "b"], "emails": ["a@test.com", "b@test.com"], "households": [["a@test.com", "b@test.com"]]}
+        with self.assertRaises(AssignmentError):
+            SecretSanta(data, MagicMock()).assign_bulk()
+
+
+if __name__ == "__main__":
+    unittest.main()
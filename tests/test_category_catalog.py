@@ -0,0 +1,58 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from src.category_catalog import CategoryCatalog
+
+
+class TestCategoryCatalog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "categories.json")
+        self.write(["FATTO A MANO", "UN REGALO UTILE"])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, categories, mtime=None):
+        with open(self.path, "w", encoding="utf-8") as file:
+            json.dump(categories, file)
+        if mtime is not None:
+            os.utime(self.path, ns=(mtime, mtime))
+
+    def test_categories_are_immutable(self):
+        catalog = CategoryCatalog(self.path)
+        self.assertEqual(catalog.categories, ("FATTO A MANO", "UN REGALO UTILE"))
+        self.assertIsInstance(catalog.categories, tuple)
+
+    def test_categories_do_not_touch_the_filesystem_between_checks(self):
+        catalog = CategoryCatalog(self.path, check_interval=60)
+
+        with patch("os.stat") as mock_stat, patch("builtins.open") as mock_open:
+            catalog.categories
+        mock_stat.assert_not_called()
+        mock_open.assert_not_called()
+
+    def test_reload_on_mtime_change(self):
+        catalog = CategoryCatalog(self.path, check_interval=0)
+        self.write(["OGGETTI DI LEGNO"], mtime=os.stat(self.path).st_mtime_ns + 1_000_000_000)
+
+        self.assertEqual(catalog.categories, ("OGGETTI DI LEGNO",))
+
+    def test_merge(self):
+        catalog = CategoryCatalog(self.path)
+
+        merged = catalog.merge(["Books", "FATTO A MANO"], [" Games ", "", "Books"])
+
+        self.assertEqual(merged, ("FATTO A MANO", "UN REGALO UTILE", "Books", "Games"))
+        self.assertEqual(catalog.merge([], []), catalog.categories)
+
+    def test_merge_ignores_non_lists(self):
+        catalog = CategoryCatalog(self.path)
+
+        self.assertEqual(catalog.merge("Books", None, ["Games"]), catalog.categories + ("Games",))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,17 @@
+import unittest
+from utilities.cursors import encode_cursor, decode_cursor
+
+
+class TestCursors(unittest.TestCase):
+    def test_round_trip(self):
+        cursor = encode_cursor("user123")
+
+        self.assertNotIn("user123", cursor)
+        self.assertEqual(decode_cursor(cursor), "user123")
+
+    def test_invalid_cursor(self):
+        cursor = encode_cursor("user123")
+
+        for invalid in ("user123", cursor[:-2], ""):
+            with self.assertRaises(ValueError):
+                decode_cursor(invalid)
@@ -0,0 +1,70 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+from src.email_dispatcher import EmailDispatcher
+from src.email_service import Email, EmailService
+
+
+class TestEmailDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.pool = MagicMock(max_size=2)
+        self.email_service = EmailService(pool=self.pool, rate_limiter=MagicMock())
+        self.dispatcher = EmailDispatcher(self.email_service, max_workers=2)
+
+    def tearDown(self):
+        self.dispatcher.shutdown()
+
+    def test_submit_reports_per_recipient_status(self):
+        # Make the second recipient fail
+        def sendmail(recipient_email, message):
+            if recipient_email == "b@test.com":
+                raise RuntimeError("mailbox unavailable")
+
+        self.pool.sendmail.side_effect = sendmail
+        emails = [
+            Email("a@test.com", "Secret Santa!", "link a"),
+            Email("b@test.com", "Secret Santa!", "link b"),
+        ]
+
+        job_id = self.dispatcher.submit(emails)
+        self.dispatcher.shutdown()
+
+        job = self.dispatcher.get_job(job_id)
+        self.assertEqual(job["status"], "completed")
+        self.assertEqual(job["counts"], {"queued": 0, "sent": 1, "failed": 1})
+        self.assertEqual(
+            job["recipients"],
+            [
+                {"email": "a@test.com", "status": "sent", "error": None},
+                {"email": "b@test.com", "status": "failed", "error": "mailbox unavailable"},
+            ],
+        )
+
+    def test_submit_returns_before_emails_are_sent(self):
+        release = threading.Event()
+        self.pool.sendmail.side_effect = lambda *args: release.wait(5)
+
+        job_id = self.dispatcher.submit([Email("a@test.com", "Secret Santa!", "link")])
+
+        # The job is visible and still queued while the send is blocked
+        job = self.dispatcher.get_job(job_id)
+        self.assertEqual(job["status"], "in_progress")
+        self.assertEqual(job["recipients"][0]["status"], "queued")
+        release.set()
+
+    def test_submit_streams_emails_with_recipients(self):
+        emails = (Email(f"{name}@test.com", "Secret Santa!", "link") for name in "abc")
+
+        job_id = self.dispatcher.submit(emails, recipients=["a@test.com", "b@test.com", "c@test.com"])
+        self.dispatcher.shutdown()
+
+        job = self.dispatcher.get_job(job_id)
+        self.assertEqual(job["counts"], {"queued": 0, "sent": 3, "failed": 0})
+        self.assertEqual(self.pool.sendmail.call_count, 3)
+
+    def test_get_unknown_job(self):
+        self.assertIsNone(self.dispatcher.get_job("unknown"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+import os
+import smtplib
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+from src.email_dispatcher import EmailDispatcher
+from src.email_outbox import EmailOutbox, is_transient
+from src.email_service import Email, EmailService, QuotaExceededError
+
+
+def make_emails(*names):
+    return [Email(f"{name}@test.com", "Secret Santa!", f"link {name}") for name in names]
+
+
+class TestEmailOutbox(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "outbox.sqlite3")
+        self.outbox = EmailOutbox(self.path, base_delay=60.0)
+        self.addCleanup(self.outbox.close)
+
+    def test_add_draw_once(self):
+        self.assertTrue(self.outbox.add_draw("draw1", iter(make_emails("a", "b"))))
+        self.assertFalse(self.outbox.add_draw("draw1", make_emails("c")))
+
+        draw = self.outbox.get_draw("draw1")
+        self.assertEqual(draw["status"], "in_progress")
+        self.assertEqual(draw["counts"], {"queued": 2, "sent": 0, "failed": 0})
+        self.assertEqual([recipient["email"] for recipient in draw["recipients"]], ["a@test.com", "b@test.com"])
+        self.assertIsNone(self.outbox.get_draw("unknown"))
+
+    @patch("src.email_outbox.INSERT_CHUNK_SIZE", 2)
+    def test_draw_is_written_without_blocking_other_workers(self):
+        other = EmailOutbox(self.path, base_delay=60.0)
+        self.addCleanup(other.close)
+        other.add_draw("draw0", make_emails("x"))
+        claimed = []
+
+        def render():
+            for index, email in enumerate(make_emails("a", "b", "c", "d", "e")):
+                if index == 4:
+                    # Another worker claims while the draw is rendered, without waiting on the write lock
+                    claimed.extend(message.id for message in other.claim(10))
+                yield email
+
+        self.outbox.add_draw("draw1", render())
+
+        # Messages of the draw being written were not claimable yet
+        self.assertEqual(claimed, ["draw0.0"])
+        self.assertEqual(len(other.claim(10)), 5)
+
+    def test_failed_render_leaves_no_draw(self):
+        def render():
+            yield from make_emails("a")
+            raise RuntimeError("template error")
+
+        with self.assertRaises(RuntimeError):
+            self.outbox.add_draw("draw1", render())
+
+        self.assertIsNone(self.outbox.get_draw("draw1"))
+        self.assertTrue(self.outbox.add_draw("draw1", make_emails("a")))
+
+    def test_claim_and_retry(self):
+        self.outbox.add_draw("draw1", make_emails("a", "b", "c"))
+
+        messages = self.outbox.claim(10)
+        self.assertEqual([message.id for message in messages], ["draw1.0", "draw1.1", "draw1.2"])
+        self.assertEqual(self.outbox.claim(10), [])
+
+        self.outbox.mark_sent(messages[0].id)
+        self.outbox.mark_failed(messages[1], smtplib.SMTPResponseException(421, b"Try again later"))
+        self.outbox.mark_failed(messages[2], smtplib.SMTPRecipientsRefused({"c@test.com": (550, b"No such user")}))
+
+        # The transient failure waits for its backoff, the permanent one is final
+        self.assertEqual(self.outbox.claim(10), [])
+        self.assertGreaterEqual(self.outbox.next_due(), 30.0)
+        draw = self.outbox.get_draw("draw1")
+        self.assertEqual(draw["counts"], {"queued": 1, "sent": 1, "failed": 1})
+        self.assertEqual(draw["recipients"][2]["error"], str(smtplib.SMTPRecipientsRefused({"c@test.com": (550, b"No such user")})))
+
+    def test_transient_failures_give_up_after_max_attempts(self):
+        self.outbox.max_attempts = 1
+        self.outbox.add_draw("draw1", make_emails("a"))
+
+        self.outbox.mark_failed(self.outbox.claim(1)[0], smtplib.SMTPServerDisconnected("gone"))
+
+        self.assertEqual(self.outbox.get_draw("draw1")["counts"]["failed"], 1)
+        self.assertIsNone(self.outbox.next_due())
+
+    def test_is_transient(self):
+        self.assertTrue(is_transient(QuotaExceededError("quota")))
+        self.assertTrue(is_transient(ConnectionResetError()))
+        self.assertTrue(is_transient(smtplib.SMTPRecipientsRefused({"a@test.com": (451, b"Greylisted")})))
+        self.assertFalse(is_transient(smtplib.SMTPResponseException(554, b"Rejected")))
+        self.assertFalse(is_transient(ValueError("bad address")))
+
+
+class TestEmailDispatcherWithOutbox(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "outbox.sqlite3")
+        self.pool = MagicMock(max_size=2)
+        self.email_service = EmailService(pool=self.pool, rate_limiter=MagicMock())
+        self.email_service.sender_email = "santa@example.com"
+
+    def make_dispatcher(self, **options):
+        outbox = EmailOutbox(self.path, **options)
+        dispatcher = EmailDispatcher(self.email_service, max_workers=2, outbox=outbox, autostart=False)
+        self.addCleanup(outbox.close)
+        self.addCleanup(dispatcher.shutdown)
+        return dispatcher
+
+    def test_submit_and_send(self):
+        dispatcher = self.make_dispatcher()
+
+        job_id = dispatcher.submit(iter(make_emails("a", "b")), job_id="draw1")
+        self.assertEqual(dispatcher.send_due(), 2)
+
+        self.assertEqual(job_id, "draw1")
+        self.assertEqual(dispatcher.get_job("draw1")["counts"], {"queued": 0, "sent": 2, "failed": 0})
+        messages = dict(call.args for call in self.pool.sendmail.call_args_list)
+        message = messages["a@test.com"]
+        self.assertIn("Message-ID: <draw1.0@example.com>", message)
+
+    def test_interrupted_draw_resumes(self):
+        # Leases expire at once, as if the process had died long ago
+        dispatcher = self.make_dispatcher(lease=0.0)
+        dispatcher.submit(make_emails("a", "b", "c"), job_id="draw1")
+
+        # The process dies after sending a, and while sending b
+        outbox = dispatcher.outbox
+        outbox.mark_sent(outbox.claim(1)[0].id)
+        outbox.claim(1)
+
+        # The next process picks up b once its lease expires, then c, and never a
+        resumed = self.make_dispatcher()
+        self.assertEqual(resumed.send_due(), 2)
+
+        # The two sends run at once on the dispatcher's threads, in no set order
+        recipients = [call.args[0] for call in self.pool.sendmail.call_args_list]
+        self.assertEqual(sorted(recipients), ["b@test.com", "c@test.com"])
+        self.assertNotIn("a@test.com", recipients)
+        self.assertEqual(resumed.get_job("draw1")["status"], "completed")
+
+    def test_transient_failure_is_retried(self):
+        dispatcher = self.make_dispatcher(base_delay=0.0)
+        self.pool.sendmail.side_effect = [smtplib.SMTPServerDisconnected("gone"), None]
+
+        dispatcher.submit(make_emails("a"), job_id="draw1")
+
+        self.assertEqual(dispatcher.send_due(), 2)
+        self.assertEqual(dispatcher.get_job("draw1")["counts"]["sent"], 1)
+
+    def test_quota_limited_draw_delivers_every_message(self):
+        dispatcher = self.make_dispatcher(max_attempts=2, base_delay=0.0)
+        quota_errors = [QuotaExceededError("Daily sending quota exceeded", retry_after=0.0)] * 10
+        self.email_service.rate_limiter.acquire.side_effect = quota_errors + [None] * 3
+
+        dispatcher.submit(make_emails("a", "b", "c"), job_id="draw1")
+        while dispatcher.outbox.next_due() is not None:
+            dispatcher.send_due()
+
+        # Waiting for the quota used up no attempt, so nobody ends up failed
+        self.assertEqual(dispatcher.get_job("draw1")["counts"], {"queued": 0, "sent": 3, "failed": 0})
+        self.assertEqual(self.pool.sendmail.call_count, 3)
+
+    def test_background_thread_drains_the_outbox(self):
+        outbox = EmailOutbox(self.path)
+        self.addCleanup(outbox.close)
+        dispatcher = EmailDispatcher(self.email_service, max_workers=2, outbox=outbox)
+
+        dispatcher.submit(make_emails("a"), job_id="draw1")
+        for _ in range(100):
+            if dispatcher.get_job("draw1")["status"] == "completed":
+                break
+            threading.Event().wait(0.01)
+        dispatcher.shutdown()
+
+        self.assertEqual(dispatcher.get_job("draw1")["counts"]["sent"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
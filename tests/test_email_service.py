@@ -1,18 +1,27 @@
+import os
+import smtplib
+import tempfile
+import time
 import unittest
-from unittest.mock import patch, ANY
+from unittest.mock import patch, ANY, MagicMock
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from src.email_service import EmailService
+from src.email_service import Email, EmailService, QuotaExceededError, RateLimiter, SMTPConnectionPool, TokenBucket
 
 class TestEmailService(unittest.TestCase):
+    def create_service(self, **pool_options):
+        service = EmailService(rate_limiter=MagicMock())
+        service.pool = SMTPConnectionPool(service.sender_email, service.sender_password, **pool_options)
+        return service
+
     @patch('smtplib.SMTP')
     def test_send_email(self, mock_smtp):
         # Setup the SMTP mock
-        instance = mock_smtp.return_value.__enter__.return_value
+        instance = mock_smtp.return_value
         instance.sendmail.return_value = {}
 
         # Create an instance of the email service
-        service = EmailService()
+        service = self.create_service()
 
         # Set the email parameters
         recipient_email = 'test@example.com'
@@ -31,5 +40,145 @@ class TestEmailService(unittest.TestCase):
         # Verify that login was called with the correct parameters
         instance.login.assert_called_once_with(service.sender_email, service.sender_password)
 
+    @patch('smtplib.SMTP')
+    def test_send_email_reuses_session(self, mock_smtp):
+        service = self.create_service()
+
+        service.send_email('a@example.com', 'Subject', '<p>a</p>')
+        service.send_email('b@example.com', 'Subject', '<p>b</p>')
+
+        # Only one connection and login for both messages
+        mock_smtp.assert_called_once()
+        mock_smtp.return_value.login.assert_called_once()
+        self.assertEqual(mock_smtp.return_value.sendmail.call_count, 2)
+
+    @patch('smtplib.SMTP')
+    def test_pool_uses_given_smtp_class(self, mock_smtp):
+        smtp_class = MagicMock()
+        service = self.create_service(smtp_class=smtp_class)
+
+        service.send_email('a@example.com', 'Subject', '<p>a</p>')
+
+        # Stand-ins such as the benchmark's fake server replace smtplib.SMTP
+        mock_smtp.assert_not_called()
+        smtp_class.return_value.sendmail.assert_called_once()
+
+    @patch('smtplib.SMTP')
+    def test_send_email_reconnects_after_disconnect(self, mock_smtp):
+        stale, fresh = MagicMock(), MagicMock()
+        stale.sendmail.side_effect = smtplib.SMTPServerDisconnected()
+        mock_smtp.side_effect = [stale, fresh]
+        service = self.create_service()
+
+        service.send_email('test@example.com', 'Subject', '<p>hi</p>')
+
+        # The dropped session is thrown away and the message goes out on a new one
+        stale.quit.assert_called()
+        fresh.sendmail.assert_called_once_with(service.sender_email, 'test@example.com', ANY)
+
+    @patch('smtplib.SMTP')
+    def test_idle_sessions_are_closed(self, mock_smtp):
+        first, second = MagicMock(), MagicMock()
+        mock_smtp.side_effect = [first, second]
+        service = self.create_service(idle_timeout=0)
+
+        service.send_email('a@example.com', 'Subject', '<p>a</p>')
+        service.send_email('b@example.com', 'Subject', '<p>b</p>')
+
+        # The first session expired while idle and was closed before the second send
+        first.quit.assert_called_once()
+        second.sendmail.assert_called_once()
+
+    @patch('smtplib.SMTP')
+    def test_idle_sessions_are_closed_without_another_acquire(self, mock_smtp):
+        service = self.create_service(idle_timeout=0.05)
+
+        service.send_email('a@example.com', 'Subject', '<p>a</p>')
+
+        # The reaper closes the session once it expires, with no further send
+        deadline = time.monotonic() + 5
+        while not mock_smtp.return_value.quit.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        mock_smtp.return_value.quit.assert_called_once()
+        self.assertEqual(service.pool._open_count, 0)
+
+    @patch('smtplib.SMTP')
+    def test_refused_recipient_keeps_session(self, mock_smtp):
+        instance = mock_smtp.return_value
+        instance.sendmail.side_effect = [smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'No such user')}), {}]
+        service = self.create_service()
+
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            service.send_email('a@example.com', 'Subject', '<p>a</p>')
+        service.send_email('b@example.com', 'Subject', '<p>b</p>')
+
+        # The session goes back to the pool instead of being reopened and logged in again
+        mock_smtp.assert_called_once()
+        instance.login.assert_called_once()
+        instance.quit.assert_not_called()
+
+    @patch('smtplib.SMTP')
+    def test_send_bulk_returns_per_recipient_results(self, mock_smtp):
+        def sendmail(sender_email, recipient_email, message):
+            if recipient_email == 'b@example.com':
+                raise smtplib.SMTPRecipientsRefused({recipient_email: (550, b'No such user')})
+
+        mock_smtp.return_value.sendmail.side_effect = sendmail
+        service = self.create_service(max_size=3)
+        emails = [Email(f'{name}@example.com', 'Subject', '<p>hi</p>') for name in 'abcd']
+
+        results = service.send_bulk(emails)
+
+        # Results keep the input order and the failure does not stop the other sends
+        self.assertEqual([result['email'] for result in results], [email.recipient_email for email in emails])
+        self.assertEqual([result['status'] for result in results], ['sent', 'failed', 'sent', 'sent'])
+        self.assertIsNotNone(results[1]['error'])
+
+        # Sends fan out over no more sessions than the pool allows
+        self.assertLessEqual(mock_smtp.call_count, 3)
+
+    def test_send_bulk_applies_rate_limit(self):
+        service = EmailService(pool=MagicMock(max_size=2), rate_limiter=RateLimiter(per_second=1000, per_day=2))
+
+        results = service.send_bulk([Email(f'{i}@example.com', 'Subject', '') for i in range(3)])
+
+        # Only the daily quota is delivered and the rest fail fast for a later retry
+        self.assertEqual(sorted(result['status'] for result in results), ['failed', 'sent', 'sent'])
+        self.assertEqual(service.pool.sendmail.call_count, 2)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=0.001, capacity=2)
+        self.assertTrue(bucket.try_acquire())
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+
+    def test_rate_limiter_daily_quota(self):
+        rate_limiter = RateLimiter(per_second=1000, per_day=1)
+        rate_limiter.acquire()
+        with self.assertRaises(QuotaExceededError) as context:
+            rate_limiter.acquire()
+
+        # The error tells when the quota allows the next send, one token per day here
+        self.assertAlmostEqual(context.exception.retry_after, 24 * 60 * 60, delta=1)
+
+    def test_rate_limiter_shared_between_processes(self):
+        path = os.path.join(tempfile.mkdtemp(), 'outbox.sqlite3')
+        workers = [RateLimiter(per_second=1000, per_day=2, path=path, name='santa@example.com') for _ in range(2)]
+
+        # Each worker sends one email and the daily quota is used up for both
+        workers[0].acquire()
+        workers[1].acquire()
+        with self.assertRaises(QuotaExceededError):
+            workers[0].acquire()
+
+        # A restarted worker does not get a full quota back
+        restarted = RateLimiter(per_second=1000, per_day=2, path=path, name='santa@example.com')
+        with self.assertRaises(QuotaExceededError) as context:
+            restarted.acquire()
+        self.assertAlmostEqual(context.exception.retry_after, 12 * 60 * 60, delta=1)
+
+        # Other sender accounts have quotas of their own
+        RateLimiter(per_second=1000, per_day=2, path=path, name='elf@example.com').acquire()
+
 if __name__ == '__main__':
     unittest.main()
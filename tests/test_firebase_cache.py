@@ -0,0 +1,193 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from src.firebase_cache import CachedFirebaseCRUD
+
+
+class TestCachedFirebaseCRUD(unittest.TestCase):
+    def setUp(self):
+        self.crud = MagicMock()
+        self.crud.read.return_value = {
+            "code": 200,
+            "message": "Document read successfully",
+            "data": {"name": "Party", "id": "party123"},
+        }
+        self.crud.where.return_value = {
+            "code": 200,
+            "message": "Documents retrieved successfully",
+            "data": [{"username": "User", "id": "user123"}],
+        }
+        self.cache = CachedFirebaseCRUD(self.crud, max_entries=2)
+
+    def test_read_hit(self):
+        first = self.cache.read("Party", "party123")
+        second = self.cache.read("Party", "party123")
+
+        self.crud.read.assert_called_once_with("Party", "party123", fields=None)
+        self.assertEqual(first, second)
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "evictions": 0, "size": 1})
+
+    def test_returned_documents_can_be_modified(self):
+        self.cache.read("Party", "party123")["data"]["users"] = []
+        self.cache.where("User", "party_id", "==", "party123")["data"][0]["extra"] = True
+
+        self.assertNotIn("users", self.cache.read("Party", "party123")["data"])
+        self.assertNotIn("extra", self.cache.where("User", "party_id", "==", "party123")["data"][0])
+
+    def test_not_found_is_cached(self):
+        self.crud.read.return_value = {"code": 404, "message": "Document not found"}
+
+        self.cache.read("Party", "missing")
+        response = self.cache.read("Party", "missing")
+
+        self.crud.read.assert_called_once()
+        self.assertEqual(response, {"code": 404, "message": "Document not found"})
+
+    def test_errors_are_not_cached(self):
+        self.crud.read.return_value = {"code": 500, "message": "Failed to read document: boom"}
+
+        self.cache.read("Party", "party123")
+        self.cache.read("Party", "party123")
+
+        self.assertEqual(self.crud.read.call_count, 2)
+
+    def test_ttl_expiry(self):
+        with patch("src.firebase_cache.time.monotonic", return_value=100.0):
+            self.cache.read("Party", "party123")
+        with patch("src.firebase_cache.time.monotonic", return_value=100.0 + self.cache.ttls["Party"] + 1):
+            self.cache.read("Party", "party123")
+
+        self.assertEqual(self.crud.read.call_count, 2)
+
+    def test_lru_eviction(self):
+        self.cache.read("Party", "a")
+        self.cache.read("Party", "b")
+        self.cache.read("Party", "a")
+        self.cache.read("Party", "c")
+
+        # b was the least recently used entry
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        self.cache.read("Party", "a")
+        self.assertEqual(self.crud.read.call_count, 3)
+        self.cache.read("Party", "b")
+        self.assertEqual(self.crud.read.call_count, 4)
+
+    def test_writes_invalidate(self):
+        self.cache.where("User", "party_id", "==", "party123")
+        self.cache.read("Party", "party123")
+
+        self.crud.create.return_value = {"code": 200, "id": "user456"}
+        self.cache.create("User", {"party_id": "party123"})
+        self.cache.where("User", "party_id", "==", "party123")
+        self.assertEqual(self.crud.where.call_count, 2)
+
+        # Writes to users leave parties cached
+        self.cache.read("Party", "party123")
+        self.crud.read.assert_called_once()
+
+        self.cache.update("Party", "party123", {"ownerId": "user456"})
+        self.cache.read("Party", "party123")
+        self.assertEqual(self.crud.read.call_count, 2)
+
+        self.cache.delete("User", "user456")
+        self.cache.where("User", "party_id", "==", "party123")
+        self.assertEqual(self.crud.where.call_count, 3)
+
+    def test_projections_are_cached_separately(self):
+        self.cache.read("Party", "party123")
+        self.cache.read("Party", "party123", fields=["name"])
+        self.cache.read("Party", "party123", fields=["name"])
+
+        self.assertEqual(self.crud.read.call_count, 2)
+        self.crud.read.assert_called_with("Party", "party123", fields=["name"])
+
+    def test_transaction_invalidates_written_documents(self):
+        self.cache.read("Party", "party123")
+        self.crud.run_transaction.return_value = {"code": 200, "data": "user456", "writes": [("Party", "party123")]}
+
+        self.cache.run_transaction(lambda transaction: None)
+        self.cache.read("Party", "party123")
+
+        self.assertEqual(self.crud.read.call_count, 2)
+
+    def test_read_in_flight_during_write_is_not_cached(self):
+        def read_then_write(collection, document_id, fields=None):
+            # Another request writes the document while this read is in flight
+            self.cache.invalidate(collection, document_id)
+            return {"code": 200, "message": "Document read successfully", "data": {"name": "Old"}}
+
+        self.crud.read.side_effect = read_then_write
+        self.cache.read("Party", "party123")
+        self.cache.read("Party", "party123")
+
+        self.assertEqual(self.crud.read.call_count, 2)
+
+    def test_read_many_fetches_only_missing_documents(self):
+        self.cache.max_entries = 10
+        self.cache.read("Party", "party123")
+        self.crud.read_many.return_value = {
+            "code": 200,
+            "message": "Documents read successfully",
+            "data": [{"name": "Other", "id": "party456"}],
+        }
+
+        response = self.cache.read_many("Party", ["party456", "party123", "missing"])
+
+        self.crud.read_many.assert_called_once_with("Party", ["party456", "missing"], fields=None)
+        self.assertEqual([party["id"] for party in response["data"]], ["party456", "party123"])
+
+        # Found and missing documents are both cached now
+        self.cache.read_many("Party", ["party456", "missing"])
+        self.crud.read_many.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+    def test_pages_are_cached_per_cursor(self):
+        self.crud.page.return_value = {"code": 200, "data": [{"username": "User", "id": "user123"}], "next": "user123"}
+
+        self.cache.page("User", "party_id", "==", "party123", 1)
+        self.cache.page("User", "party_id", "==", "party123", 1)
+        self.cache.page("User", "party_id", "==", "party123", 1, after="user123")
+        self.assertEqual(self.crud.page.call_count, 2)
+
+        # Any write to the collection drops its pages
+        self.cache.update("User", "user456", {"party_id": "party123"})
+        self.cache.page("User", "party_id", "==", "party123", 1)
+        self.assertEqual(self.crud.page.call_count, 3)
+
+    def test_streamed_queries_are_cached_once_complete(self):
+        def where_stream(*args, versions=None, **kwargs):
+            versions["user123"] = "v1"
+            yield {"username": "User", "id": "user123"}
+
+        self.crud.where_stream.side_effect = where_stream
+
+        # A stream left unfinished caches nothing
+        next(self.cache.where_stream("User", "party_id", "==", "party123"))
+        first_versions, second_versions = {}, {}
+        first = list(self.cache.where_stream("User", "party_id", "==", "party123", versions=first_versions))
+        second = list(self.cache.where_stream("User", "party_id", "==", "party123", versions=second_versions))
+
+        self.assertEqual(self.crud.where_stream.call_count, 2)
+        self.assertEqual(first, second)
+        self.assertEqual(second_versions, {"user123": "v1"})
+
+        # The complete result also answers the same where query
+        self.assertEqual(self.cache.where("User", "party_id", "==", "party123")["data"], first)
+        self.crud.where.assert_not_called()
+
+    def test_read_many_keeps_versions_of_cached_documents(self):
+        self.cache.max_entries = 10
+        self.crud.read_many.return_value = {
+            "code": 200,
+            "message": "Documents read successfully",
+            "data": [{"name": "Party", "id": "party123"}],
+            "versions": {"party123": "v1"},
+        }
+
+        self.cache.read_many("Party", ["party123"])
+        response = self.cache.read_many("Party", ["party123"])
+
+        self.crud.read_many.assert_called_once()
+        self.assertEqual(response["versions"], {"party123": "v1"})
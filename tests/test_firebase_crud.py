@@ -1,7 +1,11 @@
+import datetime
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
 from google.api_core.exceptions import NotFound
-from src.firebase_crud import FirebaseCRUD
+from concurrent.futures import ThreadPoolExecutor
+from src.firebase_crud import FirebaseCRUD, get_firebase_crud, reset_firebase_crud
+from src.memory_storage import MemoryStorage
 import os
 
 
@@ -66,6 +70,117 @@ class TestFirebaseCRUD(unittest.TestCase):
         response = self.firebase_crud.read("test_collection", "test_document")
         self.assertEqual(response, {"code": 404, "message": "Document not found"})
 
+    def test_read_many_keeps_order_and_deduplicates(self):
+        # get_all returns the documents in a different order and skips nothing
+        def snapshot(doc_id, exists=True):
+            doc = MagicMock()
+            doc.id = doc_id
+            doc.exists = exists
+            doc.to_dict.return_value = {"name": doc_id}
+            doc.update_time = datetime.datetime(2024, 12, 1, tzinfo=datetime.timezone.utc)
+            return doc
+
+        self.mock_db.get_all.return_value = [snapshot("b"), snapshot("missing", exists=False), snapshot("a")]
+
+        response = self.firebase_crud.read_many("test_collection", ["a", "b", "a", "missing"])
+
+        # A single batched request for the unique ids
+        self.mock_db.get_all.assert_called_once()
+        self.assertEqual(len(self.mock_db.get_all.call_args[0][0]), 3)
+        self.assertEqual(
+            response,
+            {
+                "code": 200,
+                "message": "Documents read successfully",
+                "data": [{"name": "a", "id": "a"}, {"name": "b", "id": "b"}],
+                "versions": {"a": "2024-12-01T00:00:00+00:00", "b": "2024-12-01T00:00:00+00:00"},
+            },
+        )
+
+    def test_read_many_empty(self):
+        response = self.firebase_crud.read_many("test_collection", [])
+        self.assertEqual(response["data"], [])
+        self.mock_db.get_all.assert_not_called()
+
+    def test_submit_runs_reads_concurrently(self):
+        started = threading.Barrier(2, timeout=5)
+
+        # Each read waits for the other one to start, which only works if they overlap
+        def get(field_paths=None):
+            started.wait()
+            doc = MagicMock()
+            doc.exists = False
+            return doc
+
+        def query():
+            started.wait()
+            return []
+
+        self.mock_db.collection.return_value.document.return_value.get.side_effect = get
+        self.mock_db.collection.return_value.where.return_value.get.side_effect = query
+
+        party_future = self.firebase_crud.submit("read", "Party", "party123")
+        users_future = self.firebase_crud.submit("where", "User", "party_id", "==", "party123")
+        party, users = party_future.result(), users_future.result()
+
+        self.assertEqual(party, {"code": 404, "message": "Document not found"})
+        self.assertEqual(users["data"], [])
+
+    @patch("src.firebase_crud.firestore.transactional", lambda function: function)
+    def test_run_transaction(self):
+        mock_transaction = self.mock_db.transaction.return_value
+        mock_doc = MagicMock()
+        mock_doc.exists = True
+        mock_doc.id = "party123"
+        mock_doc.to_dict.return_value = {"ownerId": ""}
+        document = self.mock_db.collection.return_value.document
+        document.return_value.get.return_value = mock_doc
+        document.return_value.id = "user123"
+
+        def callback(transaction):
+            party = transaction.read("Party", "party123")
+            user_id = transaction.create("User", {"username": "Test"})
+            transaction.update("Party", "party123", {"ownerId": user_id})
+            return party
+
+        response = self.firebase_crud.run_transaction(callback)
+
+        # Reads and writes go through the transaction
+        document.return_value.get.assert_called_once_with(transaction=mock_transaction)
+        mock_transaction.create.assert_called_once_with(document.return_value, {"username": "Test"})
+        mock_transaction.update.assert_called_once_with(document.return_value, {"ownerId": "user123"})
+        self.assertEqual(
+            response,
+            {
+                "code": 200,
+                "message": "Transaction committed successfully",
+                "data": {"ownerId": "", "id": "party123"},
+                "writes": [("User", "user123"), ("Party", "party123")],
+            },
+        )
+
+    @patch("src.firebase_crud.firestore.transactional", lambda function: function)
+    def test_run_transaction_failure(self):
+        def callback(transaction):
+            raise ValueError("boom")
+
+        response = self.firebase_crud.run_transaction(callback)
+        self.assertEqual(response, {"code": 500, "message": "Failed to run transaction: boom"})
+
+    def test_batch_write(self):
+        batch = self.mock_db.batch.return_value
+        self.mock_db.collection.return_value.document.return_value.id = "doc123"
+
+        response = self.firebase_crud.batch_write(
+            [("create", "User", {"username": "Test"}), ("delete", "User", "doc123")]
+        )
+
+        # Both writes are committed together in one request
+        batch.create.assert_called_once()
+        batch.delete.assert_called_once()
+        batch.commit.assert_called_once_with()
+        self.assertEqual(response, {"code": 200, "message": "Batch committed successfully", "ids": ["doc123", "doc123"]})
+
     def test_update_document_success(self):
         # Mock Firestore update method
         self.mock_db.collection.return_value.document.return_value.update.return_value = (
@@ -134,6 +249,76 @@ class TestFirebaseCRUD(unittest.TestCase):
             },
         )
 
+    def test_where_query_projection(self):
+        mock_collection = MagicMock()
+        mock_document = MagicMock()
+        mock_document.id = "user123"
+        mock_document.to_dict.return_value = {"username": "test"}
+        mock_collection.where.return_value.select.return_value.get.return_value = [mock_document]
+        self.mock_db.collection.return_value = mock_collection
+
+        response = self.firebase_crud.where(
+            "test_collection", "test_field", "==", "test_value", fields=["username"]
+        )
+
+        # Only the selected fields are requested
+        mock_collection.where.return_value.select.assert_called_once_with(["username"])
+        self.assertEqual(response["data"], [{"username": "test", "id": "user123"}])
+
+    def test_read_document_projection(self):
+        document = self.mock_db.collection.return_value.document.return_value
+        document.get.return_value.exists = False
+
+        self.firebase_crud.read("test_collection", "test_document", fields=["name"])
+
+        document.get.assert_called_once_with(field_paths=["name"])
+
+    def _mock_page_documents(self, mock_query, pages):
+        """Makes each query stream return the next list of document IDs."""
+        documents = []
+        for ids in pages:
+            page = []
+            for document_id in ids:
+                document = MagicMock()
+                document.id = document_id
+                document.to_dict.return_value = {"username": document_id}
+                page.append(document)
+            documents.append(page)
+        mock_query.stream.side_effect = documents
+
+    def test_page(self):
+        query = self.mock_db.collection.return_value.where.return_value.order_by.return_value.limit.return_value
+        self._mock_page_documents(query.start_after.return_value, [["user2", "user3", "user4"], ["user4"]])
+
+        response = self.firebase_crud.page("User", "party_id", "==", "party123", 2, after="user1")
+
+        # One extra document is fetched to know that another page follows
+        self.mock_db.collection.return_value.where.return_value.order_by.return_value.limit.assert_called_once_with(3)
+        self.assertEqual(response["data"], [{"username": "user2", "id": "user2"}, {"username": "user3", "id": "user3"}])
+        self.assertEqual(response["next"], "user3")
+
+        response = self.firebase_crud.page("User", "party_id", "==", "party123", 2, after="user3")
+        self.assertEqual(response["data"], [{"username": "user4", "id": "user4"}])
+        self.assertIsNone(response["next"])
+
+    def test_where_stream(self):
+        query = self.mock_db.collection.return_value.where.return_value.order_by.return_value.limit.return_value
+        self._mock_page_documents(query, [["user1", "user2", "user3"]])
+        self._mock_page_documents(query.start_after.return_value, [["user3"]])
+
+        documents = self.firebase_crud.where_stream("User", "party_id", "==", "party123", page_size=2)
+
+        # Each page is streamed from Firestore in turn, resuming after the last document
+        self.assertEqual([document["id"] for document in documents], ["user1", "user2", "user3"])
+        query.start_after.assert_called_once()
+
+    def test_page_failure(self):
+        self.mock_db.collection.return_value.where.side_effect = Exception("test")
+
+        response = self.firebase_crud.page("User", "party_id", "==", "party123", 2)
+
+        self.assertEqual(response, {"code": 500, "message": "Failed to retrieve documents: test"})
+
     def test_where_query_failure(self):
         # Mock Firestore where method to raise exception
         mock_collection = MagicMock()
@@ -148,5 +333,39 @@ class TestFirebaseCRUD(unittest.TestCase):
         )
 
 
+class TestSharedFirebaseCRUD(unittest.TestCase):
+    def setUp(self):
+        reset_firebase_crud()
+
+    def tearDown(self):
+        reset_firebase_crud()
+
+    @patch("src.firebase_crud.FirebaseCRUD")
+    def test_get_firebase_crud_is_shared(self, mock_firebase_crud):
+        # Concurrent first calls still create a single instance
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            instances = list(executor.map(lambda _: get_firebase_crud(), range(32)))
+
+        mock_firebase_crud.assert_called_once_with()
+        self.assertTrue(all(instance is instances[0] for instance in instances))
+        self.assertIs(instances[0].crud.backend, mock_firebase_crud.return_value)
+
+    @patch("src.firebase_crud.FirebaseCRUD")
+    def test_reset_firebase_crud(self, mock_firebase_crud):
+        get_firebase_crud()
+        reset_firebase_crud()
+        get_firebase_crud()
+
+        self.assertEqual(mock_firebase_crud.call_count, 2)
+
+    @patch.dict(os.environ, {"STORAGE_BACKEND": "memory"})
+    @patch("src.firebase_crud.FirebaseCRUD")
+    def test_memory_backend(self, mock_firebase_crud):
+        crud = get_firebase_crud()
+
+        mock_firebase_crud.assert_not_called()
+        self.assertIsInstance(crud.crud.backend, MemoryStorage)
+
+
 if __name__ == "__main__":
     unittest.main()
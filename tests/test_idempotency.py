@@ -0,0 +1,103 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+from src.app import app, idempotency_store
+from src.memory_storage import MemoryStorage
+from utilities.idempotency import IdempotencyStore, REPLAYED_HEADER
+
+PARTY = {"name": "Party", "budget": 20, "categories": []}
+
+
+class TestIdempotencyStore(unittest.TestCase):
+    def test_reserve_and_expire(self):
+        store = IdempotencyStore(ttl=0.0)
+        entry, owner = store.reserve("key", b"body")
+        self.assertTrue(owner)
+        self.assertFalse(store.reserve("key", b"body")[1])
+
+        # An expired response no longer answers the key
+        store.complete("key", entry, MagicMock(status_code=200, get_json=lambda silent: {"code": 200}))
+        self.assertTrue(store.reserve("key", b"body")[1])
+
+    def test_max_entries(self):
+        store = IdempotencyStore(max_entries=2)
+        for key in ("a", "b", "c"):
+            entry, _ = store.reserve(key, b"")
+            store.complete(key, entry, MagicMock(status_code=200, get_json=lambda silent: None))
+
+        self.assertEqual(list(store._entries), ["b", "c"])
+
+
+class TestIdempotentRoutes(unittest.TestCase):
+    def setUp(self):
+        idempotency_store.clear()
+        self.app = app.test_client()
+        self.storage = MemoryStorage()
+        patcher = patch("src.app.get_firebase_crud", return_value=self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.app.post("/CreateParty/", json=PARTY, headers={"Idempotency-Key": "key1"})
+        retry = self.app.post("/CreateParty/", json=PARTY, headers={"Idempotency-Key": "key1"})
+        other = self.app.post("/CreateParty/", json=PARTY, headers={"Idempotency-Key": "key2"})
+
+        self.assertEqual(retry.get_json(), first.get_json())
+        self.assertEqual(retry.headers[REPLAYED_HEADER], "true")
+        self.assertNotIn(REPLAYED_HEADER, first.headers)
+        self.assertNotEqual(other.get_json()["id"], first.get_json()["id"])
+        self.assertEqual(len(self.storage._collections["Party"]), 2)
+
+    def test_key_reused_with_another_body(self):
+        self.app.post("/CreateParty/", json=PARTY, headers={"Idempotency-Key": "key1"})
+        response = self.app.post("/CreateParty/", json={**PARTY, "budget": 30}, headers={"Idempotency-Key": "key1"})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(len(self.storage._collections["Party"]), 1)
+
+    def test_server_errors_are_not_replayed(self):
+        with patch.object(self.storage, "create", return_value={"code": 500, "message": "Failed to create document"}):
+            self.app.post("/CreateParty/", json=PARTY, headers={"Idempotency-Key": "key1"})
+        response = self.app.post("/CreateParty/", json=PARTY, headers={"Idempotency-Key": "key1"})
+
+        self.assertEqual(response.get_json()["code"], 200)
+        self.assertNotIn(REPLAYED_HEADER, response.headers)
+
+    def test_concurrent_duplicates_wait_for_the_first(self):
+        release = threading.Event()
+        create = self.storage.create
+
+        def slow_create(*args):
+            release.wait(5)
+            return create(*args)
+
+        def post(_):
+            return self.app.post("/CreateParty/", json=PARTY, headers={"Idempotency-Key": "key1"}).get_json()
+
+        with patch.object(self.storage, "create", side_effect=slow_create) as mock_create:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                futures = [executor.submit(post, index) for index in range(4)]
+                threading.Event().wait(0.1)
+                release.set()
+                responses = [future.result() for future in futures]
+
+        mock_create.assert_called_once()
+        self.assertTrue(all(response == responses[0] for response in responses))
+
+    @patch("src.app.SecretSanta", autospec=True)
+    @patch("src.app.email_dispatcher", new_callable=MagicMock)
+    def test_secret_santa_is_drawn_once(self, mock_email_dispatcher, mock_secret_santa):
+        mock_secret_santa.return_value.assign.return_value = ["email"]
+        mock_email_dispatcher.submit.return_value = "job123"
+
+        for _ in range(2):
+            response = self.app.post("/SecretSanta/", json={"players": []}, headers={"Idempotency-Key": "key1"})
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.get_json(), {"Status": "Queued", "job_id": "job123"})
+
+        mock_email_dispatcher.submit.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
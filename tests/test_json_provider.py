@@ -0,0 +1,53 @@
+import datetime
+import math
+import unittest
+from flask import Flask, request
+from utilities import json_provider
+from utilities.json_provider import FastJSONProvider
+
+
+class TestFastJSONProvider(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.json = FastJSONProvider(self.app)
+
+        @self.app.route("/party")
+        def party():
+            return {"name": "Party", "users": [{"username": "Jérôme", "id": "user123"}]}
+
+        self.client = self.app.test_client()
+
+    def test_response(self):
+        response = self.client.get("/party")
+
+        self.assertEqual(response.mimetype, "application/json")
+        self.assertEqual(response.get_json(), {"name": "Party", "users": [{"username": "Jérôme", "id": "user123"}]})
+
+    def test_same_values_as_default_provider(self):
+        value = {"b": datetime.datetime(2024, 12, 24, 18, 0), "a": [1, 2**70], "c": {"nested": None}}
+
+        self.assertEqual(
+            self.app.json.loads(self.app.json.dumps(value)),
+            self.app.json.loads(super(FastJSONProvider, self.app.json).dumps(value)),
+        )
+
+    def test_request_bodies_parse_as_with_default_provider(self):
+        # orjson rejects NaN, which the json module has always accepted in request bodies
+        with self.app.test_request_context("/party", method="POST", data='{"budget": NaN}', content_type="application/json"):
+            self.assertTrue(math.isnan(request.get_json()["budget"]))
+
+    def test_sorted_keys(self):
+        self.assertEqual(self.app.json.dumps({"b": 1, "a": 2}), '{"a":2,"b":1}')
+
+    def test_without_orjson(self):
+        orjson, json_provider.orjson = json_provider.orjson, None
+        try:
+            response = self.client.get("/party")
+        finally:
+            json_provider.orjson = orjson
+
+        self.assertEqual(response.get_json()["name"], "Party")
+
+
+if __name__ == "__main__":
+    unittest.main()
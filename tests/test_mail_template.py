@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from src.mail_template import MailTemplate, TEMPLATE_PATH
+
+
+class TestMailTemplate(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "mail.html")
+        self.write("<style>p { color: red; }</style><p>Hey {{gifter}}</p><a href=\"{{ link }}\">Go</a>")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, content, mtime=None):
+        with open(self.path, "w", encoding="utf-8") as file:
+            file.write(content)
+        if mtime is not None:
+            os.utime(self.path, ns=(mtime, mtime))
+
+    def test_render(self):
+        template = MailTemplate(self.path, auto_reload=False)
+
+        self.assertEqual(template.placeholders, {"gifter", "link"})
+        self.assertEqual(
+            template.render(gifter="Bob", link="https://example.com"),
+            "<style>p { color: red; }</style><p>Hey Bob</p><a href=\"https://example.com\">Go</a>",
+        )
+
+    def test_render_escapes_values(self):
+        template = MailTemplate(self.path, auto_reload=False)
+
+        rendered = template.render(gifter="<b>Bob</b>", link="https://example.com?a=1&b=2")
+
+        self.assertIn("Hey &lt;b&gt;Bob&lt;/b&gt;", rendered)
+        self.assertIn("href=\"https://example.com?a=1&amp;b=2\"", rendered)
+
+    def test_render_does_not_read_the_file(self):
+        template = MailTemplate(self.path, auto_reload=False)
+
+        with patch("builtins.open") as mock_open:
+            template.render(gifter="Bob", link="link")
+        mock_open.assert_not_called()
+
+    def test_auto_reload_on_mtime_change(self):
+        template = MailTemplate(self.path, auto_reload=True)
+        self.write("Bye {{gifter}}", mtime=os.stat(self.path).st_mtime_ns + 1_000_000_000)
+
+        self.assertEqual(template.render(gifter="Bob"), "Bye Bob")
+
+    def test_mail_template_placeholders(self):
+        template = MailTemplate(TEMPLATE_PATH, auto_reload=False)
+        self.assertEqual(template.placeholders, {"gifter", "link"})
+
+
+if __name__ == "__main__":
+    unittest.main()
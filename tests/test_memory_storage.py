@@ -0,0 +1,181 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from src.app import app
+from src.memory_storage import MemoryStorage
+
+
+class TestMemoryStorage(unittest.TestCase):
+    def setUp(self):
+        self.storage = MemoryStorage()
+
+    def test_create_and_read(self):
+        response = self.storage.create("Party", {"name": "Party", "categories": ["Food"]})
+
+        self.assertEqual(response["code"], 200)
+        document = self.storage.read("Party", response["id"])["data"]
+        self.assertEqual(document, {"name": "Party", "categories": ["Food"], "id": response["id"]})
+        self.assertEqual(self.storage.read("Party", response["id"], fields=["name"])["data"], {"name": "Party", "id": response["id"]})
+        self.assertEqual(self.storage.read("Party", "missing"), {"code": 404, "message": "Document not found"})
+
+    def test_documents_are_copied(self):
+        party = {"name": "Party", "categories": ["Food"]}
+        party_id = self.storage.create("Party", party)["id"]
+
+        party["categories"].append("Games")
+        self.storage.read("Party", party_id)["data"]["categories"].append("Books")
+
+        self.assertEqual(self.storage.read("Party", party_id)["data"]["categories"], ["Food"])
+
+    def test_read_many(self):
+        ids = self.storage.seed("Party", [{"id": "party1", "name": "One"}, {"id": "party2", "name": "Two"}])
+
+        response = self.storage.read_many("Party", ["party2", "missing", "party1", "party2"])
+
+        self.assertEqual(ids, ["party1", "party2"])
+        self.assertEqual([party["id"] for party in response["data"]], ["party2", "party1"])
+
+    def test_update_and_delete(self):
+        self.storage.seed("User", [{"id": "user1", "username": "User", "party_id": "party1"}])
+
+        self.assertEqual(self.storage.update("User", "user1", {"username": "New"})["code"], 200)
+        self.assertEqual(self.storage.read("User", "user1")["data"]["username"], "New")
+        self.assertEqual(self.storage.update("User", "missing", {"username": "New"})["code"], 404)
+
+        self.assertEqual(self.storage.delete("User", "user1")["code"], 200)
+        self.assertEqual(self.storage.read("User", "user1")["code"], 404)
+
+    def test_indexes_follow_writes(self):
+        self.storage.seed("User", [
+            {"id": "user1", "email": "a@test.com", "party_id": "party1"},
+            {"id": "user2", "email": "b@test.com", "party_id": "party1"},
+        ])
+
+        self.storage.update("User", "user2", {"party_id": "party2"})
+        self.storage.delete("User", "user1")
+
+        index = self.storage._indexes[("User", "party_id")]
+        self.assertEqual(index, {"party2": {"user2"}})
+        self.assertEqual(self.storage.where("User", "party_id", "==", "party1")["data"], [])
+        self.assertEqual([user["id"] for user in self.storage.where("User", "party_id", "==", "party2")["data"]], ["user2"])
+
+    def test_where_without_index(self):
+        self.storage.seed("Party", [
+            {"id": "party1", "budget": 10, "categories": ["Food"]},
+            {"id": "party2", "budget": 50, "categories": ["Games"]},
+            {"id": "party3", "name": "No budget"},
+        ])
+
+        def ids(*query):
+            return [party["id"] for party in self.storage.where("Party", *query)["data"]]
+
+        self.assertEqual(ids("budget", ">", 20), ["party2"])
+        self.assertEqual(ids("budget", "!=", 10), ["party2"])
+        self.assertEqual(ids("categories", "array-contains", "Food"), ["party1"])
+        self.assertEqual(ids("budget", "in", [10, 50]), ["party1", "party2"])
+        self.assertEqual(self.storage.where("Party", "budget", "~", 10)["code"], 500)
+
+    def test_page_and_where_stream(self):
+        self.storage.seed("User", [{"id": f"user{index}", "party_id": "party1"} for index in range(5)])
+
+        first = self.storage.page("User", "party_id", "==", "party1", 2, fields=["party_id"])
+        last = self.storage.page("User", "party_id", "==", "party1", 2, after="user3")
+
+        self.assertEqual([user["id"] for user in first["data"]], ["user0", "user1"])
+        self.assertEqual(first["next"], "user1")
+        self.assertEqual([user["id"] for user in last["data"]], ["user4"])
+        self.assertIsNone(last["next"])
+
+        versions = {}
+        streamed = self.storage.where_stream("User", "party_id", "==", "party1", page_size=2, versions=versions)
+        self.assertEqual([user["id"] for user in streamed], [f"user{index}" for index in range(5)])
+        self.assertEqual(sorted(versions), [f"user{index}" for index in range(5)])
+
+    def test_run_transaction(self):
+        self.storage.seed("Party", [{"id": "party1", "ownerId": ""}])
+
+        def join(transaction):
+            user_id = transaction.create("User", {"party_id": "party1"})
+            transaction.update("Party", "party1", {"ownerId": user_id})
+            return user_id
+
+        response = self.storage.run_transaction(join)
+
+        self.assertEqual(response["code"], 200)
+        self.assertEqual(self.storage.read("Party", "party1")["data"]["ownerId"], response["data"])
+        self.assertEqual(response["writes"], [("User", response["data"]), ("Party", "party1")])
+
+    def test_failed_transaction_writes_nothing(self):
+        def join(transaction):
+            transaction.create("User", {"party_id": "party1"})
+            transaction.update("Party", "missing", {"ownerId": "user1"})
+
+        response = self.storage.run_transaction(join)
+
+        self.assertEqual(response["code"], 500)
+        self.assertEqual(self.storage.where("User", "party_id", "==", "party1")["data"], [])
+
+    def test_batch_write(self):
+        self.storage.seed("User", [{"id": "user1", "party_id": "party1"}])
+
+        response = self.storage.batch_write([
+            ("create", "User", {"party_id": "party1"}),
+            ("update", "User", "user1", {"party_id": "party2"}),
+        ])
+        self.assertEqual(response["code"], 200)
+        self.assertEqual(response["ids"][1], "user1")
+        self.assertEqual(self.storage.read("User", response["ids"][0])["data"]["party_id"], "party1")
+
+        # A missing document fails the whole batch
+        response = self.storage.batch_write([("delete", "User", "user1"), ("update", "User", "missing", {})])
+        self.assertEqual(response, {"code": 404, "message": "Document to update not found"})
+        self.assertEqual(self.storage.read("User", "user1")["code"], 200)
+
+    def test_versions_change_on_write(self):
+        party_id = self.storage.create("Party", {"name": "Party"})["id"]
+        self.storage.seed("User", [{"id": "user1", "party_id": party_id}])
+
+        version = self.storage.read("Party", party_id)["version"]
+        versions = self.storage.where("User", "party_id", "==", party_id)["versions"]
+        self.storage.update("Party", party_id, {"name": "New"})
+
+        self.assertNotEqual(self.storage.read("Party", party_id)["version"], version)
+        self.assertEqual(self.storage.read_many("User", ["user1"])["versions"], versions)
+        self.assertEqual(list(self.storage.page("User", "party_id", "==", party_id, 1)["versions"]), ["user1"])
+
+    def test_concurrent_writes(self):
+        def create(index):
+            return self.storage.create("User", {"email": f"{index % 10}@test.com", "party_id": "party1"})["id"]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            ids = list(executor.map(create, range(200)))
+
+        self.assertEqual(len(set(ids)), 200)
+        self.assertEqual(len(self.storage.where("User", "party_id", "==", "party1")["data"]), 200)
+        self.assertEqual(len(self.storage.where("User", "email", "==", "3@test.com")["data"]), 20)
+
+
+class TestAppWithMemoryStorage(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        self.storage = MemoryStorage()
+        patcher = patch("src.app.get_firebase_crud", return_value=self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_party_lifecycle(self):
+        party_id = self.storage.seed("Party", [{"name": "Party", "budget": 20, "categories": [], "ownerId": ""}])[0]
+
+        owner_id = self.app.post(f"/CreateUser/{party_id}", json={"username": "Owner", "email": "owner@test.com"}).get_json()["id"]
+        self.app.post(f"/CreateUser/{party_id}", json={"username": "Guest", "email": "guest@test.com"})
+
+        party = self.app.get(f"/GetParty/{party_id}/{owner_id}").get_json()
+        self.assertEqual(party["data"]["ownerId"], owner_id)
+        self.assertEqual(sorted(user["username"] for user in party["data"]["users"]), ["Guest", "Owner"])
+
+        parties = self.app.get("/GetParties/", query_string={"email": "guest@test.com"}).get_json()
+        self.assertEqual([party["name"] for party in parties["data"]], ["Party"])
+
+
+if __name__ == "__main__":
+    unittest.main()
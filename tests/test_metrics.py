@@ -0,0 +1,149 @@
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+from src import metrics
+from src.app import app
+from src.email_service import EmailService
+from src.instrumented_storage import InstrumentedBackend
+from src.memory_storage import MemoryStorage
+from src.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.histogram = Histogram("duration_seconds", "Durations.", ("operation",), buckets=(0.1, 1.0), registry=self.registry)
+        self.counter = Counter("errors_total", "Errors.", ("code",), registry=self.registry)
+
+    def test_render_histogram_and_counter(self):
+        for value in (0.05, 0.1, 0.5, 2.0):
+            self.histogram.observe(value, "read")
+        self.counter.inc("404")
+        self.counter.inc("404", amount=2)
+
+        lines = self.registry.render().splitlines()
+
+        self.assertIn("# TYPE duration_seconds histogram", lines)
+        self.assertIn('duration_seconds_bucket{operation="read",le="0.1"} 2', lines)
+        self.assertIn('duration_seconds_bucket{operation="read",le="1.0"} 3', lines)
+        self.assertIn('duration_seconds_bucket{operation="read",le="+Inf"} 4', lines)
+        self.assertIn('duration_seconds_sum{operation="read"} 2.65', lines)
+        self.assertIn('duration_seconds_count{operation="read"} 4', lines)
+        self.assertIn('errors_total{code="404"} 3', lines)
+
+    def test_threads_are_merged(self):
+        def record():
+            for _ in range(1000):
+                self.counter.inc("500")
+
+        threads = [threading.Thread(target=record) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.counter.inc("500")
+
+        # Shards of finished threads are folded into one but still counted
+        self.assertEqual(self.registry.snapshot()[("errors_total", ("500",))], [8001])
+        self.assertEqual(len(self.registry._shards), 1)
+        self.assertEqual(self.registry.snapshot()[("errors_total", ("500",))], [8001])
+
+    def test_workers_are_added_up(self):
+        other = MetricsRegistry()
+        other_counter = Counter("errors_total", "Errors.", ("code",), registry=other)
+        with tempfile.TemporaryDirectory() as directory:
+            with patch("threading.Thread"):
+                self.registry.enable_multiprocess(directory)
+                other.enable_multiprocess(directory)
+
+            self.counter.inc("500")
+            other_counter.inc("500", amount=2)
+            other.flush()
+
+            self.assertIn('errors_total{code="500"} 3', self.registry.render().splitlines())
+
+    def test_exited_workers_keep_counters_but_not_gauges(self):
+        other = MetricsRegistry()
+        other_counter = Counter("errors_total", "Errors.", ("code",), registry=other)
+        Gauge("cache_size", "Cache size.", callback=lambda: {(): 7}, registry=other)
+        Gauge("cache_size", "Cache size.", callback=lambda: {(): 5}, registry=self.registry)
+        with tempfile.TemporaryDirectory() as directory:
+            with patch("threading.Thread"):
+                self.registry.enable_multiprocess(directory)
+                other.enable_multiprocess(directory)
+
+            other_counter.inc("500")
+            other.flush()
+            self.assertIn("cache_size 12", self.registry.render().splitlines())
+
+            # The exiting worker's last flush keeps its counts, but its gauge is gone with it
+            other.flush(final=True)
+            lines = self.registry.render().splitlines()
+            self.assertIn('errors_total{code="500"} 1', lines)
+            self.assertIn("cache_size 5", lines)
+
+
+class TestInstrumentedBackend(unittest.TestCase):
+    def setUp(self):
+        metrics.REGISTRY.clear()
+        self.storage = InstrumentedBackend(MemoryStorage())
+
+    def test_operations_are_timed(self):
+        party_id = self.storage.create("Party", {"name": "Party"})["id"]
+        self.storage.read("Party", party_id)
+        self.storage.read("Party", "missing")
+
+        samples = metrics.REGISTRY.snapshot()
+        self.assertEqual(sum(samples[("storage_operation_duration_seconds", ("read", "Party"))][:-1]), 2)
+        self.assertEqual(sum(samples[("storage_operation_duration_seconds", ("create", "Party"))][:-1]), 1)
+        self.assertEqual(samples[("storage_operation_errors_total", ("read", "Party", "404"))], [1])
+
+    def test_exceptions_are_counted(self):
+        storage = InstrumentedBackend(MagicMock())
+        storage.backend.read.side_effect = RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            storage.read("Party", "party1")
+
+        samples = metrics.REGISTRY.snapshot()
+        self.assertEqual(samples[("storage_operation_errors_total", ("read", "Party", "exception"))], [1])
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def setUp(self):
+        metrics.REGISTRY.clear()
+        self.app = app.test_client()
+        patcher = patch("src.app.get_firebase_crud", return_value=MemoryStorage())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_routes_are_labelled_by_template(self):
+        self.app.get("/GetParty/party1")
+        self.app.get("/GetParty/party2")
+        self.app.get("/missing")
+
+        response = self.app.get("/metrics")
+        lines = response.get_data(as_text=True).splitlines()
+
+        self.assertEqual(response.headers["Content-Type"], metrics.CONTENT_TYPE)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/GetParty/<party_id>"} 2', lines)
+        self.assertIn('http_responses_total{method="GET",route="/GetParty/<party_id>",status="200"} 2', lines)
+        self.assertIn('http_responses_total{method="GET",route="unmatched",status="404"} 1', lines)
+
+    def test_smtp_sends_are_timed(self):
+        pool = MagicMock()
+        service = EmailService(pool=pool, rate_limiter=MagicMock())
+        service.send_email("guest@test.com", "Subject", "<p>Hi</p>")
+        pool.sendmail.side_effect = OSError("down")
+        with self.assertRaises(OSError):
+            service.send_email("guest@test.com", "Subject", "<p>Hi</p>")
+
+        lines = self.app.get("/metrics").get_data(as_text=True).splitlines()
+
+        self.assertIn('smtp_send_duration_seconds_count{result="sent"} 1', lines)
+        self.assertIn('smtp_send_duration_seconds_count{result="failed"} 1', lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+from dataclasses import asdict
+from models.party_model import Party, PartyRequest
+from models.user_model import User
+
+
+class TestModels(unittest.TestCase):
+    def test_to_dict_matches_asdict(self):
+        for instance in (
+            PartyRequest("Party", 20, ["Books"]),
+            Party("Party", 20, ["Books"], ownerId="user123"),
+            User("user", "user@example.com", "party123", ["Games"]),
+        ):
+            self.assertEqual(instance.to_dict(), asdict(instance))
+
+    def test_models_are_slotted(self):
+        user = User("user", "user@example.com")
+
+        self.assertFalse(hasattr(user, "__dict__"))
+        with self.assertRaises(AttributeError):
+            user.nickname = "nick"
+
+
+if __name__ == "__main__":
+    unittest.main()
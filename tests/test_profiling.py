@@ -0,0 +1,83 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from src.app import app
+from src.memory_storage import MemoryStorage
+from src.profiling import RequestProfiler, FILE_HEADER, TOKEN_HEADER
+
+
+class TestRequestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.profiler = RequestProfiler(token="secret", directory=self.directory, interval=0.001, max_files=2)
+
+    def profile(self, duration, name="GET /GetParty/<party_id>"):
+        sampler = self.profiler.start()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            sum(range(100))
+        return self.profiler.stop(sampler, name)
+
+    def test_wants(self):
+        self.assertTrue(self.profiler.wants({TOKEN_HEADER: "secret"}))
+        self.assertFalse(self.profiler.wants({TOKEN_HEADER: "wrong"}))
+        self.assertFalse(self.profiler.wants({}))
+        self.assertFalse(RequestProfiler().enabled)
+        self.assertTrue(RequestProfiler(profile_all=True).wants({}))
+
+    def test_writes_collapsed_stacks(self):
+        filename = self.profile(0.05)
+
+        self.assertTrue(filename.endswith(".folded"))
+        self.assertIn("GET-GetParty-party-id", filename)
+        with open(os.path.join(self.directory, filename), encoding="utf-8") as file:
+            lines = file.read().splitlines()
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertGreater(int(count), 0)
+        self.assertIn("profile (tests/test_profiling.py:", stack.split(";")[-1])
+
+    def test_one_request_at_a_time(self):
+        sampler = self.profiler.start()
+        self.assertIsNone(self.profiler.start())
+        self.profiler.stop(sampler, "request")
+        self.profiler.stop(self.profiler.start(), "request")
+
+    def test_caps(self):
+        for _ in range(3):
+            self.profile(0.01)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+        self.profiler.max_bytes = 0
+        filename = self.profile(0.01)
+        self.assertEqual(os.path.getsize(os.path.join(self.directory, filename)), 0)
+
+
+class TestProfiledRequests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = app.test_client()
+        self.storage = MemoryStorage(latency=0.02)
+        self.party_id = self.storage.seed("Party", [{"name": "Party", "ownerId": ""}])[0]
+        profiler = RequestProfiler(token="secret", directory=self.directory, interval=0.001)
+        for patcher in (
+            patch("src.app.get_firebase_crud", return_value=self.storage),
+            patch("src.app.profiler", profiler),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_only_requests_with_the_token_are_profiled(self):
+        response = self.app.get(f"/GetParty/{self.party_id}", headers={TOKEN_HEADER: "wrong"})
+        self.assertNotIn(FILE_HEADER, response.headers)
+        self.assertEqual(os.listdir(self.directory), [])
+
+        response = self.app.get(f"/GetParty/{self.party_id}", headers={TOKEN_HEADER: "secret"})
+        filename = response.headers[FILE_HEADER]
+        with open(os.path.join(self.directory, filename), encoding="utf-8") as file:
+            self.assertIn("get_party (src/app.py:", file.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
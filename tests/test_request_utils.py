@@ -3,7 +3,7 @@ from unittest.mock import MagicMock
 from flask import Flask, request
 from dataclasses import dataclass, field
 from typing import List
-from utilities.request_utils import create_instance_from_request
+from utilities.request_utils import create_instance_from_request, get_validator
 
 
 app = Flask(__name__)
@@ -44,6 +44,32 @@ class TestRequestUtils(unittest.TestCase):
             self.assertEqual(result.field3, ['item1', 'item2'])
             self.assertEqual(result.field4, True)
 
+    def test_create_instance_from_request_structured_errors(self):
+        with app.test_request_context(json={'field2': 'invalid', 'field3': ['item1', 2], 'extra': 1}):
+            response, status_code = create_instance_from_request(request, MockDataClass)
+            self.assertEqual(status_code, 400)
+            self.assertEqual(response.get_json()['errors'], [
+                {'field': 'field1', 'error': 'Missing field field1'},
+                {'field': 'extra', 'error': 'Unknown field extra'},
+                {'field': 'field2', 'error': 'Invalid type for field field2'},
+                {'field': 'field3', 'error': 'Invalid type in list for field field3'},
+            ])
+
+    def test_create_instance_from_request_coerces_values(self):
+        with app.test_request_context(json={'field1': 'test', 'field2': '123'}):
+            result = create_instance_from_request(request, MockDataClass)
+            self.assertEqual(result.field2, 123)
+            self.assertEqual(result.field3, [])
+
+    def test_create_instance_from_request_not_a_dataclass(self):
+        with app.test_request_context(json={}):
+            response, status_code = create_instance_from_request(request, dict)
+            self.assertEqual(status_code, 400)
+            self.assertEqual(response.get_json()['message'], 'dict is not a dataclass')
+
+    def test_validator_is_compiled_once(self):
+        self.assertIs(get_validator(MockDataClass), get_validator(MockDataClass))
+
 
 if __name__ == '__main__':
     unittest.main()
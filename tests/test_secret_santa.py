@@ -1,28 +1,21 @@
+import random
 import unittest
 from unittest.mock import patch, MagicMock
-from src.secret_santa import SecretSanta
+from src.secret_santa import SecretSanta, AssignmentError, find_assignment
 
 class TestSecretSanta(unittest.TestCase):
-    @patch('json.load')
-    @patch('builtins.open', new_callable=MagicMock)
-    def test_init(self, mock_open, mock_json_load):
-        # Setup the mock for json.load
-        mock_json_load.return_value = ['category1', 'category2', 'category3']
-
-        # Mock per il gestore di contesto usato con 'open'
-        file_mock = MagicMock()
-        mock_open.return_value.__enter__.return_value = file_mock
+    @patch('src.secret_santa.category_catalog')
+    def test_init(self, mock_category_catalog):
+        # Setup the mock for the category catalog
+        mock_category_catalog.merge.return_value = ('category1', 'category2', 'category3')
 
         # Create an instance of the SecretSanta class
         data = {'players': []}
         email_service = MagicMock()
         secret_santa = SecretSanta(data, email_service)
 
-        # Verify that open was called with the correct parameters
-        mock_open.assert_called_once_with('categories.json', 'r')
-
-        # Verify that json.load was called with the file mock
-        mock_json_load.assert_called_once_with(file_mock)
+        # Verify that the catalog was merged with the (empty) party categories
+        mock_category_catalog.merge.assert_called_once_with([])
 
         # Verify that the attributes are set correctly
         self.assertEqual(secret_santa.data, data)
@@ -30,5 +23,110 @@ class TestSecretSanta(unittest.TestCase):
         self.assertEqual(secret_santa.categories, ['category1', 'category2', 'category3'])
         self.assertEqual(secret_santa.available_categories, ['category1', 'category2', 'category3'])
 
+    @patch('builtins.open')
+    def test_init_merges_party_and_suggested_categories(self, mock_open):
+        data = {
+            'categories': ['Books'],
+            'players': [
+                {'name': 'a', 'email': 'a@test.com', 'suggested_categories': ['Games', 'Books']},
+                {'name': 'b', 'email': 'b@test.com'},
+            ],
+        }
+
+        secret_santa = SecretSanta(data, MagicMock())
+
+        # Party and player categories are appended to the catalog without reading the file again
+        self.assertEqual(secret_santa.categories[-2:], ['Books', 'Games'])
+        mock_open.assert_not_called()
+
+    def test_init_ignores_categories_that_are_not_lists(self):
+        data = {
+            'categories': 'Books',
+            'players': [{'name': 'a', 'email': 'a@test.com', 'suggested_categories': 'Games'}],
+        }
+
+        secret_santa = SecretSanta(data, MagicMock())
+
+        # A string is not merged character by character
+        self.assertNotIn('B', secret_santa.categories)
+        self.assertNotIn('G', secret_santa.categories)
+
+    def test_assign_builds_one_email_per_player(self):
+        players = [{'name': f'player{i}', 'email': f'player{i}@test.com'} for i in range(5)]
+        email_service = MagicMock()
+        secret_santa = SecretSanta({'players': players}, email_service)
+
+        emails = secret_santa.assign()
+
+        # Every player gets exactly one email and nothing is sent yet
+        self.assertEqual(sorted(email.recipient_email for email in emails), sorted(p['email'] for p in players))
+        self.assertTrue(all(email.subject == 'Secret Santa!' for email in emails))
+
+        # The body is the rendered mail template addressed to the gifter
+        for email in emails:
+            name = email.recipient_email.split('@')[0]
+            self.assertIn(f'Hey {name},', email.html_content)
+            self.assertIn(f'https://example.com/giftDetail?gifter={name}&amp;', email.html_content)
+        email_service.send_email.assert_not_called()
+
+    def test_assign_and_send_emails_uses_bulk_send(self):
+        players = [{'name': f'player{i}', 'email': f'player{i}@test.com'} for i in range(3)]
+        email_service = MagicMock()
+        secret_santa = SecretSanta({'players': players}, email_service)
+
+        results = secret_santa.assign_and_send_emails()
+
+        # All emails are handed over in a single call
+        email_service.send_bulk.assert_called_once()
+        self.assertEqual(len(email_service.send_bulk.call_args[0][0]), 3)
+        self.assertEqual(results, email_service.send_bulk.return_value)
+
+    def test_assign_respects_households_and_previous_assignments(self):
+        players = [{'name': name, 'email': f'{name}@test.com'} for name in 'abcdef']
+        data = {
+            'players': players,
+            'households': [['a@test.com', 'b@test.com', 'c@test.com']],
+            'previous_assignments': [['d@test.com', 'e@test.com']],
+            'exclusions': [['f@test.com', 'a@test.com']],
+        }
+        forbidden = {('a', 'b'), ('a', 'c'), ('b', 'a'), ('b', 'c'), ('c', 'a'), ('c', 'b'), ('d', 'e'), ('f', 'a')}
+
+        for _ in range(50):
+            secret_santa = SecretSanta(data, MagicMock())
+            secret_santa.assign()
+            pairs = [secret_santa.pick_duo(index) for index in range(len(players))]
+            for gifter, receiver in pairs:
+                self.assertNotEqual(gifter, receiver)
+                self.assertNotIn((gifter['name'], receiver['name']), forbidden)
+            self.assertEqual(sorted(receiver['name'] for _, receiver in pairs), list('abcdef'))
+
+    def test_find_assignment(self):
+        rng = random.Random(1)
+        count = 200
+        exclusions = [set(rng.sample(range(count), 150)) - {gifter} for gifter in range(count)]
+
+        receivers = find_assignment(count, exclusions, rng)
+
+        self.assertEqual(sorted(receivers), list(range(count)))
+        for gifter, receiver in enumerate(receivers):
+            self.assertNotEqual(gifter, receiver)
+            self.assertNotIn(receiver, exclusions[gifter])
+
+    def test_find_assignment_impossible(self):
+        # A gifter that may draw nobody
+        with self.assertRaisesRegex(AssignmentError, 'Player a is excluded from drawing every other player'):
+            find_assignment(3, [{1, 2}, set(), set()], labels=['a', 'b', 'c'])
+
+        # A receiver nobody may draw
+        with self.assertRaisesRegex(AssignmentError, 'Player c is excluded from being drawn by every other player'):
+            find_assignment(3, [{2}, {2}, set()], labels=['a', 'b', 'c'])
+
+        # a and b exclude each other so both would have to draw c
+        with self.assertRaisesRegex(AssignmentError, 'No assignment satisfies the exclusions'):
+            find_assignment(3, [{1}, {0}, set()])
+
+        with self.assertRaises(AssignmentError):
+            find_assignment(1, [set()])
+
 if __name__ == '__main__':
     unittest.main()
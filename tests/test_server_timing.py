@@ -0,0 +1,129 @@
+import re
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+from src import fanout
+from src.app import app
+from src.instrumented_storage import InstrumentedBackend
+from src.memory_storage import MemoryStorage
+from utilities import server_timing
+from utilities.server_timing import RequestTiming
+
+
+def round_trips(response):
+    """Returns the number of Firestore calls listed in the Server-Timing header of a response."""
+    entries = re.findall(r'firestore-\w+;dur=[\d.]+;desc="(\d+)"', response.headers["Server-Timing"])
+    return sum(int(calls) for calls in entries)
+
+
+class TestRequestTiming(unittest.TestCase):
+    def tearDown(self):
+        server_timing.stop()
+
+    def test_header(self):
+        timing = RequestTiming()
+        timing.record("firestore-read", 0.002)
+        timing.record("firestore-read", 0.003)
+        timing.record("smtp", 0.1)
+
+        header = timing.header()
+
+        self.assertTrue(header.startswith('firestore-read;dur=5.00;desc="2", smtp;dur=100.00;desc="1", total;dur='))
+        self.assertEqual(timing.count("firestore-"), 2)
+
+    def test_record_outside_of_a_request(self):
+        # Nothing to account to, e.g. on the email dispatcher threads
+        server_timing.record("smtp", 0.1)
+        self.assertIsNone(server_timing.current())
+
+    def test_fanout_records_into_the_request(self):
+        timing = server_timing.start()
+
+        futures = [fanout.submit(server_timing.record, "firestore-read", 0.001) for _ in range(4)]
+        for future in futures:
+            future.result()
+        thread = threading.Thread(target=server_timing.record, args=("firestore-read", 0.001))
+        thread.start()
+        thread.join()
+
+        # Plain threads do not inherit the request context
+        self.assertEqual(timing.count(), 4)
+
+
+class TestRoundTripBudgets(unittest.TestCase):
+    """Fails when a route starts doing more Firestore calls than it needs, e.g. one per user."""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.storage = InstrumentedBackend(MemoryStorage())
+        patcher = patch("src.app.get_firebase_crud", return_value=self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.party_id = self.storage.seed("Party", [{"name": "Party", "budget": 20, "categories": [], "ownerId": ""}])[0]
+        self.user_ids = self.storage.seed("User", [
+            {"username": f"User {index}", "email": f"user{index}@test.com", "party_id": self.party_id}
+            for index in range(20)
+        ])
+
+        # A guest invited to several parties, whose parties must come in one batched read
+        self.guest_party_ids = self.storage.seed("Party", [
+            {"name": f"Party {index}", "budget": 20, "categories": [], "ownerId": ""} for index in range(5)
+        ])
+        self.storage.seed("User", [
+            {"username": "Guest", "email": "guest@test.com", "party_id": party_id} for party_id in self.guest_party_ids
+        ])
+
+    def assertRoundTrips(self, response, budget, status_code=200):
+        self.assertEqual(response.status_code, status_code)
+        self.assertLessEqual(round_trips(response), budget, response.headers["Server-Timing"])
+
+    def test_read_routes(self):
+        self.assertRoundTrips(self.app.get("/GetParties/", query_string={"email": "user1@test.com"}), 2)
+        response = self.app.get("/GetParties/", query_string={"email": "guest@test.com"})
+        self.assertRoundTrips(response, 2)
+        self.assertEqual(len(response.get_json()["data"]), 5)
+        self.assertRoundTrips(self.app.get(f"/GetParty/{self.party_id}"), 2)
+        self.assertRoundTrips(self.app.get(f"/GetParty/{self.party_id}/{self.user_ids[0]}"), 2)
+        self.assertRoundTrips(self.app.get(f"/GetParty/{self.party_id}/{self.user_ids[0]}?limit=5"), 3)
+
+    def test_large_party_streams_its_members_by_page(self):
+        party_id = self.storage.seed("Party", [{"name": "Large", "budget": 20, "categories": [], "ownerId": ""}])[0]
+        self.storage.seed("User", [
+            {"username": f"Member {index}", "email": f"member{index}@test.com", "party_id": party_id}
+            for index in range(1200)
+        ])
+
+        # The party read and one query per 500 members
+        response = self.app.get(f"/GetParty/{party_id}")
+        self.assertRoundTrips(response, 4)
+        self.assertEqual(len(response.get_json()["data"]["users"]), 1200)
+
+    def test_write_routes(self):
+        party = {"name": "Party", "budget": 20, "categories": []}
+        user = {"username": "Guest", "email": "guest@test.com"}
+
+        self.assertRoundTrips(self.app.post("/CreateParty/", json=party), 1)
+        self.assertRoundTrips(self.app.put(f"/UpdateParty/{self.party_id}", json=party), 1)
+        self.assertRoundTrips(self.app.post(f"/CreateUser/{self.party_id}", json=user), 1)
+        self.assertRoundTrips(self.app.put(f"/UpdateUser/{self.user_ids[0]}", json=user), 1)
+        self.assertRoundTrips(self.app.delete(f"/DeleteUser/{self.user_ids[0]}"), 1)
+
+    @patch("src.app.email_dispatcher", new_callable=MagicMock)
+    def test_draw_route(self, mock_email_dispatcher):
+        mock_email_dispatcher.get_job.return_value = None
+        mock_email_dispatcher.submit.return_value = "job123"
+        players = [{"name": f"User {index}", "email": f"user{index}@test.com"} for index in range(20)]
+
+        # The draw works from the posted players alone
+        self.assertRoundTrips(self.app.post("/SecretSanta/", json={"players": players}), 0, status_code=202)
+
+    def test_serialization_is_timed(self):
+        response = self.app.get(f"/GetParty/{self.party_id}")
+
+        self.assertRegex(response.headers["Server-Timing"], r'serialize;dur=[\d.]+;desc="1"')
+        self.assertIsNone(server_timing.current())
+
+
+if __name__ == "__main__":
+    unittest.main()
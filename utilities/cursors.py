@@ -0,0 +1,42 @@
+import base64
+import hashlib
+import os
+import threading
+from cryptography.fernet import Fernet, InvalidToken
+
+# Fernet instance encrypting the cursors of this process, created on first use
+_fernet = None
+_fernet_lock = threading.Lock()
+
+
+def _get_fernet():
+    global _fernet
+    if _fernet is None:
+        with _fernet_lock:
+            if _fernet is None:
+                # Every worker must share CURSOR_SECRET for cursors to work across workers
+                secret = os.environ.get("CURSOR_SECRET")
+                if secret:
+                    key = base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest())
+                else:
+                    key = Fernet.generate_key()
+                _fernet = Fernet(key)
+    return _fernet
+
+
+def encode_cursor(document_id):
+    """
+    Turns a document ID into an opaque pagination cursor.
+
+    The ID is encrypted because member IDs double as credentials for the owner
+    view of a party and must not leak through the cursors.
+    """
+    return _get_fernet().encrypt(document_id.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns the document ID of a cursor, raising ValueError if it is not valid."""
+    try:
+        return _get_fernet().decrypt(cursor.encode()).decode()
+    except (InvalidToken, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
@@ -0,0 +1,41 @@
+import hashlib
+from flask import make_response
+
+
+def compute_etag(*parts):
+    """
+    Computes a strong ETag from the versions of the documents a response is built from.
+
+    Args:
+        *parts: Hashable descriptions of the response, e.g. the view name and
+            the {document ID: version} dicts returned by the storage backend.
+
+    Returns:
+        str: The ETag, without quotes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, dict):
+            part = sorted(part.items())
+        digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def not_modified(request, etag):
+    """Returns an empty 304 response if the request already has etag, otherwise None."""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = make_response("", 304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def with_etag(body, etag):
+    """Returns the response for body, tagged with etag for the next conditional GET."""
+    response = make_response(body)
+    response.set_etag(etag)
+    # Clients must revalidate, and owner views carry member IDs that shared caches must not keep
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response, current_app
+
+# Header carrying the client's key for a request that is safe to retry
+KEY_HEADER = "Idempotency-Key"
+
+# Header marking a response replayed from the store
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Longest accepted key, e.g. a UUID fits several times
+MAX_KEY_LENGTH = 255
+
+
+# _Entry class for the state of one idempotency key
+class _Entry:
+    __slots__ = ("fingerprint", "done", "response", "expires_at")
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+
+        # Set once the first request finished, with its response or without one if it failed
+        self.done = threading.Event()
+        self.response = None
+        self.expires_at = None
+
+
+# IdempotencyStore class for remembering the responses of requests by their key
+class IdempotencyStore:
+    """
+    In-process store of the first response of each idempotency key.
+
+    A key is reserved by the first request carrying it; later requests with the
+    same key wait for that one to finish, then get its response. Responses are
+    kept for ttl seconds and at most max_entries of them, oldest dropped first.
+    Server errors are not kept, so that the client can retry them.
+    """
+
+    def __init__(self, ttl=24 * 60 * 60, max_entries=10000, wait_timeout=30.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+
+        # Entries by key, in the order they were reserved
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Creates the store configured by the IDEMPOTENCY_* environment variables."""
+        return cls(
+            ttl=float(os.environ.get("IDEMPOTENCY_TTL", 24 * 60 * 60)),
+            max_entries=int(os.environ.get("IDEMPOTENCY_MAX_ENTRIES", 10000)),
+            wait_timeout=float(os.environ.get("IDEMPOTENCY_WAIT_TIMEOUT", 30)),
+        )
+
+    def _prune(self, now):
+        """Drops the oldest finished entries while expired or over max_entries. Must hold the lock."""
+        # Entries expire about in the order they were reserved, so the scan stops at the first fresh one
+        stale = []
+        for key, entry in self._entries.items():
+            if entry.expires_at is None:
+                # Still running
+                continue
+            if entry.expires_at > now and len(self._entries) - len(stale) <= self.max_entries:
+                break
+            stale.append(key)
+        for key in stale:
+            del self._entries[key]
+
+    def reserve(self, key, fingerprint):
+        """
+        Reserves a key for the current request, unless another request has it.
+
+        Returns:
+            tuple: (entry, True) if the caller must run the request and then
+            call complete or release, or (entry, False) for the entry of the
+            request that reserved the key first.
+        """
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is not None and (entry.expires_at is None or entry.expires_at > now):
+                return entry, False
+            entry = self._entries[key] = _Entry(fingerprint)
+            self._entries.move_to_end(key)
+            self._prune(now)
+            return entry, True
+
+    def complete(self, key, entry, response):
+        """Stores the response of a reserved key and wakes the requests waiting for it."""
+        if _is_server_error(response):
+            self.release(key, entry)
+            return
+        entry.response = (response.get_data(), response.status_code, list(response.headers.items()))
+        entry.expires_at = time.monotonic() + self.ttl
+        entry.done.set()
+
+    def release(self, key, entry):
+        """Forgets a reserved key whose request failed, so that the next request with it runs again."""
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _is_server_error(response):
+    """Checks for a 5xx status, or a 5xx "code" in the body as the storage errors are returned with a 200."""
+    if response.status_code >= 500:
+        return True
+    body = response.get_json(silent=True)
+    return isinstance(body, dict) and isinstance(body.get("code"), int) and body["code"] >= 500
+
+
+def _error(code, message):
+    return make_response({"code": code, "message": message}, code)
+
+
+def idempotent(store):
+    """
+    Makes a view replay its first response to requests repeating an Idempotency-Key.
+
+    Keys are scoped to the method and path. A key reused with a different body
+    gets a 422, and one whose first request is still running after the wait
+    timeout gets a 409. Requests without the header run as usual.
+
+    Args:
+        store (IdempotencyStore): Where the responses are kept.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(KEY_HEADER)
+            if key is None:
+                return view(*args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return _error(400, f"{KEY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters")
+
+            scoped_key = (request.method, request.path, key)
+            fingerprint = hashlib.blake2b(request.get_data(), digest_size=16).digest()
+            while True:
+                entry, owner = store.reserve(scoped_key, fingerprint)
+                if owner:
+                    break
+                if entry.fingerprint != fingerprint:
+                    return _error(422, f"{KEY_HEADER} was already used with a different request body")
+                if not entry.done.wait(store.wait_timeout):
+                    return _error(409, f"A request with this {KEY_HEADER} is still in progress")
+                if entry.response is not None:
+                    body, status, headers = entry.response
+                    response = current_app.response_class(body, status, headers)
+                    response.headers[REPLAYED_HEADER] = "true"
+                    return response
+                # The first request failed, try to run it again
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                store.release(scoped_key, entry)
+                raise
+            store.complete(scoped_key, entry, response)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,6 +1,82 @@
+from functools import lru_cache
 from flask import jsonify
-from dataclasses import is_dataclass, fields
-from typing import get_origin, get_args
+from dataclasses import MISSING, is_dataclass, fields
+from typing import get_origin, get_args, get_type_hints
+
+
+def _compile_field_check(name, expected_type):
+    """
+    Builds the function checking, and coercing if needed, the value of one field.
+
+    The function returns the value to use and raises ValueError if it is not valid.
+    """
+    origin = get_origin(expected_type)
+    if origin:
+        args = get_args(expected_type)
+        item_type = args[0] if args else object
+
+        def check_items(value):
+            if not isinstance(value, origin):
+                raise ValueError(f"Invalid type for field {name}")
+            # Checks each distinct item type once instead of every item
+            if not all(issubclass(item_class, item_type) for item_class in set(map(type, value))):
+                raise ValueError(f"Invalid type in list for field {name}")
+            return value
+
+        return check_items
+
+    def check_value(value):
+        if isinstance(value, expected_type):
+            return value
+        try:
+            return expected_type(value)
+        except (ValueError, TypeError):
+            raise ValueError(f"Invalid type for field {name}") from None
+
+    return check_value
+
+
+@lru_cache(maxsize=None)
+def get_validator(dataclass_type):
+    """
+    Returns the validator of a dataclass, compiling it on first use.
+
+    The field types are resolved once, so validating a request only runs the
+    checks of the fields it contains.
+
+    Args:
+        dataclass_type: The dataclass type to validate data for.
+
+    Returns:
+        function: A function taking the JSON data, coercing its values in place
+        and returning the list of {"field", "error"} errors found.
+    """
+    if not is_dataclass(dataclass_type):
+        raise ValueError(f"{dataclass_type.__name__} is not a dataclass")
+
+    hints = get_type_hints(dataclass_type)
+    init_fields = [field for field in fields(dataclass_type) if field.init]
+    checks = [(field.name, _compile_field_check(field.name, hints[field.name])) for field in init_fields]
+    required = [
+        field.name for field in init_fields if field.default is MISSING and field.default_factory is MISSING
+    ]
+    known = frozenset(field.name for field in init_fields)
+
+    def validate(data):
+        if not isinstance(data, dict):
+            return [{"field": None, "error": "Request body must be a JSON object"}]
+        errors = [{"field": name, "error": f"Missing field {name}"} for name in required if name not in data]
+        errors += [{"field": name, "error": f"Unknown field {name}"} for name in sorted(data.keys() - known)]
+        for name, check in checks:
+            if name in data:
+                try:
+                    data[name] = check(data[name])
+                except ValueError as e:
+                    errors.append({"field": name, "error": str(e)})
+        return errors
+
+    return validate
+
 
 def create_instance_from_request(request, dataclass_type):
     """
@@ -12,32 +88,18 @@ def create_instance_from_request(request, dataclass_type):
 
     Returns:
         An instance of the dataclass or a Flask response in case of an error.
+        The response lists every invalid field as "errors".
     """
 
     try:
         data = request.get_json()
-        if not is_dataclass(dataclass_type):
-            raise ValueError(f"{dataclass_type.__name__} is not a dataclass")
 
         # Verifies that the data types of the fields are correct
-        for field in fields(dataclass_type):
-            if field.name in data:
-                field_value = data[field.name]
-                expected_type = field.type
-                if get_origin(expected_type): 
-                    if not isinstance(field_value, get_origin(expected_type)):
-                        raise ValueError(f"Invalid type for field {field.name}")
-                    expected_arg_type = get_args(expected_type)[0]
-                    if any(not isinstance(item, expected_arg_type) for item in field_value):
-                        raise ValueError(f"Invalid type in list for field {field.name}")
-                else:  
-                    if not isinstance(field_value, expected_type):
-                        try:
-                            data[field.name] = expected_type(field_value)
-                        except (ValueError, TypeError):
-                            raise ValueError(f"Invalid type for field {field.name}")
+        errors = get_validator(dataclass_type)(data)
+        if errors:
+            return jsonify({"code": 400, "message": errors[0]["error"], "errors": errors}), 400
 
         instance = dataclass_type(**data)
         return instance
     except (TypeError, ValueError) as e:
-        return jsonify({"code": 400, "message": str(e)}), 400
+        return jsonify({"code": 400, "message": str(e), "errors": [{"field": None, "error": str(e)}]}), 400
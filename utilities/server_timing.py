@@ -0,0 +1,86 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Accounting of the request being handled, None outside of a request
+_current = contextvars.ContextVar("server_timing", default=None)
+
+
+class RequestTiming:
+    """
+    Number of calls and time spent per kind of backend operation during a request.
+
+    Calls on the fan-out threads record into the same instance, as the request
+    context is copied to them, so recording takes a lock.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+
+        # name -> [number of calls, seconds spent], in the order first recorded
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            totals = self._totals.get(name)
+            if totals is None:
+                self._totals[name] = [1, seconds]
+            else:
+                totals[0] += 1
+                totals[1] += seconds
+
+    def count(self, prefix=""):
+        """Returns the number of calls recorded under names starting with prefix."""
+        with self._lock:
+            return sum(calls for name, (calls, _) in self._totals.items() if name.startswith(prefix))
+
+    def header(self):
+        """
+        Returns the value of the Server-Timing header for the request so far.
+
+        Returns:
+            str: One "name;dur=milliseconds;desc=calls" entry per kind of
+            operation, then the total time of the request.
+        """
+        with self._lock:
+            entries = [
+                f'{name};dur={seconds * 1000:.2f};desc="{calls}"' for name, (calls, seconds) in self._totals.items()
+            ]
+        entries.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.2f}")
+        return ", ".join(entries)
+
+
+def start():
+    """Starts the accounting of a new request in the current context and returns it."""
+    timing = RequestTiming()
+    _current.set(timing)
+    return timing
+
+
+def stop():
+    """Ends the accounting of the current request."""
+    _current.set(None)
+
+
+def current():
+    """Returns the accounting of the current request, or None outside of a request."""
+    return _current.get()
+
+
+def record(name, seconds):
+    """Adds a call of the given kind to the current request, if any."""
+    timing = _current.get()
+    if timing is not None:
+        timing.record(name, seconds)
+
+
+@contextmanager
+def timed(name):
+    """Records the duration of the block as a call of the given kind."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start_time)